@@ -6,12 +6,13 @@ import uvicorn
 from loguru import logger
 import sys
 import os
+import threading
 from datetime import datetime
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from src.api.routes import router
+from src.api.routes import router, services
 from src.config.settings import settings
 
 
@@ -31,6 +32,11 @@ logger.add(
     level="DEBUG"
 )
 
+# Load the embedding weights before a pre-forking server (gunicorn --preload)
+# forks its workers, so every worker shares one copy of the model in memory
+if settings.preload_models:
+    services.preload_models()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -42,9 +48,19 @@ async def lifespan(app: FastAPI):
     os.makedirs("logs", exist_ok=True)
     os.makedirs(settings.chroma_db_path, exist_ok=True)
     
+    # Resume files left in the ingestion queue; otherwise workers start on the first bulk upload
+    if services.job_queue.has_queued_files():
+        services.ensure_bulk_ingestion_started()
+    
+    # Load models in the background so the server accepts requests immediately
+    if settings.warm_up_on_startup:
+        threading.Thread(target=services.warm_up, name="warm-up", daemon=True).start()
+    
     logger.info("Application started successfully")
     yield
     logger.info("Shutting down RAG LLM Assistant...")
+    services.shutdown()
+    await services.aclose()
 
 
 # Create FastAPI app
@@ -77,9 +93,14 @@ async def root():
         "timestamp": datetime.now().isoformat(),
         "endpoints": {
             "health": "/api/v1/health",
+            "health_live": "/api/v1/health/live",
+            "health_ready": "/api/v1/health/ready",
             "upload_guidelines": "/api/v1/upload/guidelines",
             "upload_thesis": "/api/v1/upload/thesis",
+            "upload_thesis_bulk": "/api/v1/upload/thesis/bulk",
+            "jobs": "/api/v1/jobs/{job_id}",
             "chat": "/api/v1/chat",
+            "chat_stream": "/api/v1/chat/stream",
             "documents": "/api/v1/documents",
             "stats": "/api/v1/stats"
         }
@@ -0,0 +1,69 @@
+"""Parity check and throughput benchmark for the embedding backends.
+
+Usage:
+    python scripts/benchmark_embedding_backends.py [--backends torch quantized onnx] [--texts 512]
+
+Every backend is compared against the full-precision PyTorch reference: the
+cosine similarity between both embeddings of the same text should stay close
+to 1.0, and the top-5 neighbours of sample queries should mostly agree.
+"""
+import argparse
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.embedding_backends import (
+    EMBEDDING_BACKENDS, create_embedding_backend, cosine_agreement, measure_throughput
+)
+from src.services.vector_store import EMBEDDING_MODEL_NAME
+
+WORDS = (
+    "skripsi pedoman penulisan bab pendahuluan metode penelitian hasil pembahasan kesimpulan "
+    "daftar pustaka margin halaman spasi huruf tabel gambar lampiran abstrak sitasi APA "
+    "rumusan masalah tujuan manfaat kajian teori populasi sampel instrumen analisis data"
+).split()
+
+
+def sample_texts(count: int, seed: int = 13):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 120))) for _ in range(count)]
+
+
+def topk_agreement(reference, candidate, queries, corpus, k: int = 5) -> float:
+    def topk(backend):
+        scores = backend.encode(queries) @ backend.encode(corpus).T
+        return np.argsort(-scores, axis=1)[:, :k]
+    
+    expected, actual = topk(reference), topk(candidate)
+    return float(np.mean([len(set(e) & set(a)) / k for e, a in zip(expected, actual)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=list(EMBEDDING_BACKENDS))
+    parser.add_argument('--texts', type=int, default=512)
+    parser.add_argument('--onnx-dir', default='./data/onnx')
+    args = parser.parse_args()
+    
+    texts = sample_texts(args.texts)
+    queries = sample_texts(32, seed=7)
+    reference = create_embedding_backend('torch', EMBEDDING_MODEL_NAME)
+    
+    print(f"{'backend':>10} {'texts/sec':>10} {'mean cos':>9} {'min cos':>8} {'top5 agree':>10}")
+    for name in args.backends:
+        backend = reference if name == 'torch' else create_embedding_backend(name, EMBEDDING_MODEL_NAME, args.onnx_dir)
+        throughput = measure_throughput(backend, texts)
+        parity = cosine_agreement(reference, backend, texts)
+        agreement = topk_agreement(reference, backend, queries, texts)
+        print(
+            f"{name:>10} {throughput:>10.1f} {parity['mean_cosine']:>9.4f} "
+            f"{parity['min_cosine']:>8.4f} {agreement:>10.2%}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""Query latency of exact NumPy search versus the Chroma HNSW index per namespace size.
+
+Usage:
+    python scripts/benchmark_exact_search.py [--sizes 100 300 1000 3000 10000] [--engines exact ann full]
+                                             [--background 20000] [--queries 200] [--top-k 5]
+
+For every size a namespace of that many synthetic 384-dimensional chunks is
+stored next to ``--background`` chunks of other namespaces, as in the shared
+``documents`` collection. ``exact`` scans the namespace matrix the way
+``ExactSearchIndex`` does; ``ann`` runs the namespace-filtered Chroma query
+used above ``EXACT_SEARCH_MAX_CHUNKS``. ``full`` goes through
+``VectorStore.search_namespaces`` with the namespace under the exact limit,
+so it adds what a chat question pays around the scan: the generation check,
+merging and fetching the returned chunks. p50/p99 latency is reported for
+each, plus the recall against the exact top-k. Use the crossover point to
+choose ``EXACT_SEARCH_MAX_CHUNKS``.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from loguru import logger
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.embedding_backends import EmbeddingBackend
+from src.services.exact_search import ExactSearchIndex
+
+DIMENSION = 384
+
+
+def synthetic_vectors(count: int, rng: np.random.Generator, clusters: int = 32) -> np.ndarray:
+    """Clustered unit vectors, closer to real chunk embeddings than uniform noise."""
+    centers = rng.standard_normal((clusters, DIMENSION)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentiles(latencies):
+    return np.percentile(np.asarray(latencies) * 1000, 50), np.percentile(np.asarray(latencies) * 1000, 99)
+
+
+def run_exact(index_dir: str, namespace: str, vectors: np.ndarray, queries: np.ndarray, top_k: int):
+    index = ExactSearchIndex(index_dir, DIMENSION)
+    index.build(namespace, [f"{namespace}:{i}" for i in range(len(vectors))], vectors, 0)
+    
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        ids, _ = index.search(namespace, query, top_k)
+        latencies.append(time.perf_counter() - start)
+        results.append(ids)
+    return latencies, results
+
+
+class PrecomputedBackend(EmbeddingBackend):
+    """Returns the synthetic vector stored for each chunk text instead of running a model."""
+    
+    name = 'precomputed'
+    
+    def __init__(self):
+        self.vectors = {}
+    
+    def encode(self, texts):
+        return np.stack([self.vectors[text] for text in texts])
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return DIMENSION
+
+
+def run_full(workdir: str, namespace: str, vectors: np.ndarray, background: np.ndarray, queries: np.ndarray, top_k: int):
+    from src.services.vector_store import VectorStore
+    
+    backend = PrecomputedBackend()
+    store = VectorStore(
+        persist_directory=os.path.join(workdir, 'store'),
+        embedding_model=backend,
+        query_batching=False,
+        exact_search_dir=os.path.join(workdir, 'exact'),
+        exact_search_max_chunks=len(vectors)
+    )
+    
+    def chunks(prefix, block, namespace_of):
+        for i, vector in enumerate(block):
+            text = f"{prefix} {i}"
+            backend.vectors[text] = vector
+            yield {'id': f"{prefix}:{i}", 'content': text, 'metadata': {'namespace': namespace_of(i)}}
+    
+    store.add_documents(chunks('background', background, lambda i: f"skripsi_mahasiswa_{i % 50}"))
+    store.add_documents(chunks(namespace, vectors, lambda i: namespace))
+    # The first query loads the namespace matrix; measure the steady state
+    store.search_namespaces('', [namespace], top_k=top_k, similarity_threshold=-1.0, query_embedding=queries[0].tolist())
+    
+    latencies, results = [], []
+    for query in queries:
+        embedding = query.tolist()
+        start = time.perf_counter()
+        found = store.search_namespaces(
+            '', [namespace], top_k=top_k, similarity_threshold=-1.0, query_embedding=embedding
+        )
+        latencies.append(time.perf_counter() - start)
+        results.append([chunk['id'] for chunk in found])
+    store.close()
+    return latencies, results
+
+
+def run_ann(chroma_dir: str, namespace: str, vectors: np.ndarray, background: np.ndarray, queries: np.ndarray, top_k: int):
+    import chromadb
+    
+    client = chromadb.PersistentClient(path=chroma_dir)
+    collection = client.get_or_create_collection(name=f"bench-{len(vectors)}", metadata={"hnsw:space": "cosine"})
+    
+    def add(prefix, block, namespace_of):
+        for start in range(0, len(block), 5000):
+            rows = block[start:start + 5000]
+            collection.add(
+                ids=[f"{prefix}:{start + i}" for i in range(len(rows))],
+                embeddings=rows.tolist(),
+                metadatas=[{'namespace': namespace_of(start + i)} for i in range(len(rows))]
+            )
+    
+    add('background', background, lambda i: f"skripsi_mahasiswa_{i % 50}")
+    add(namespace, vectors, lambda i: namespace)
+    
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        raw = collection.query(
+            query_embeddings=[query.tolist()], n_results=top_k, where={"namespace": namespace}, include=['distances']
+        )
+        latencies.append(time.perf_counter() - start)
+        results.append(raw['ids'][0])
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 300, 1000, 3000, 10000])
+    parser.add_argument('--engines', nargs='+', choices=['exact', 'ann', 'full'], default=['exact', 'ann', 'full'])
+    parser.add_argument('--background', type=int, default=20000, help='Chunks of other namespaces in the collection')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+    
+    # Per-query info logs would dominate the full search path
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    
+    rng = np.random.default_rng(13)
+    queries = synthetic_vectors(args.queries, rng)
+    background = synthetic_vectors(args.background, rng) if {'ann', 'full'} & set(args.engines) else None
+    
+    print(f"{'chunks':>8} {'engine':>6} {'p50 ms':>8} {'p99 ms':>8} {'recall':>7}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            namespace = f"bench_{size}"
+            vectors = synthetic_vectors(size, rng)
+            exact_results = None
+            
+            for engine in args.engines:
+                if engine == 'exact':
+                    latencies, results = run_exact(os.path.join(workdir, 'exact'), namespace, vectors, queries, args.top_k)
+                    exact_results = results
+                elif engine == 'full':
+                    latencies, results = run_full(
+                        os.path.join(workdir, f"full-{size}"), namespace, vectors, background, queries, args.top_k
+                    )
+                else:
+                    latencies, results = run_ann(
+                        os.path.join(workdir, 'chroma'), namespace, vectors, background, queries, args.top_k
+                    )
+                
+                recall = ''
+                if exact_results is not None and engine != 'exact':
+                    recall = f"{np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(results, exact_results) if e]):.2%}"
+                p50, p99 = percentiles(latencies)
+                print(f"{size:>8} {engine:>6} {p50:>8.3f} {p99:>8.3f} {recall:>7}")
+
+
+if __name__ == '__main__':
+    main()
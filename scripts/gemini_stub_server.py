@@ -0,0 +1,100 @@
+"""Local stand-in for the Gemini REST API, for exercising the async client.
+
+Usage:
+    python scripts/gemini_stub_server.py [--port 8089] [--fail-every 3] [--fail-status 429]
+                                         [--retry-after 1] [--latency-ms 200]
+
+Serves ``generateContent`` and ``streamGenerateContent?alt=sse`` for any
+model. Every ``--fail-every``-th request answers ``--fail-status`` (with a
+Retry-After header for 429), so retries, backoff and deadlines can be
+observed without touching the real API. Point the application at it with
+``GEMINI_API_BASE_URL=http://127.0.0.1:8089``.
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+
+def candidate(text: str) -> dict:
+    return {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}}]}
+
+
+def make_handler(args):
+    counter = itertools.count(1)
+    lock = threading.Lock()
+    
+    class StubHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def do_POST(self):
+            with lock:
+                number = next(counter)
+            
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            prompt = request['contents'][0]['parts'][0]['text']
+            
+            time.sleep(args.latency_ms / 1000)
+            
+            if args.fail_every and number % args.fail_every == 0:
+                headers = {'Retry-After': str(args.retry_after)} if args.fail_status == 429 else {}
+                self._send_json(args.fail_status, {'error': {'code': args.fail_status, 'message': 'stub failure'}}, headers)
+                return
+            
+            answer = f"Stub answer #{number} for a {len(prompt)}-character prompt."
+            if ':streamGenerateContent' in self.path:
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                for word in answer.split(' '):
+                    self.wfile.write(f"data: {json.dumps(candidate(word + ' '))}\r\n\r\n".encode('utf-8'))
+                    self.wfile.flush()
+                return
+            
+            if ':generateContent' in self.path:
+                self._send_json(200, candidate(answer))
+                return
+            
+            self._send_json(404, {'error': {'code': 404, 'message': f"Unknown path {self.path}"}})
+        
+        def log_message(self, format, *log_args):
+            logger.info(f"{self.command} {self.path.split('?')[0]} -> {format % log_args}")
+    
+    return StubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--fail-every', type=int, default=0, help='Fail every Nth request (0 disables failures)')
+    parser.add_argument('--fail-status', type=int, default=429)
+    parser.add_argument('--retry-after', type=float, default=1)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+    
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args))
+    logger.info(f"Gemini stub listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Measure cold-start time: from process launch to the first successful /health.
+
+Usage:
+    python scripts/measure_cold_start.py [--runs 3] [--port 8765] [--timeout 120]
+
+Each run starts a fresh uvicorn process serving ``main:app``, polls the
+health endpoint until it answers with HTTP 200, records the elapsed time and
+stops the server. Environment variables (for example ``WARM_UP_ON_STARTUP``)
+are passed through, so startup modes can be compared directly.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def wait_for_health(url: str, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def measure(port: int, timeout: float) -> float:
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=ROOT
+    )
+    try:
+        if not wait_for_health(f"http://127.0.0.1:{port}/api/v1/health", timeout):
+            raise RuntimeError(f"/health did not respond within {timeout}s")
+        return time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+    
+    timings = []
+    for run in range(args.runs):
+        elapsed = measure(args.port, args.timeout)
+        timings.append(elapsed)
+        print(f"run {run + 1}: {elapsed:.2f}s to first /health")
+    
+    print(f"median: {statistics.median(timings):.2f}s  min: {min(timings):.2f}s  max: {max(timings):.2f}s")
+
+
+if __name__ == '__main__':
+    main()
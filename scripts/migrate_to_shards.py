@@ -0,0 +1,127 @@
+"""Move an existing single-collection Chroma database into shard collections.
+
+Usage:
+    python scripts/migrate_to_shards.py --mode namespace [--chroma-path ./data/chroma_db]
+                                        [--buckets 16] [--batch-size 1000] [--drop-source] [--dry-run]
+
+Reads the ``documents`` collection page by page (ids, texts, metadata and
+stored embeddings, so nothing is re-encoded) and writes every chunk to the
+collection ``VECTOR_SHARDING`` routes its namespace to. Chunks already
+present in their shard are skipped, so an interrupted run can be restarted.
+Per-namespace counts are verified before ``--drop-source`` deletes the
+original collection. Stop the API server first, then set ``VECTOR_SHARDING``
+(and ``VECTOR_SHARD_BUCKETS``) to the same values used here.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+import chromadb
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.sharding import ShardRouter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chroma-path', default='./data/chroma_db')
+    parser.add_argument('--collection', default='documents')
+    parser.add_argument('--mode', choices=['namespace', 'bucket'], required=True)
+    parser.add_argument('--buckets', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--drop-source', action='store_true', help='Delete the source collection after verification')
+    parser.add_argument('--dry-run', action='store_true', help='Only print how namespaces would be distributed')
+    args = parser.parse_args()
+    
+    router = ShardRouter(args.mode, args.buckets)
+    client = chromadb.PersistentClient(path=args.chroma_path)
+    try:
+        source = client.get_collection(args.collection)
+    except Exception:
+        print(f"Collection {args.collection!r} not found in {args.chroma_path}; nothing to migrate")
+        return
+    
+    total = source.count()
+    print(f"Migrating {total} chunks from {args.collection!r} with sharding mode {args.mode!r}")
+    
+    start_time = time.perf_counter()
+    expected: Counter = Counter()
+    shards = {}
+    copied = 0
+    offset = 0
+    while True:
+        include = ['metadatas'] if args.dry_run else ['metadatas', 'documents', 'embeddings']
+        page = source.get(include=include, limit=args.batch_size, offset=offset)
+        if not page['ids']:
+            break
+        offset += len(page['ids'])
+        
+        groups = {}
+        for i, metadata in enumerate(page['metadatas']):
+            namespace = (metadata or {}).get('namespace') or 'unknown'
+            expected[namespace] += 1
+            groups.setdefault(router.shard_for(args.collection, namespace), []).append(i)
+        
+        if args.dry_run:
+            continue
+        
+        for shard_name, positions in groups.items():
+            shard = shards.get(shard_name)
+            if shard is None:
+                shard = shards[shard_name] = client.get_or_create_collection(
+                    name=shard_name, metadata={"hnsw:space": "cosine"}
+                )
+            
+            stored = set(shard.get(ids=[page['ids'][i] for i in positions], include=[])['ids'])
+            pending = [i for i in positions if page['ids'][i] not in stored]
+            if not pending:
+                continue
+            
+            shard.upsert(
+                ids=[page['ids'][i] for i in pending],
+                documents=[page['documents'][i] for i in pending],
+                metadatas=[page['metadatas'][i] for i in pending],
+                embeddings=[page['embeddings'][i] for i in pending]
+            )
+            copied += len(pending)
+        
+        print(f"  {offset}/{total} chunks read, {copied} copied")
+    
+    if args.dry_run:
+        distribution = Counter()
+        for namespace, count in expected.items():
+            distribution[router.shard_for(args.collection, namespace)] += count
+        for shard_name, count in sorted(distribution.items()):
+            print(f"  {shard_name}: {count} chunks")
+        return
+    
+    print(f"Copied {copied} chunks into {len(shards)} shards in {time.perf_counter() - start_time:.1f}s")
+    
+    # Verify per-namespace counts in every shard before touching the source
+    mismatches = []
+    for namespace, count in expected.items():
+        if namespace == 'unknown':
+            # Chunks without a namespace cannot be filtered on
+            continue
+        shard = shards.get(router.shard_for(args.collection, namespace))
+        stored = len(shard.get(where={"namespace": namespace}, include=[])['ids']) if shard else 0
+        if stored != count:
+            mismatches.append((namespace, count, stored))
+    
+    if mismatches:
+        for namespace, count, stored in mismatches:
+            print(f"  Mismatch in {namespace}: {count} in source, {stored} in shard")
+        print("Verification failed; source collection kept")
+        sys.exit(1)
+    
+    print(f"Verified {len(expected)} namespaces")
+    if args.drop_source:
+        client.delete_collection(args.collection)
+        print(f"Deleted source collection {args.collection!r}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,102 +1,220 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional, Any, List, Tuple
+import hashlib
+import json
+import time
 import uuid
 import os
 import tempfile
 import shutil
+import zipfile
+from datetime import datetime
 
 from ..models.schemas import (
     ChatRequest, ChatResponse, UploadResponse, 
-    DocumentInfo, HealthCheck, SourceReference
+    DocumentInfo, HealthCheck, SourceReference,
+    BulkUploadResponse, JobStatus
 )
-from ..services.pdf_processor import PDFProcessor
-from ..services.vector_store import VectorStore
-from ..services.gemini_service import GeminiService
-from ..services.rag_service import RAGService
+from ..services.execution import ServiceOverloadedError
+from ..services.container import ServiceContainer
+from ..services.document_registry import GUIDELINES_DOCUMENT_ID, GUIDELINES_NAME
 from ..config.settings import settings
 from loguru import logger
 
 router = APIRouter()
 
-# Initialize services
-pdf_processor = PDFProcessor(
-    max_chunk_size=settings.max_chunk_size,
-    chunk_overlap=settings.chunk_overlap
-)
+# Services are built lazily on first use so importing this module stays cheap
+services = ServiceContainer(settings)
+
+
+UPLOAD_SPOOL_CHUNK_SIZE = 1024 * 1024
 
-vector_store = VectorStore(persist_directory=settings.chroma_db_path)
-gemini_service = GeminiService(api_key=settings.gemini_api_key)
-rag_service = RAGService(vector_store=vector_store, gemini_service=gemini_service)
+
+async def _spool_upload(
+    file: UploadFile,
+    directory: Optional[str] = None,
+    suffix: str = '.pdf',
+    digest: Optional[Any] = None
+) -> str:
+    """Copy an upload to a temporary file in fixed-size blocks, enforcing the size limit.
+    
+    If ``digest`` (a ``hashlib`` object) is given it is updated with the
+    content while spooling, so the file does not have to be read twice.
+    """
+    max_bytes = settings.max_file_size_mb * 1024 * 1024
+    file_size = 0
+    
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=directory) as temp_file:
+        try:
+            while True:
+                block = await file.read(UPLOAD_SPOOL_CHUNK_SIZE)
+                if not block:
+                    break
+                
+                file_size += len(block)
+                if file_size > max_bytes:
+                    raise HTTPException(
+                        status_code=400, 
+                        detail=f"File size exceeds {settings.max_file_size_mb}MB limit"
+                    )
+                
+                temp_file.write(block)
+                if digest is not None:
+                    digest.update(block)
+        except Exception:
+            os.unlink(temp_file.name)
+            raise
+    
+    return temp_file.name
 
 
 @router.get("/health", response_model=HealthCheck)
 async def health_check():
-    """Health check endpoint."""
+    """Health check endpoint.
+    
+    Reports the state of services without building them, querying the
+    collection or calling the Gemini API. Services are built on first use,
+    so one that is not built yet counts as healthy; only a service whose
+    construction failed, or a Gemini API reported unhealthy, is degraded.
+    """
     try:
-        stats = rag_service.get_system_stats()
+        gemini_ok = not services.has_failed('gemini_service') and (
+            not services.is_initialized('gemini_service')
+            or services.gemini_service.get_health()['status'] != 'unhealthy'
+        )
+        service_status = {
+            "vector_store": not services.has_failed('vector_store'),
+            "gemini_api": gemini_ok,
+            "pdf_processor": not services.has_failed('pdf_processor')
+        }
         
         return HealthCheck(
-            status="healthy" if stats.get('status') == 'healthy' else "degraded",
+            status="healthy" if all(service_status.values()) else "degraded",
             timestamp=datetime.now(),
             version=settings.app_version,
-            services={
-                "vector_store": stats.get('vector_store', {}).get('total_documents', 0) >= 0,
-                "gemini_api": stats.get('gemini_connection', False),
-                "pdf_processor": True
-            }
+            services=service_status
         )
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=500, detail=f"Health check failed: {str(e)}")
 
 
+@router.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "alive"}
+
+
+@router.get("/health/ready")
+async def readiness():
+    """Readiness probe: models are loaded and the vector store responds.
+    
+    Gemini failures do not make the instance unready, since every instance
+    shares the same upstream API.
+    """
+    if not services.is_initialized('rag_service'):
+        if settings.warm_up_on_startup:
+            return JSONResponse(status_code=503, content={"status": "starting"})
+        # Without warm-up services are built by the first request that needs them
+        return {"status": "ready", "services_loaded": False}
+    
+    try:
+        services.vector_store.client.heartbeat()
+    except Exception as e:
+        logger.error(f"Readiness check failed: {e}")
+        return JSONResponse(status_code=503, content={"status": "unavailable", "error": str(e)})
+    
+    return {"status": "ready", "services_loaded": True}
+
+
 @router.post("/upload/guidelines", response_model=UploadResponse)
-async def upload_guidelines(file: UploadFile = File(...)):
-    """Upload thesis guidelines PDF."""
+async def upload_guidelines(file: UploadFile = File(...), incremental: bool = True):
+    """Upload thesis guidelines PDF.
+    
+    The new version replaces the stored guidelines. In incremental mode only
+    new or changed chunks are embedded and vanished chunks are deleted;
+    otherwise the namespace is cleared and fully re-ingested.
+    """
     try:
         # Validate file
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are allowed")
         
-        # Check file size
-        file_size = 0
-        temp_content = await file.read()
-        file_size = len(temp_content)
-        
-        if file_size > settings.max_file_size_mb * 1024 * 1024:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"File size exceeds {settings.max_file_size_mb}MB limit"
-            )
-        
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(temp_content)
-            temp_file_path = temp_file.name
+        # Stream the upload to disk without holding it in memory
+        digest = hashlib.sha256()
+        temp_file_path = await _spool_upload(file, digest=digest)
+        content_hash = digest.hexdigest()
+        registry = services.document_registry
+        existing = None
         
         try:
-            # Process PDF
-            chunks = pdf_processor.process_guidelines_pdf(temp_file_path)
+            existing = registry.get(GUIDELINES_DOCUMENT_ID)
+            if existing and existing['status'] == 'ready' and existing['content_hash'] == content_hash:
+                logger.info("Guidelines unchanged, skipping re-ingestion")
+                return UploadResponse(
+                    success=True,
+                    message="Pedoman Skripsi tidak berubah, tidak ada yang diproses ulang",
+                    document_id=GUIDELINES_DOCUMENT_ID,
+                    chunks_created=existing['chunk_count'],
+                    chunks_added=0,
+                    chunks_updated=0,
+                    chunks_removed=0
+                )
+            
+            registry.register(GUIDELINES_DOCUMENT_ID, file.filename, content_hash)
+            
+            # Extraction, chunking, embedding and writes run as one lazy pipeline
+            chunks = services.pdf_processor.iter_guidelines_chunks(temp_file_path)
             
             # Store in vector database
-            vector_store.add_documents(chunks, collection_name="documents")
+            if incremental:
+                changes = await services.execution.ingestion.run(
+                    services.vector_store.sync_namespace, chunks, 'pedoman', collection_name="documents"
+                )
+                chunks_created = changes['added'] + changes['updated'] + changes['unchanged']
+            else:
+                removed = await services.execution.ingestion.run(
+                    services.vector_store.delete_documents_by_namespace, 'pedoman'
+                )
+                chunks_created = await services.execution.ingestion.run(
+                    services.vector_store.add_documents, chunks, collection_name="documents"
+                )
+                changes = {'added': chunks_created, 'updated': 0, 'removed': removed}
             
-            logger.info(f"Successfully processed guidelines: {len(chunks)} chunks created")
+            registry.mark_ready(GUIDELINES_DOCUMENT_ID, chunks_created)
+            logger.info(f"Successfully processed guidelines: {chunks_created} chunks ({changes})")
             
             return UploadResponse(
                 success=True,
                 message="Pedoman Skripsi berhasil diupload dan diproses",
-                document_id="guidelines",
-                chunks_created=len(chunks)
+                document_id=GUIDELINES_DOCUMENT_ID,
+                chunks_created=chunks_created,
+                chunks_added=changes['added'],
+                chunks_updated=changes['updated'],
+                chunks_removed=changes['removed']
             )
-            
+        
+        except Exception as e:
+            if incremental and existing and existing['status'] == 'ready':
+                # sync_namespace rolled back, so the previous version is still the one served
+                registry.register(
+                    GUIDELINES_DOCUMENT_ID, existing['filename'], existing['content_hash'], status='ready'
+                )
+                registry.mark_ready(GUIDELINES_DOCUMENT_ID, existing['chunk_count'])
+            else:
+                registry.mark_failed(GUIDELINES_DOCUMENT_ID, str(e))
+            raise
+        
         finally:
             # Clean up temporary file
             os.unlink(temp_file_path)
     
     except HTTPException:
         raise
+    except ServiceOverloadedError as e:
+        logger.warning(f"Rejecting upload: {e}")
+        raise HTTPException(status_code=503, detail="Server is busy, please retry later")
     except Exception as e:
         logger.error(f"Error uploading guidelines: {e}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -110,62 +228,176 @@ async def upload_student_thesis(file: UploadFile = File(...)):
         if not file.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Only PDF files are allowed")
         
-        # Check file size
-        temp_content = await file.read()
-        file_size = len(temp_content)
-        
-        if file_size > settings.max_file_size_mb * 1024 * 1024:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"File size exceeds {settings.max_file_size_mb}MB limit"
-            )
-        
         # Generate unique document ID
         document_id = str(uuid.uuid4())
         
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(temp_content)
-            temp_file_path = temp_file.name
+        # Stream the upload to disk without holding it in memory
+        digest = hashlib.sha256()
+        temp_file_path = await _spool_upload(file, digest=digest)
+        content_hash = digest.hexdigest()
+        registry = services.document_registry
         
         try:
-            # Process PDF
-            chunks = pdf_processor.process_student_thesis_pdf(
+            existing = registry.find_by_hash(content_hash)
+            if existing:
+                logger.info(f"Thesis {file.filename} already ingested as document {existing['id']}")
+                return UploadResponse(
+                    success=True,
+                    message=f"Skripsi '{file.filename}' sudah pernah diupload",
+                    document_id=existing['id'],
+                    chunks_created=existing['chunk_count']
+                )
+            
+            registry.register(document_id, file.filename, content_hash)
+            
+            # Extraction, chunking, embedding and writes run as one lazy pipeline
+            chunks = services.pdf_processor.iter_student_thesis_chunks(
                 temp_file_path, 
                 document_id, 
                 file.filename
             )
             
             # Store in vector database
-            vector_store.add_documents(chunks, collection_name="documents")
+            chunks_created = await services.execution.ingestion.run(
+                services.vector_store.add_documents, chunks, collection_name="documents"
+            )
             
-            logger.info(f"Successfully processed thesis {file.filename}: {len(chunks)} chunks created")
+            registry.mark_ready(document_id, chunks_created)
+            logger.info(f"Successfully processed thesis {file.filename}: {chunks_created} chunks created")
             
             return UploadResponse(
                 success=True,
                 message=f"Skripsi '{file.filename}' berhasil diupload dan diproses",
                 document_id=document_id,
-                chunks_created=len(chunks)
+                chunks_created=chunks_created
             )
-            
+        
+        except Exception as e:
+            # Remove chunks written before the failure along with the partial document
+            registry.mark_failed(document_id, str(e))
+            try:
+                await services.execution.ingestion.run(
+                    services.vector_store.delete_documents_by_namespace, registry.namespace_for(document_id)
+                )
+            except Exception as cleanup_error:
+                logger.error(f"Error removing partial thesis {document_id}: {cleanup_error}")
+            raise
+        
         finally:
             # Clean up temporary file
             os.unlink(temp_file_path)
     
     except HTTPException:
         raise
+    except ServiceOverloadedError as e:
+        logger.warning(f"Rejecting upload: {e}")
+        raise HTTPException(status_code=503, detail="Server is busy, please retry later")
     except Exception as e:
         logger.error(f"Error uploading thesis: {e}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+def _extract_zip_pdfs(zip_path: str, directory: str) -> List[Tuple[str, str]]:
+    """Extract the PDF members of a zip archive into ``directory``."""
+    max_bytes = settings.max_file_size_mb * 1024 * 1024
+    extracted = []
+    
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.infolist():
+            filename = os.path.basename(member.filename)
+            if member.is_dir() or not filename.lower().endswith('.pdf'):
+                continue
+            if member.file_size > max_bytes:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"{filename} exceeds {settings.max_file_size_mb}MB limit"
+                )
+            
+            with archive.open(member) as source, tempfile.NamedTemporaryFile(
+                delete=False, suffix='.pdf', dir=directory
+            ) as target:
+                shutil.copyfileobj(source, target, UPLOAD_SPOOL_CHUNK_SIZE)
+                extracted.append((filename, target.name))
+    
+    return extracted
+
+
+@router.post("/upload/thesis/bulk", response_model=BulkUploadResponse)
+async def upload_student_theses_bulk(files: List[UploadFile] = File(...)):
+    """Queue many student thesis PDFs (or zip archives of PDFs) for background ingestion."""
+    spooled: List[Tuple[str, str]] = []
+    
+    try:
+        os.makedirs(settings.job_spool_path, exist_ok=True)
+        
+        for file in files:
+            name = file.filename.lower()
+            if name.endswith('.pdf'):
+                spooled.append((file.filename, await _spool_upload(file, settings.job_spool_path)))
+            elif name.endswith('.zip'):
+                zip_path = await _spool_upload(file, settings.job_spool_path, suffix='.zip')
+                try:
+                    spooled.extend(_extract_zip_pdfs(zip_path, settings.job_spool_path))
+                finally:
+                    os.unlink(zip_path)
+            else:
+                raise HTTPException(status_code=400, detail=f"{file.filename}: only PDF or ZIP files are allowed")
+            
+            if len(spooled) > settings.bulk_max_files:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"A bulk upload may contain at most {settings.bulk_max_files} files"
+                )
+        
+        if not spooled:
+            raise HTTPException(status_code=400, detail="No PDF files found in upload")
+        
+        job_id = services.job_queue.create_job(spooled)
+        services.ensure_bulk_ingestion_started()
+        
+        return BulkUploadResponse(
+            success=True,
+            message=f"{len(spooled)} skripsi masuk antrian untuk diproses",
+            job_id=job_id,
+            files_queued=len(spooled)
+        )
+    
+    except Exception as e:
+        for _, path in spooled:
+            if os.path.exists(path):
+                os.unlink(path)
+        
+        if isinstance(e, HTTPException):
+            raise
+        if isinstance(e, zipfile.BadZipFile):
+            raise HTTPException(status_code=400, detail=f"Invalid zip archive: {str(e)}")
+        logger.error(f"Error queueing bulk upload: {e}")
+        raise HTTPException(status_code=500, detail=f"Bulk upload failed: {str(e)}")
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job_status(job_id: str):
+    """Get the status of a bulk ingestion job with per-file progress."""
+    try:
+        job = services.job_queue.get_job(job_id)
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get job: {str(e)}")
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_assistant(request: ChatRequest):
     """Chat with the RAG assistant."""
     try:
         # Process question using RAG
-        answer, sources, processing_time = rag_service.process_question(
+        answer, sources, processing_time, rerank_time = await services.rag_service.process_question_async(
             question=request.question,
+            execution=services.execution,
             document_id=request.document_id,
             include_guidelines=request.include_guidelines,
             top_k=settings.top_k_retrieval
@@ -174,48 +406,128 @@ async def chat_with_assistant(request: ChatRequest):
         return ChatResponse(
             answer=answer,
             sources=sources,
-            processing_time=processing_time
+            processing_time=processing_time,
+            rerank_time=rerank_time
         )
-        
+    
+    except ServiceOverloadedError as e:
+        logger.warning(f"Rejecting chat request: {e}")
+        raise HTTPException(status_code=503, detail="Server is busy, please retry later")
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
 
 
+def _sse_event(event: str, data: Any) -> str:
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_with_assistant_stream(request: ChatRequest):
+    """Chat with the RAG assistant, streaming the answer as Server-Sent Events.
+    
+    Emits a ``sources`` event first, then one ``token`` event per generated
+    text piece, and a final ``done`` event with timing information.
+    """
+    start_time = time.time()
+    
+    try:
+        # Retrieve phase runs before the response starts so overload maps to 503
+        retrieval = await services.rag_service.retrieve_async(
+            request.question,
+            services.execution,
+            request.document_id,
+            request.include_guidelines,
+            settings.top_k_retrieval
+        )
+    except ServiceOverloadedError as e:
+        logger.warning(f"Rejecting chat stream request: {e}")
+        raise HTTPException(status_code=503, detail="Server is busy, please retry later")
+    except Exception as e:
+        logger.error(f"Error in chat stream endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
+    
+    retrieval_time = time.time() - start_time
+    cached = retrieval['cached']
+    top_chunks = retrieval['chunks']
+    sources = cached['sources'] if cached else services.rag_service.extract_source_references(top_chunks)
+    
+    async def event_stream():
+        yield _sse_event("sources", [source.model_dump() for source in sources])
+        
+        generation_start = time.time()
+        if cached:
+            yield _sse_event("token", {"text": cached['answer']})
+        else:
+            answer_parts = []
+            failed = False
+            try:
+                async for text in services.rag_service.stream_answer_async(
+                    request.question, top_chunks, services.execution
+                ):
+                    answer_parts.append(text)
+                    failed = failed or services.gemini_service.is_error_response(text)
+                    yield _sse_event("token", {"text": text})
+            except ServiceOverloadedError as e:
+                failed = True
+                logger.warning(f"Rejecting chat stream generation: {e}")
+                yield _sse_event("error", {"detail": "Server is busy, please retry later"})
+            except Exception as e:
+                failed = True
+                logger.error(f"Error streaming chat response: {e}")
+                yield _sse_event("error", {"detail": f"Chat processing failed: {str(e)}"})
+            
+            if not failed:
+                services.rag_service.cache_answer(
+                    retrieval['namespaces'],
+                    retrieval['query_embedding'],
+                    "".join(answer_parts),
+                    sources,
+                    retrieval['generations']
+                )
+        
+        yield _sse_event("done", {
+            "retrieval_time": retrieval_time,
+            "rerank_time": retrieval['rerank_time'],
+            "generation_time": time.time() - generation_start,
+            "processing_time": time.time() - start_time,
+            "cached": cached is not None
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/documents")
 async def list_documents():
     """List all uploaded documents."""
     try:
-        stats = vector_store.get_collection_stats()
-        namespace_distribution = stats.get('namespace_distribution', {})
-        
-        documents = []
-        
-        for namespace, count in namespace_distribution.items():
-            if namespace == 'pedoman':
-                documents.append({
-                    'id': 'guidelines',
-                    'type': 'guidelines',
-                    'name': 'Pedoman Skripsi UIN Imam Bonjol Padang',
-                    'chunks_count': count,
-                    'namespace': namespace
-                })
-            elif namespace.startswith('skripsi_mahasiswa_'):
-                doc_id = namespace.replace('skripsi_mahasiswa_', '')
-                documents.append({
-                    'id': doc_id,
-                    'type': 'student_thesis',
-                    'name': f'Skripsi Mahasiswa ({doc_id[:8]}...)',
-                    'chunks_count': count,
-                    'namespace': namespace
-                })
+        documents = [
+            DocumentInfo(
+                id=doc['id'],
+                type=doc['type'],
+                name=GUIDELINES_NAME if doc['type'] == 'guidelines' else (
+                    doc['filename'] or f"Skripsi Mahasiswa ({doc['id'][:8]}...)"
+                ),
+                filename=doc['filename'],
+                namespace=doc['namespace'],
+                upload_date=doc['uploaded_at'],
+                chunks_count=doc['chunk_count'],
+                status=doc['status']
+            )
+            for doc in services.document_registry.list_documents()
+        ]
         
         return {
             'documents': documents,
             'total_documents': len(documents),
-            'total_chunks': stats.get('total_documents', 0)
+            'total_chunks': sum(doc.chunks_count for doc in documents)
         }
-        
+    
     except Exception as e:
         logger.error(f"Error listing documents: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to list documents: {str(e)}")
@@ -225,13 +537,19 @@ async def list_documents():
 async def delete_document(document_id: str):
     """Delete a document and its chunks."""
     try:
-        if document_id == 'guidelines':
-            namespace = 'pedoman'
-            deleted_count = vector_store.delete_documents_by_namespace(namespace)
+        registry = services.document_registry
+        document = registry.get(document_id)
+        if document is None:
+            raise HTTPException(status_code=404, detail="Document not found")
+        
+        deleted_count = await services.execution.ingestion.run(
+            services.vector_store.delete_documents_by_namespace, document['namespace']
+        )
+        registry.delete(document_id)
+        
+        if document['type'] == 'guidelines':
             message = f"Pedoman Skripsi deleted ({deleted_count} chunks removed)"
         else:
-            namespace = f'skripsi_mahasiswa_{document_id}'
-            deleted_count = vector_store.delete_documents_by_namespace(namespace)
             message = f"Student thesis deleted ({deleted_count} chunks removed)"
         
         return {
@@ -239,7 +557,12 @@ async def delete_document(document_id: str):
             'message': message,
             'deleted_chunks': deleted_count
         }
-        
+    
+    except HTTPException:
+        raise
+    except ServiceOverloadedError as e:
+        logger.warning(f"Rejecting delete: {e}")
+        raise HTTPException(status_code=503, detail="Server is busy, please retry later")
     except Exception as e:
         logger.error(f"Error deleting document {document_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to delete document: {str(e)}")
@@ -249,7 +572,7 @@ async def delete_document(document_id: str):
 async def get_system_stats():
     """Get comprehensive system statistics."""
     try:
-        return rag_service.get_system_stats()
+        return services.rag_service.get_system_stats()
     except Exception as e:
         logger.error(f"Error getting system stats: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
\ No newline at end of file
@@ -7,6 +7,16 @@ class Settings(BaseSettings):
     # Gemini API Configuration
     gemini_api_key: str
     
+    # Gemini Client Configuration (pooled async REST client with deadlines, retries and rate limiting)
+    gemini_async_client_enabled: bool = True
+    gemini_api_base_url: str = "https://generativelanguage.googleapis.com"
+    gemini_timeout_seconds: float = 30.0
+    gemini_max_retries: int = 4
+    # Size these to the project's Gemini quota; excess requests wait briefly instead of failing
+    gemini_requests_per_minute: int = 60
+    gemini_burst: int = 10
+    gemini_max_connections: int = 20
+    
     # Application Configuration
     app_name: str = "RAG LLM Assistant"
     app_version: str = "1.0.0"
@@ -14,16 +24,94 @@ class Settings(BaseSettings):
     
     # Database Configuration
     chroma_db_path: str = "./data/chroma_db"
+    # Embedding backend: "torch" (reference), "quantized" (int8) or "onnx"
+    embedding_backend: str = "torch"
+    onnx_model_path: str = "./data/onnx"
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "./data/embedding_cache"
+    
+    # Vector store sharding: "none" (single collection), "namespace" (one collection per
+    # namespace) or "bucket" (namespaces hashed into vector_shard_buckets collections).
+    # Run scripts/migrate_to_shards.py before switching an existing database.
+    vector_sharding: str = "none"
+    vector_shard_buckets: int = 16
+    vector_search_workers: int = 4
+    
+    # Exact Search Configuration (namespaces up to exact_search_max_chunks are scanned
+    # with NumPy instead of HNSW)
+    exact_search_enabled: bool = True
+    exact_search_path: str = "./data/exact_index"
+    exact_search_max_chunks: int = 2000
     
     # Document Processing Configuration
     max_chunk_size: int = 500
     chunk_overlap: int = 50
     max_file_size_mb: int = 50
+    ingest_batch_size: int = 256
+    pdf_parallel_extraction: bool = True
+    pdf_pages_per_task: int = 16
     
     # RAG Configuration
     top_k_retrieval: int = 5
     similarity_threshold: float = 0.7
     
+    # Hybrid Retrieval Configuration (BM25 + vector, fused with reciprocal-rank fusion)
+    hybrid_search_enabled: bool = True
+    bm25_index_path: str = "./data/bm25_index"
+    hybrid_similarity_threshold: float = 0.3
+    rrf_k: int = 60
+    
+    # Reranking Configuration
+    rerank_enabled: bool = False
+    reranker_model: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+    rerank_candidates: int = 20
+    rerank_budget_ms: float = 300.0
+    
+    # Structured Lookup Configuration (chapter/section questions served without vector search)
+    structured_lookup_enabled: bool = True
+    structured_max_chunks: int = 8
+    
+    # Context Packing Configuration
+    context_packing_enabled: bool = True
+    context_token_budget: int = 2000
+    
+    # Query Embedding Batching Configuration
+    query_batching_enabled: bool = True
+    query_batch_max_size: int = 32
+    query_batch_max_wait_ms: float = 5.0
+    
+    # Answer Cache Configuration
+    answer_cache_enabled: bool = True
+    answer_cache_similarity_threshold: float = 0.95
+    answer_cache_ttl_seconds: int = 86400
+    answer_cache_max_entries: int = 1000
+    
+    # Bulk Ingestion Configuration
+    jobs_db_path: str = "./data/jobs.sqlite3"
+    job_spool_path: str = "./data/job_spool"
+    bulk_ingestion_workers: int = 2
+    bulk_files_per_batch: int = 8
+    bulk_max_files: int = 500
+    # Claimed files are handed out again when their worker stops renewing the lease
+    job_lease_seconds: int = 120
+    
+    # Execution Configuration
+    # pdf_workers also sets the number of processes used for parallel page extraction
+    pdf_workers: int = 2
+    pdf_queue_limit: int = 8
+    embedding_workers: int = 2
+    embedding_queue_limit: int = 64
+    # Uploads run on their own pool so they never hold the embedding threads chat uses
+    ingestion_workers: int = 1
+    ingestion_queue_limit: int = 4
+    llm_concurrency: int = 8
+    llm_queue_limit: int = 64
+    
+    # Startup Configuration
+    # preload_models loads the embedding model at import time so forked workers share it
+    preload_models: bool = False
+    warm_up_on_startup: bool = True
+    
     # Server Configuration
     host: str = "0.0.0.0"
     port: int = 8000
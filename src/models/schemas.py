@@ -15,6 +15,35 @@ class UploadResponse(BaseModel):
     message: str
     document_id: Optional[str] = None
     chunks_created: Optional[int] = None
+    chunks_added: Optional[int] = None
+    chunks_updated: Optional[int] = None
+    chunks_removed: Optional[int] = None
+
+
+class BulkUploadResponse(BaseModel):
+    success: bool
+    message: str
+    job_id: str
+    files_queued: int
+
+
+class JobFileStatus(BaseModel):
+    id: int
+    filename: str
+    document_id: str
+    status: str
+    chunks_created: int
+    error: Optional[str] = None
+    updated_at: datetime
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    created_at: datetime
+    status: str
+    total_files: int
+    progress: Dict[str, int]
+    files: List[JobFileStatus]
 
 
 class ChatRequest(BaseModel):
@@ -34,12 +63,16 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[SourceReference]
     processing_time: float
+    rerank_time: Optional[float] = None
     timestamp: datetime = Field(default_factory=datetime.now)
 
 
 class DocumentInfo(BaseModel):
     id: str
-    filename: str
+    type: str
+    name: str
+    filename: Optional[str] = None
+    namespace: str
     upload_date: datetime
     chunks_count: int
     status: str
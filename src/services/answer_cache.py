@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, FrozenSet
+import numpy as np
+from loguru import logger
+
+
+class SemanticAnswerCache:
+    """Answer cache keyed by namespace set and query embedding.
+    
+    A lookup hits when a cached question over the same namespaces has a cosine
+    similarity of at least ``similarity_threshold`` with the new question.
+    Entries expire after ``ttl_seconds`` and the least recently used entry is
+    evicted once ``max_entries`` is reached. Entries can be tagged with the
+    namespace generations they were built from; a lookup passing newer
+    generations ignores them, so changes made by another process are
+    honoured even though ``invalidate_namespace`` only runs in the writer.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: int = 86400,
+        similarity_threshold: float = 0.95
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._groups: Dict[FrozenSet[str], Dict[str, Any]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def lookup(
+        self,
+        namespaces: List[str],
+        query_embedding: List[float],
+        generations: Optional[Dict[str, int]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return the cached ``answer`` and ``sources`` for a similar question, if any.
+        
+        Entries tagged with generations other than ``generations`` are skipped.
+        """
+        key = frozenset(namespaces)
+        query = self._normalize(query_embedding)
+        
+        with self._lock:
+            group = self._groups.get(key)
+            if not group or not group['ids']:
+                self.misses += 1
+                return None
+            
+            if group['matrix'] is None:
+                group['matrix'] = np.stack([self._entries[i]['embedding'] for i in group['ids']])
+            
+            scores = group['matrix'] @ query
+            now = time.time()
+            
+            for position in np.argsort(-scores):
+                if scores[position] < self.similarity_threshold:
+                    break
+                
+                entry_id = group['ids'][position]
+                entry = self._entries[entry_id]
+                if entry['expires_at'] <= now:
+                    continue
+                if generations is not None and entry['generations'] is not None \
+                        and entry['generations'] != generations:
+                    continue
+                
+                self._entries.move_to_end(entry_id)
+                self.hits += 1
+                return {
+                    'answer': entry['answer'],
+                    'sources': entry['sources'],
+                    'similarity_score': float(scores[position])
+                }
+            
+            self.misses += 1
+            return None
+    
+    def store(
+        self,
+        namespaces: List[str],
+        query_embedding: List[float],
+        answer: str,
+        sources: List[Any],
+        generations: Optional[Dict[str, int]] = None
+    ):
+        """Cache an answer for the given namespaces and question embedding."""
+        key = frozenset(namespaces)
+        
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            
+            self._entries[entry_id] = {
+                'namespaces': key,
+                'embedding': self._normalize(query_embedding),
+                'answer': answer,
+                'sources': sources,
+                'generations': generations,
+                'expires_at': time.time() + self.ttl_seconds
+            }
+            
+            group = self._groups.setdefault(key, {'ids': [], 'matrix': None})
+            group['ids'].append(entry_id)
+            group['matrix'] = None
+            
+            self._evict_locked()
+    
+    def invalidate_namespace(self, namespace: str) -> int:
+        """Drop every cached answer that was built from ``namespace``."""
+        with self._lock:
+            stale_keys = [key for key in self._groups if namespace in key]
+            removed = 0
+            
+            for key in stale_keys:
+                for entry_id in self._groups.pop(key)['ids']:
+                    self._entries.pop(entry_id, None)
+                    removed += 1
+            
+            self.invalidations += removed
+        
+        if removed:
+            logger.info(f"Invalidated {removed} cached answers for namespace {namespace}")
+        return removed
+    
+    def clear(self):
+        """Drop all cached answers."""
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+    
+    def _evict_locked(self):
+        """Remove expired entries, then least recently used ones above capacity."""
+        now = time.time()
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry['expires_at'] <= now]
+        for entry_id in expired:
+            self._remove_locked(entry_id)
+        
+        while len(self._entries) > self.max_entries:
+            entry_id = next(iter(self._entries))
+            self._remove_locked(entry_id)
+            self.evictions += 1
+    
+    def _remove_locked(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        group = self._groups.get(entry['namespaces'])
+        if group is None:
+            return
+        
+        group['ids'].remove(entry_id)
+        group['matrix'] = None
+        if not group['ids']:
+            del self._groups[entry['namespaces']]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,302 @@
+import math
+import os
+import re
+import threading
+from array import array
+from typing import List, Dict, Any, Iterable, Tuple
+import numpy as np
+from loguru import logger
+
+# Section numbers such as "2.1" or "3.2.4" are kept as single tokens
+TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)+|\w+", re.UNICODE)
+BUILT_MARKER = '.built'
+# Segments are compacted once this share of their documents is tombstoned
+COMPACT_DELETED_RATIO = 0.25
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; dotted section numbers stay whole."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> Dict[str, float]:
+    """Fuse ranked id lists: each id scores the sum of ``1 / (k + rank)`` over the lists."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+class _Segment:
+    """Inverted index of one namespace.
+    
+    Postings are ``array('i')`` pairs of document positions and term
+    frequencies, appended in place as chunks arrive. Removed chunks are
+    tombstoned and dropped the next time the segment is compacted; until
+    then they are left out of scores and document frequencies.
+    """
+    
+    def __init__(self):
+        self.doc_ids: List[str] = []
+        self.doc_lengths = array('i')
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.deleted = set()
+        self.positions: Dict[str, int] = {}
+    
+    @property
+    def live_count(self) -> int:
+        return len(self.doc_ids) - len(self.deleted)
+    
+    @property
+    def live_length(self) -> int:
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.int32)
+        if self.deleted:
+            return int(lengths.sum()) - int(lengths[list(self.deleted)].sum())
+        return int(lengths.sum())
+    
+    def document_frequency(self, term: str) -> int:
+        """Number of live documents containing ``term``."""
+        posting = self.postings.get(term)
+        if posting is None:
+            return 0
+        if not self.deleted:
+            return len(posting[0])
+        positions = np.frombuffer(posting[0], dtype=np.int32)
+        return len(positions) - int(np.isin(positions, list(self.deleted)).sum())
+    
+    def add(self, doc_id: str, tokens: List[str]):
+        if doc_id in self.positions:
+            return
+        
+        position = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(len(tokens))
+        self.positions[doc_id] = position
+        
+        frequencies: Dict[str, int] = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        
+        for token, frequency in frequencies.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = (array('i'), array('i'))
+            posting[0].append(position)
+            posting[1].append(frequency)
+    
+    def remove(self, doc_id: str):
+        position = self.positions.pop(doc_id, None)
+        if position is not None:
+            self.deleted.add(position)
+    
+    def compact(self):
+        """Rebuild the arrays without tombstoned documents."""
+        if not self.deleted:
+            return
+        
+        keep = [position for position in range(len(self.doc_ids)) if position not in self.deleted]
+        remap = np.full(len(self.doc_ids), -1, dtype=np.int32)
+        remap[keep] = np.arange(len(keep), dtype=np.int32)
+        
+        postings = {}
+        for token, (positions, frequencies) in self.postings.items():
+            old = np.frombuffer(positions, dtype=np.int32)
+            mask = remap[old] >= 0
+            if mask.any():
+                postings[token] = (
+                    array('i', remap[old[mask]].tobytes()),
+                    array('i', np.frombuffer(frequencies, dtype=np.int32)[mask].tobytes())
+                )
+        
+        self.doc_ids = [self.doc_ids[position] for position in keep]
+        self.doc_lengths = array('i', np.frombuffer(self.doc_lengths, dtype=np.int32)[keep].tobytes())
+        self.postings = postings
+        self.positions = {doc_id: position for position, doc_id in enumerate(self.doc_ids)}
+        self.deleted = set()
+    
+    def save(self, path: str):
+        self.compact()
+        terms = list(self.postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(self.postings[term][0])
+        
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            doc_ids=np.array(self.doc_ids, dtype=str),
+            doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.int32),
+            terms=np.array(terms, dtype=str),
+            offsets=offsets,
+            positions=np.concatenate(
+                [np.frombuffer(self.postings[term][0], dtype=np.int32) for term in terms]
+            ) if terms else np.zeros(0, dtype=np.int32),
+            frequencies=np.concatenate(
+                [np.frombuffer(self.postings[term][1], dtype=np.int32) for term in terms]
+            ) if terms else np.zeros(0, dtype=np.int32)
+        )
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> "_Segment":
+        segment = cls()
+        with np.load(path, allow_pickle=False) as data:
+            segment.doc_ids = data['doc_ids'].tolist()
+            segment.doc_lengths = array('i', data['doc_lengths'].astype(np.int32).tobytes())
+            offsets = data['offsets']
+            positions = data['positions'].astype(np.int32)
+            frequencies = data['frequencies'].astype(np.int32)
+            for i, term in enumerate(data['terms'].tolist()):
+                start, end = offsets[i], offsets[i + 1]
+                segment.postings[term] = (
+                    array('i', positions[start:end].tobytes()),
+                    array('i', frequencies[start:end].tobytes())
+                )
+        segment.positions = {doc_id: position for position, doc_id in enumerate(segment.doc_ids)}
+        return segment
+
+
+class BM25Index:
+    """Persistent BM25 keyword index over chunk text, one segment per namespace.
+    
+    Only chunk ids are stored, not the text, so the index stays small; the
+    caller fetches the text of hits from the vector store. Segments are kept
+    as ``.npz`` files in ``index_dir`` and are rewritten by ``flush`` after
+    each write, so restarts load the index instead of rebuilding it.
+    """
+    
+    def __init__(self, index_dir: str, k1: float = 1.5, b: float = 0.75):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self._segments: Dict[str, _Segment] = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+        self._initialize()
+    
+    def _initialize(self):
+        """Load the persisted segments."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        for filename in os.listdir(self.index_dir):
+            if filename.endswith('.npz') and not filename.endswith('.tmp.npz'):
+                namespace = filename[:-len('.npz')]
+                try:
+                    self._segments[namespace] = _Segment.load(os.path.join(self.index_dir, filename))
+                except Exception as e:
+                    logger.error(f"Error loading keyword index segment {namespace}: {e}")
+        
+        logger.info(f"BM25 index loaded with {len(self._segments)} namespaces")
+    
+    @property
+    def is_built(self) -> bool:
+        """Whether the index has been populated from the vector store at least once."""
+        return os.path.exists(os.path.join(self.index_dir, BUILT_MARKER))
+    
+    def mark_built(self):
+        with open(os.path.join(self.index_dir, BUILT_MARKER), 'w') as f:
+            f.write('1')
+    
+    def _segment_path(self, namespace: str) -> str:
+        return os.path.join(self.index_dir, f"{namespace}.npz")
+    
+    def add_documents(self, documents: Iterable[Tuple[str, str, str]]):
+        """Index ``(doc_id, namespace, text)`` triples."""
+        with self._lock:
+            for doc_id, namespace, text in documents:
+                namespace = namespace or 'unknown'
+                segment = self._segments.get(namespace)
+                if segment is None:
+                    segment = self._segments[namespace] = _Segment()
+                segment.add(doc_id, tokenize(text))
+                self._dirty.add(namespace)
+    
+    def remove_documents(self, namespace: str, doc_ids: Iterable[str]):
+        with self._lock:
+            segment = self._segments.get(namespace)
+            if segment is None:
+                return
+            for doc_id in doc_ids:
+                segment.remove(doc_id)
+            if len(segment.deleted) > COMPACT_DELETED_RATIO * len(segment.doc_ids):
+                segment.compact()
+            self._dirty.add(namespace)
+    
+    def delete_namespace(self, namespace: str):
+        with self._lock:
+            self._segments.pop(namespace, None)
+            self._dirty.discard(namespace)
+            if os.path.exists(self._segment_path(namespace)):
+                os.unlink(self._segment_path(namespace))
+    
+    def flush(self):
+        """Write changed segments to disk."""
+        with self._lock:
+            for namespace in self._dirty:
+                segment = self._segments.get(namespace)
+                if segment is None:
+                    continue
+                if segment.live_count:
+                    segment.save(self._segment_path(namespace))
+                elif os.path.exists(self._segment_path(namespace)):
+                    os.unlink(self._segment_path(namespace))
+            self._dirty.clear()
+    
+    def search(self, query: str, namespaces: List[str], top_k: int = 10) -> List[Tuple[str, str, float]]:
+        """Return up to ``top_k`` ``(doc_id, namespace, score)`` hits, best first.
+        
+        Document frequencies and average length are taken over the searched
+        namespaces together, so scores are comparable across them.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            segments = [(namespace, self._segments[namespace]) for namespace in namespaces if namespace in self._segments]
+            total_docs = sum(segment.live_count for _, segment in segments)
+            if not terms or not total_docs:
+                return []
+            
+            avg_length = sum(segment.live_length for _, segment in segments) / total_docs
+            scored = []
+            
+            for term in terms:
+                document_frequency = sum(segment.document_frequency(term) for _, segment in segments)
+                if not document_frequency:
+                    continue
+                idf = math.log(1 + (total_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+                
+                for namespace, segment in segments:
+                    posting = segment.postings.get(term)
+                    if posting is None:
+                        continue
+                    positions = np.frombuffer(posting[0], dtype=np.int32)
+                    frequencies = np.frombuffer(posting[1], dtype=np.int32).astype(np.float32)
+                    lengths = np.frombuffer(segment.doc_lengths, dtype=np.int32)[positions]
+                    norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+                    scored.append((namespace, positions, idf * frequencies * (self.k1 + 1) / (frequencies + norm)))
+            
+            hits = []
+            for namespace, segment in segments:
+                parts = [(positions, scores) for ns, positions, scores in scored if ns == namespace]
+                if not parts:
+                    continue
+                totals = np.zeros(len(segment.doc_ids), dtype=np.float32)
+                for positions, scores in parts:
+                    np.add.at(totals, positions, scores)
+                if segment.deleted:
+                    totals[list(segment.deleted)] = 0
+                
+                candidates = np.flatnonzero(totals)
+                if len(candidates) > top_k:
+                    candidates = candidates[np.argpartition(-totals[candidates], top_k - 1)[:top_k]]
+                hits.extend((segment.doc_ids[i], namespace, float(totals[i])) for i in candidates)
+        
+        hits.sort(key=lambda hit: hit[2], reverse=True)
+        return hits[:top_k]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'namespaces': len(self._segments),
+                'documents': sum(segment.live_count for segment in self._segments.values()),
+                'terms': sum(len(segment.postings) for segment in self._segments.values())
+            }
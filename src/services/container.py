@@ -0,0 +1,248 @@
+import gc
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+from .execution import ExecutionLayer
+from .pdf_processor import PDFProcessor
+from .vector_store import VectorStore, EMBEDDING_MODEL_NAME
+from .embedding_backends import EmbeddingBackend, create_embedding_backend
+from .gemini_service import GeminiService
+from .gemini_client import GeminiAsyncClient
+from .answer_cache import SemanticAnswerCache
+from .rag_service import RAGService
+from .reranker import CrossEncoderReranker
+from .context_packer import ContextPacker
+from .query_router import QueryRouter
+from .job_queue import IngestionJobQueue, BulkIngestionWorker
+from .document_registry import DocumentRegistry, REGISTRY_DB
+
+
+class ServiceContainer:
+    """Builds application services lazily, on first use.
+    
+    Importing the API module therefore costs nothing; the embedding model,
+    Chroma client and Gemini client are created the first time a request
+    needs them (or during the optional warm-up). ``preload_models`` loads the
+    embedding weights up front so forked workers share them copy-on-write.
+    """
+    
+    def __init__(self, settings):
+        self.settings = settings
+        self._instances: Dict[str, Any] = {}
+        # Last build error of services whose factory raised
+        self._failures: Dict[str, str] = {}
+        self._lock = threading.RLock()
+        self._bulk_ingestion_started = False
+    
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    start_time = time.perf_counter()
+                    try:
+                        instance = factory()
+                    except Exception as e:
+                        self._failures[name] = str(e)
+                        raise
+                    self._instances[name] = instance
+                    self._failures.pop(name, None)
+                    logger.info(f"Initialized {name} in {time.perf_counter() - start_time:.2f}s")
+        return instance
+    
+    def is_initialized(self, name: str) -> bool:
+        """Check whether a service has been built without building it."""
+        return name in self._instances
+    
+    def has_failed(self, name: str) -> bool:
+        """Check whether the last attempt to build a service raised."""
+        return name in self._failures
+    
+    @property
+    def execution(self) -> ExecutionLayer:
+        return self._get('execution', lambda: ExecutionLayer(
+            pdf_workers=self.settings.pdf_workers,
+            pdf_queue_limit=self.settings.pdf_queue_limit,
+            embedding_workers=self.settings.embedding_workers,
+            embedding_queue_limit=self.settings.embedding_queue_limit,
+            ingestion_workers=self.settings.ingestion_workers,
+            ingestion_queue_limit=self.settings.ingestion_queue_limit,
+            llm_concurrency=self.settings.llm_concurrency,
+            llm_queue_limit=self.settings.llm_queue_limit
+        ))
+    
+    @property
+    def pdf_processor(self) -> PDFProcessor:
+        return self._get('pdf_processor', lambda: PDFProcessor(
+            max_chunk_size=self.settings.max_chunk_size,
+            chunk_overlap=self.settings.chunk_overlap,
+            executor=self.execution.pdf if self.settings.pdf_parallel_extraction else None,
+            pages_per_task=self.settings.pdf_pages_per_task,
+            workers=self.settings.pdf_workers
+        ))
+    
+    @property
+    def embedding_model(self) -> EmbeddingBackend:
+        return self._get('embedding_model', lambda: create_embedding_backend(
+            self.settings.embedding_backend, EMBEDDING_MODEL_NAME, self.settings.onnx_model_path
+        ))
+    
+    @property
+    def vector_store(self) -> VectorStore:
+        return self._get('vector_store', self._create_vector_store)
+    
+    def _create_vector_store(self) -> VectorStore:
+        vector_store = VectorStore(
+            persist_directory=self.settings.chroma_db_path,
+            embedding_model=self.embedding_model,
+            embedding_cache_dir=self.settings.embedding_cache_path if self.settings.embedding_cache_enabled else None,
+            batch_size=self.settings.ingest_batch_size,
+            query_batching=self.settings.query_batching_enabled,
+            query_batch_max_size=self.settings.query_batch_max_size,
+            query_batch_max_wait_ms=self.settings.query_batch_max_wait_ms,
+            keyword_index_dir=self.settings.bm25_index_path if self.settings.hybrid_search_enabled else None,
+            rrf_k=self.settings.rrf_k,
+            hybrid_similarity_threshold=self.settings.hybrid_similarity_threshold,
+            sharding=self.settings.vector_sharding,
+            shard_buckets=self.settings.vector_shard_buckets,
+            search_workers=self.settings.vector_search_workers,
+            exact_search_dir=self.settings.exact_search_path if self.settings.exact_search_enabled else None,
+            exact_search_max_chunks=self.settings.exact_search_max_chunks
+        )
+        
+        if self.answer_cache is not None:
+            # Drop cached answers whenever a namespace is re-uploaded or deleted
+            vector_store.add_change_listener(self.answer_cache.invalidate_namespace)
+        
+        return vector_store
+    
+    @property
+    def gemini_client(self) -> Optional[GeminiAsyncClient]:
+        if not self.settings.gemini_async_client_enabled:
+            return None
+        return self._get('gemini_client', lambda: GeminiAsyncClient(
+            api_key=self.settings.gemini_api_key,
+            base_url=self.settings.gemini_api_base_url,
+            timeout_seconds=self.settings.gemini_timeout_seconds,
+            max_retries=self.settings.gemini_max_retries,
+            requests_per_minute=self.settings.gemini_requests_per_minute,
+            burst=self.settings.gemini_burst,
+            max_connections=self.settings.gemini_max_connections
+        ))
+    
+    @property
+    def gemini_service(self) -> GeminiService:
+        return self._get('gemini_service', lambda: GeminiService(
+            api_key=self.settings.gemini_api_key,
+            client=self.gemini_client
+        ))
+    
+    @property
+    def answer_cache(self) -> Optional[SemanticAnswerCache]:
+        if not self.settings.answer_cache_enabled:
+            return None
+        return self._get('answer_cache', lambda: SemanticAnswerCache(
+            max_entries=self.settings.answer_cache_max_entries,
+            ttl_seconds=self.settings.answer_cache_ttl_seconds,
+            similarity_threshold=self.settings.answer_cache_similarity_threshold
+        ))
+    
+    @property
+    def rag_service(self) -> RAGService:
+        return self._get('rag_service', lambda: RAGService(
+            vector_store=self.vector_store,
+            gemini_service=self.gemini_service,
+            answer_cache=self.answer_cache,
+            reranker=self.reranker,
+            rerank_candidates=self.settings.rerank_candidates,
+            rerank_budget_ms=self.settings.rerank_budget_ms,
+            context_packer=ContextPacker(
+                token_budget=self.settings.context_token_budget
+            ) if self.settings.context_packing_enabled else None,
+            query_router=QueryRouter(
+                max_chunks=self.settings.structured_max_chunks
+            ) if self.settings.structured_lookup_enabled else None
+        ))
+    
+    @property
+    def reranker(self) -> Optional[CrossEncoderReranker]:
+        if not self.settings.rerank_enabled:
+            return None
+        return self._get('reranker', lambda: CrossEncoderReranker(model_name=self.settings.reranker_model))
+    
+    @property
+    def document_registry(self) -> DocumentRegistry:
+        return self._get('document_registry', self._create_document_registry)
+    
+    def _create_document_registry(self) -> DocumentRegistry:
+        registry = DocumentRegistry(db_path=os.path.join(self.settings.chroma_db_path, REGISTRY_DB))
+        if registry.is_empty():
+            # Register documents ingested before the registry existed
+            stats = self.vector_store.get_collection_stats()
+            registry.backfill(stats.get('namespace_distribution', {}))
+        return registry
+    
+    @property
+    def job_queue(self) -> IngestionJobQueue:
+        return self._get('job_queue', lambda: IngestionJobQueue(
+            db_path=self.settings.jobs_db_path,
+            lease_seconds=self.settings.job_lease_seconds
+        ))
+    
+    @property
+    def bulk_ingestion(self) -> BulkIngestionWorker:
+        return self._get('bulk_ingestion', lambda: BulkIngestionWorker(
+            job_queue=self.job_queue,
+            pdf_processor=self.pdf_processor,
+            vector_store=self.vector_store,
+            document_registry=self.document_registry,
+            workers=self.settings.bulk_ingestion_workers,
+            files_per_batch=self.settings.bulk_files_per_batch,
+            executor=self.execution.ingestion
+        ))
+    
+    def ensure_bulk_ingestion_started(self):
+        """Start the bulk ingestion workers if they are not running yet."""
+        with self._lock:
+            if not self._bulk_ingestion_started:
+                self.bulk_ingestion.start()
+                self._bulk_ingestion_started = True
+    
+    def preload_models(self):
+        """Load the model weights now, before worker processes are forked.
+        
+        Objects that hold sockets or SQLite handles (Chroma, Gemini) are not
+        created here because they must not be shared across a fork.
+        """
+        self.embedding_model
+        self.reranker
+        # Keep the loaded objects out of later GC passes so their pages stay shared
+        gc.freeze()
+        logger.info("Models preloaded")
+    
+    def warm_up(self):
+        """Build the services and run one query embedding so the first request is fast."""
+        try:
+            start_time = time.perf_counter()
+            self.rag_service
+            self.vector_store.embedding_model.encode(["pemanasan model"])
+            logger.info(f"Services warmed up in {time.perf_counter() - start_time:.2f}s")
+        except Exception as e:
+            logger.error(f"Error warming up services: {e}")
+    
+    def shutdown(self):
+        """Stop background workers and pools that were started."""
+        if self._bulk_ingestion_started:
+            self.bulk_ingestion.stop()
+        if self.is_initialized('vector_store'):
+            self.vector_store.close()
+        if self.is_initialized('execution'):
+            self.execution.shutdown()
+    
+    async def aclose(self):
+        """Close async resources; must run on the event loop that used them."""
+        if self.is_initialized('gemini_client'):
+            await self.gemini_client.aclose()
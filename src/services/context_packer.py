@@ -0,0 +1,159 @@
+import hashlib
+import math
+import re
+from typing import List, Dict, Any, Tuple
+from loguru import logger
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate for Gemini prompts.
+    
+    Roughly four characters per token, but never fewer tokens than words
+    and punctuation marks, which keeps short tokens like "2.1" or "BAB"
+    from being undercounted. No tokenizer or API call is needed.
+    """
+    if not text:
+        return 0
+    return max(len(WORD_PATTERN.findall(text)), math.ceil(len(text) / 4))
+
+
+def _overlap_length(left: List[str], right: List[str]) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``."""
+    if not left or not right:
+        return 0
+    
+    longest = min(len(left), len(right))
+    first = right[0]
+    for start in range(len(left) - longest, len(left)):
+        if left[start] == first and left[start:] == right[:len(left) - start]:
+            return len(left) - start
+    return 0
+
+
+class ContextPacker:
+    """Packs retrieved chunks into a token budget before prompt assembly.
+    
+    Chunks are deduplicated, consecutive windows of the same section are
+    merged with their overlapping words removed, and the resulting blocks
+    are added in relevance order (the order of the input list) until
+    ``token_budget`` is reached. A block that crosses the budget is trimmed
+    to a window starting at its best-ranked chunk.
+    """
+    
+    def __init__(self, token_budget: int = 2000):
+        self.token_budget = token_budget
+    
+    @staticmethod
+    def _section_key(chunk: Dict[str, Any]) -> Tuple[Any, ...]:
+        metadata = chunk.get('metadata', {})
+        return (
+            metadata.get('namespace'),
+            metadata.get('document_id'),
+            metadata.get('chapter'),
+            metadata.get('section')
+        )
+    
+    def _merge_blocks(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Group chunks into blocks of consecutive windows, keeping each block's best rank and where its words start."""
+        seen = set()
+        unique = []
+        for rank, chunk in enumerate(chunks):
+            digest = hashlib.sha1(chunk.get('content', '').encode('utf-8')).digest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            unique.append((rank, chunk))
+        
+        sections: Dict[Tuple[Any, ...], List[Tuple[int, Dict[str, Any]]]] = {}
+        for rank, chunk in unique:
+            sections.setdefault(self._section_key(chunk), []).append((rank, chunk))
+        
+        blocks = []
+        for members in sections.values():
+            members.sort(key=lambda member: member[1].get('metadata', {}).get('chunk_index', 0))
+            
+            current = None
+            for rank, chunk in members:
+                metadata = chunk.get('metadata', {})
+                words = chunk.get('content', '').split()
+                index = metadata.get('chunk_index')
+                
+                if current is not None and index is not None and current['last_index'] is not None \
+                        and index == current['last_index'] + 1:
+                    overlap = _overlap_length(current['words'], words)
+                    if rank < current['rank']:
+                        current['rank'] = rank
+                        current['best_start'] = len(current['words']) - overlap
+                    current['words'].extend(words[overlap:])
+                    current['last_index'] = index
+                    current['chunks'].append(chunk)
+                    continue
+                
+                if current is not None:
+                    blocks.append(current)
+                current = {'words': list(words), 'last_index': index, 'rank': rank, 'best_start': 0, 'chunks': [chunk]}
+            
+            if current is not None:
+                blocks.append(current)
+        
+        blocks.sort(key=lambda block: block['rank'])
+        return blocks
+    
+    @staticmethod
+    def _block_chunk(block: Dict[str, Any], words: List[str]) -> Dict[str, Any]:
+        first = block['chunks'][0]
+        metadata = dict(first.get('metadata', {}))
+        
+        pages_start = [c['metadata']['page_start'] for c in block['chunks'] if 'page_start' in c.get('metadata', {})]
+        pages_end = [c['metadata']['page_end'] for c in block['chunks'] if 'page_end' in c.get('metadata', {})]
+        if pages_start:
+            metadata['page_start'] = min(pages_start)
+        if pages_end:
+            metadata['page_end'] = max(pages_end)
+        metadata['merged_chunks'] = len(block['chunks'])
+        
+        return {
+            'id': first.get('id'),
+            'content': ' '.join(words),
+            'metadata': metadata,
+            'similarity_score': max(c.get('similarity_score', 0.0) for c in block['chunks'])
+        }
+    
+    def pack(self, chunks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """Return the packed context chunks and token statistics."""
+        tokens_before = sum(estimate_tokens(chunk.get('content', '')) for chunk in chunks)
+        
+        packed = []
+        tokens_used = 0
+        for block in self._merge_blocks(chunks):
+            words = block['words']
+            tokens = estimate_tokens(' '.join(words))
+            
+            if tokens_used + tokens > self.token_budget:
+                remaining = self.token_budget - tokens_used
+                if remaining <= 0:
+                    break
+                # Trim the block that crosses the budget around its best-ranked chunk, then stop
+                keep = max(1, int(len(words) * remaining / tokens))
+                start = max(0, min(block['best_start'], len(words) - keep))
+                words = words[start:start + keep]
+                packed.append(self._block_chunk(block, words))
+                tokens_used += estimate_tokens(' '.join(words))
+                break
+            
+            packed.append(self._block_chunk(block, words))
+            tokens_used += tokens
+        
+        stats = {
+            'input_chunks': len(chunks),
+            'packed_blocks': len(packed),
+            'tokens_before': tokens_before,
+            'tokens_after': tokens_used
+        }
+        logger.info(
+            f"Packed context: {stats['input_chunks']} chunks -> {stats['packed_blocks']} blocks, "
+            f"~{tokens_before} -> ~{tokens_used} tokens (budget {self.token_budget})"
+        )
+        return packed, stats
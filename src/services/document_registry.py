@@ -0,0 +1,169 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Iterator
+from loguru import logger
+
+REGISTRY_DB = 'documents.sqlite3'
+GUIDELINES_DOCUMENT_ID = 'guidelines'
+GUIDELINES_NAMESPACE = 'pedoman'
+GUIDELINES_NAME = 'Pedoman Skripsi UIN Imam Bonjol Padang'
+THESIS_NAMESPACE_PREFIX = 'skripsi_mahasiswa_'
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """Hash a file in fixed-size blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentRegistry:
+    """SQLite registry of uploaded documents, stored next to the Chroma data.
+    
+    One row per document (guidelines or student thesis) with its namespace,
+    original filename, upload time, chunk count, content hash and status, so
+    listing, duplicate detection and deletion are indexed lookups instead of
+    scans over the chunk metadata.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._initialize()
+    
+    def _initialize(self):
+        """Create the documents table."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL UNIQUE,
+                    type TEXT NOT NULL,
+                    filename TEXT,
+                    content_hash TEXT,
+                    uploaded_at TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents(type, content_hash);
+            """)
+        
+        logger.info("Document registry initialized successfully")
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def namespace_for(document_id: str) -> str:
+        """Get the vector store namespace of a document id."""
+        if document_id == GUIDELINES_DOCUMENT_ID:
+            return GUIDELINES_NAMESPACE
+        return f"{THESIS_NAMESPACE_PREFIX}{document_id}"
+    
+    def register(
+        self,
+        document_id: str,
+        filename: Optional[str],
+        content_hash: Optional[str],
+        status: str = 'processing'
+    ):
+        """Insert a document, or reset an existing one for re-ingestion."""
+        doc_type = 'guidelines' if document_id == GUIDELINES_DOCUMENT_ID else 'student_thesis'
+        
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO documents (id, namespace, type, filename, content_hash, uploaded_at, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET filename = excluded.filename, "
+                "content_hash = excluded.content_hash, uploaded_at = excluded.uploaded_at, "
+                "status = excluded.status, error = NULL",
+                (document_id, self.namespace_for(document_id), doc_type, filename, content_hash,
+                 datetime.now().isoformat(), status)
+            )
+    
+    def mark_ready(self, document_id: str, chunk_count: int):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE documents SET status = 'ready', chunk_count = ? WHERE id = ?",
+                (chunk_count, document_id)
+            )
+    
+    def mark_failed(self, document_id: str, error: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE documents SET status = 'failed', chunk_count = 0, error = ? WHERE id = ?",
+                (error, document_id)
+            )
+    
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Get a document by id, or None if it is not registered."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM documents WHERE id = ?", (document_id,)).fetchone()
+            return dict(row) if row else None
+    
+    def find_by_hash(self, content_hash: str, doc_type: str = 'student_thesis') -> Optional[Dict[str, Any]]:
+        """Find a successfully ingested document with the same file content."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM documents WHERE type = ? AND content_hash = ? AND status = 'ready' "
+                "ORDER BY uploaded_at LIMIT 1",
+                (doc_type, content_hash)
+            ).fetchone()
+            return dict(row) if row else None
+    
+    def list_documents(self) -> List[Dict[str, Any]]:
+        """List all registered documents, guidelines first, then by upload time."""
+        with self._connect() as conn:
+            return [
+                dict(row) for row in conn.execute(
+                    "SELECT * FROM documents ORDER BY type = 'student_thesis', uploaded_at"
+                )
+            ]
+    
+    def delete(self, document_id: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM documents WHERE id = ?", (document_id,)).rowcount > 0
+    
+    def is_empty(self) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM documents LIMIT 1").fetchone() is None
+    
+    def backfill(self, namespace_counts: Dict[str, int]):
+        """Register documents that were stored before the registry existed.
+        
+        Only the namespace and chunk count are known for these; filename and
+        content hash stay empty.
+        """
+        now = datetime.now().isoformat()
+        rows = []
+        for namespace, count in namespace_counts.items():
+            if namespace == GUIDELINES_NAMESPACE:
+                rows.append((GUIDELINES_DOCUMENT_ID, namespace, 'guidelines', count))
+            elif namespace.startswith(THESIS_NAMESPACE_PREFIX):
+                rows.append((namespace[len(THESIS_NAMESPACE_PREFIX):], namespace, 'student_thesis', count))
+        
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO documents (id, namespace, type, uploaded_at, chunk_count, status) "
+                "VALUES (?, ?, ?, ?, ?, 'ready')",
+                [(document_id, namespace, doc_type, now, count) for document_id, namespace, doc_type, count in rows]
+            )
+        
+        logger.info(f"Registered {len(rows)} existing documents")
@@ -0,0 +1,180 @@
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import List, Dict, Optional
+import numpy as np
+from loguru import logger
+
+EMBEDDING_BACKENDS = ('torch', 'quantized', 'onnx')
+
+
+class EmbeddingBackend(ABC):
+    """Common interface for sentence embedding backends.
+    
+    ``encode`` mirrors ``SentenceTransformer.encode``: it takes a list of
+    texts and returns a float32 matrix of L2-normalized embeddings.
+    """
+    
+    name: str = ""
+    
+    @abstractmethod
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode ``texts`` into a float32 matrix of normalized embeddings."""
+    
+    @abstractmethod
+    def get_sentence_embedding_dimension(self) -> int:
+        """Get the embedding dimension."""
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Full-precision PyTorch model (the reference backend)."""
+    
+    def __init__(self, model_name: str, device: Optional[str] = None):
+        from sentence_transformers import SentenceTransformer
+        
+        self.model_name = model_name
+        self.name = f"{model_name}@torch"
+        self.model = SentenceTransformer(model_name, device=device)
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts), dtype=np.float32)
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+
+class QuantizedTorchBackend(SentenceTransformerBackend):
+    """PyTorch model with int8 dynamically quantized linear layers."""
+    
+    def __init__(self, model_name: str):
+        import torch
+        
+        # Dynamic quantization is CPU-only
+        super().__init__(model_name, device='cpu')
+        self.name = f"{model_name}@quantized"
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """Transformer exported to ONNX and run with ONNX Runtime.
+    
+    The model is exported once into ``model_dir`` on first use; pooling and
+    normalization are done in NumPy to match the sentence-transformers
+    pipeline (mean pooling followed by L2 normalization).
+    """
+    
+    def __init__(self, model_name: str, model_dir: str, batch_size: int = 32):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise RuntimeError("EMBEDDING_BACKEND=onnx requires the onnxruntime package") from e
+        
+        from sentence_transformers import SentenceTransformer
+        
+        self.model_name = model_name
+        self.name = f"{model_name}@onnx"
+        self.batch_size = batch_size
+        
+        reference = SentenceTransformer(model_name, device='cpu')
+        self.tokenizer = reference.tokenizer
+        self.max_seq_length = reference.max_seq_length
+        self.dimension = reference.get_sentence_embedding_dimension()
+        
+        model_path = os.path.join(model_dir, f"{model_name}.onnx")
+        if not os.path.exists(model_path):
+            self._export(reference, model_path)
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+    
+    def _export(self, reference, model_path: str):
+        import torch
+        
+        class HiddenStates(torch.nn.Module):
+            def __init__(self, transformer):
+                super().__init__()
+                self.transformer = transformer
+            
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.transformer(
+                    input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+                )[0]
+        
+        os.makedirs(os.path.dirname(model_path), exist_ok=True)
+        sample = self.tokenizer(["contoh kalimat"], return_tensors='pt')
+        input_names = ['input_ids', 'attention_mask', 'token_type_ids']
+        
+        torch.onnx.export(
+            HiddenStates(reference[0].auto_model.eval()),
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes={name: {0: 'batch', 1: 'sequence'} for name in input_names + ['last_hidden_state']},
+            opset_version=14
+        )
+        logger.info(f"Exported {self.model_name} to ONNX at {model_path}")
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        outputs = []
+        for start in range(0, len(texts), self.batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            inputs = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+            hidden = self.session.run(None, inputs)[0]
+            
+            mask = inputs['attention_mask'][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            outputs.append(pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None))
+        
+        if not outputs:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.concatenate(outputs).astype(np.float32)
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+
+def create_embedding_backend(backend: str, model_name: str, onnx_dir: str = "./data/onnx") -> EmbeddingBackend:
+    """Create the embedding backend selected in settings."""
+    if backend == 'torch':
+        return SentenceTransformerBackend(model_name)
+    if backend == 'quantized':
+        return QuantizedTorchBackend(model_name)
+    if backend == 'onnx':
+        return OnnxBackend(model_name, onnx_dir)
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+
+
+def cosine_agreement(reference: EmbeddingBackend, candidate: EmbeddingBackend, texts: List[str]) -> Dict[str, float]:
+    """Compare a candidate backend against the reference on the same texts."""
+    expected = reference.encode(texts)
+    actual = candidate.encode(texts)
+    
+    expected = expected / np.linalg.norm(expected, axis=1, keepdims=True)
+    actual = actual / np.linalg.norm(actual, axis=1, keepdims=True)
+    cosines = (expected * actual).sum(axis=1)
+    
+    return {
+        'mean_cosine': float(cosines.mean()),
+        'min_cosine': float(cosines.min()),
+        'p5_cosine': float(np.percentile(cosines, 5))
+    }
+
+
+def measure_throughput(backend: EmbeddingBackend, texts: List[str], repeats: int = 3) -> float:
+    """Return the best observed texts/second over ``repeats`` runs."""
+    backend.encode(texts[:8])  # warm-up
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.encode(texts)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
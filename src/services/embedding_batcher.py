@@ -0,0 +1,170 @@
+import asyncio
+import bisect
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Callable, Sequence, Tuple
+from loguru import logger
+from .execution import ServiceOverloadedError
+
+
+class Histogram:
+    """Fixed-bucket histogram; each bucket counts observations <= its upper bound."""
+    
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = list(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._count += 1
+            self._sum += value
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            labels = [f"le_{bound:g}" for bound in self.buckets] + ["le_inf"]
+            return {
+                'count': self._count,
+                'mean': self._sum / self._count if self._count else 0.0,
+                'buckets': dict(zip(labels, self._counts))
+            }
+
+
+class QueryEmbeddingBatcher:
+    """Coalesces concurrent query embeddings into batched encoder calls.
+    
+    Requests arriving within ``max_wait_ms`` of the first queued request (or
+    until ``max_batch_size`` requests are waiting) are encoded together by a
+    single background thread, and each caller receives its own vector.
+    Callers wait at most ``result_timeout`` seconds; requests still queued
+    when the batcher is stopped fail instead of waiting forever.
+    """
+    
+    def __init__(
+        self,
+        encode: Callable[[List[str]], Sequence[Sequence[float]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_pending: int = 1024,
+        result_timeout: float = 30.0
+    ):
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_pending = max_pending
+        self.result_timeout = result_timeout
+        
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+        
+        self.batch_size_histogram = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.queue_wait_histogram = Histogram([0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1])
+        
+        self._thread.start()
+        logger.info(f"Query embedding batcher started (max_batch_size={max_batch_size}, max_wait_ms={max_wait_ms})")
+    
+    def submit(self, query: str) -> Future:
+        """Queue a query and return a future resolving to its embedding."""
+        if self._stop_event.is_set():
+            raise RuntimeError("Query embedding batcher is stopped")
+        if self._queue.qsize() >= self.max_pending:
+            raise ServiceOverloadedError("query_embedding", self.max_pending)
+        
+        future: Future = Future()
+        self._queue.put((query, future, time.perf_counter()))
+        return future
+    
+    def embed(self, query: str) -> List[float]:
+        """Embed a query, blocking until its batch has been encoded."""
+        future = self.submit(query)
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+    
+    async def embed_async(self, query: str) -> List[float]:
+        """Embed a query without blocking the event loop or a pool thread."""
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(query)), timeout=self.result_timeout)
+    
+    @staticmethod
+    def _resolve(future: Future, result: Any = None, exception: Exception = None):
+        # A caller that timed out has cancelled its future
+        try:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+    
+    def _collect_batch(self) -> List[Tuple[str, Future, float]]:
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if not batch:
+                continue
+            
+            started = time.perf_counter()
+            for _, _, enqueued_at in batch:
+                self.queue_wait_histogram.observe(started - enqueued_at)
+            self.batch_size_histogram.observe(len(batch))
+            
+            try:
+                embeddings = self.encode([query for query, _, _ in batch])
+                for (_, future, _), embedding in zip(batch, embeddings):
+                    self._resolve(future, list(map(float, embedding)))
+            except Exception as e:
+                logger.error(f"Error encoding query batch: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        self._resolve(future, exception=e)
+    
+    def stop(self):
+        """Stop the background thread and fail every request still queued."""
+        self._stop_event.set()
+        self._thread.join(timeout=1)
+        
+        drained = 0
+        while True:
+            try:
+                _, future, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._resolve(future, exception=RuntimeError("Query embedding batcher stopped"))
+            drained += 1
+        if drained:
+            logger.warning(f"Failed {drained} queued query embeddings on shutdown")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batch-size and queue-wait (seconds) histograms."""
+        return {
+            'pending': self._queue.qsize(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batch_size': self.batch_size_histogram.snapshot(),
+            'queue_wait_seconds': self.queue_wait_histogram.snapshot()
+        }
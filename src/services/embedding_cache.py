@@ -0,0 +1,120 @@
+import fcntl
+import hashlib
+import os
+import re
+import threading
+from typing import List, Optional, Dict
+import numpy as np
+from loguru import logger
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by model name and chunk text hash.
+    
+    Embeddings are appended to a raw float32 matrix (``vectors.f32``) that is
+    read through a memory map, and ``index.txt`` maps each text hash to its row.
+    Each model gets its own directory so vectors of different models never mix.
+    Appends hold an exclusive ``flock`` on the vectors file and take their row
+    numbers from its size, so several processes can share one cache.
+    """
+    
+    def __init__(self, cache_dir: str, model_name: str, dimension: int):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.directory = os.path.join(cache_dir, re.sub(r'[^\w\-\.]', '_', model_name))
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.index_path = os.path.join(self.directory, "index.txt")
+        
+        self._index: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._load()
+    
+    @staticmethod
+    def text_hash(text: str) -> str:
+        """Hash of the whitespace-normalized text."""
+        normalized = ' '.join(text.split())
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    
+    def _load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        
+        row_bytes = self.dimension * 4
+        with open(self.vectors_path, 'ab') as vectors_file:
+            # A trailing row may still be in another process's append; only truncate under its lock
+            fcntl.flock(vectors_file, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(vectors_file.fileno()).st_size
+                rows = size // row_bytes
+                if size != rows * row_bytes:
+                    # Drop a partially written trailing row so appends stay aligned
+                    vectors_file.truncate(rows * row_bytes)
+                
+                if os.path.exists(self.index_path):
+                    with open(self.index_path, 'r', encoding='utf-8') as index_file:
+                        for line in index_file:
+                            parts = line.split()
+                            # Ignore entries whose vector row was never fully written
+                            if len(parts) == 2 and int(parts[1]) < rows:
+                                self._index[parts[0]] = int(parts[1])
+            finally:
+                fcntl.flock(vectors_file, fcntl.LOCK_UN)
+        
+        self._remap(rows)
+        logger.info(f"Embedding cache loaded with {len(self._index)} entries for {self.model_name}")
+    
+    def _remap(self, rows: int):
+        if rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dimension))
+        else:
+            self._vectors = None
+    
+    def __len__(self) -> int:
+        return len(self._index)
+    
+    def get_many(self, hashes: List[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached embedding for each hash, or None on a miss."""
+        with self._lock:
+            results = []
+            for text_hash in hashes:
+                row = self._index.get(text_hash)
+                results.append(np.array(self._vectors[row]) if row is not None else None)
+            return results
+    
+    def put_many(self, hashes: List[str], embeddings: np.ndarray):
+        """Append new embeddings to the cache."""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        
+        with self._lock:
+            pending: Dict[str, np.ndarray] = {}
+            for text_hash, embedding in zip(hashes, embeddings):
+                if text_hash not in self._index:
+                    pending.setdefault(text_hash, embedding)
+            
+            new_rows = list(pending.items())
+            if not new_rows:
+                return
+            
+            row_bytes = self.dimension * 4
+            with open(self.vectors_path, 'ab') as vectors_file:
+                # Other processes may have appended since this one mapped the file
+                fcntl.flock(vectors_file, fcntl.LOCK_EX)
+                try:
+                    size = os.fstat(vectors_file.fileno()).st_size
+                    start_row = size // row_bytes
+                    if size != start_row * row_bytes:
+                        # Drop a partially written trailing row so appends stay aligned
+                        vectors_file.truncate(start_row * row_bytes)
+                    
+                    # Vectors are written before the index so a crash never leaves dangling index rows
+                    vectors_file.write(np.stack([e for _, e in new_rows]).tobytes())
+                    vectors_file.flush()
+                    
+                    with open(self.index_path, 'a', encoding='utf-8') as index_file:
+                        for offset, (text_hash, _) in enumerate(new_rows):
+                            index_file.write(f"{text_hash} {start_row + offset}\n")
+                            self._index[text_hash] = start_row + offset
+                finally:
+                    fcntl.flock(vectors_file, fcntl.LOCK_UN)
+            
+            self._remap(start_row + len(new_rows))
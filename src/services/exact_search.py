@@ -0,0 +1,165 @@
+import hashlib
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from loguru import logger
+
+UNSAFE_FILE_CHARS = re.compile(r'[^\w\-]')
+
+
+def top_k_cosine(vectors: np.ndarray, query_vector: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return row positions and cosine scores of the ``top_k`` rows closest to ``query_vector``, best first.
+    
+    Rows and the query must be L2-normalized; one matrix-vector product
+    scores every row and ``argpartition`` selects the best without a full sort.
+    """
+    scores = vectors @ query_vector
+    k = min(top_k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    if k < len(scores):
+        positions = np.argpartition(-scores, k - 1)[:k]
+    else:
+        positions = np.arange(len(scores))
+    positions = positions[np.argsort(-scores[positions], kind='stable')]
+    return positions, scores[positions]
+
+
+class ExactSearchIndex:
+    """Per-namespace embedding matrices for brute-force search of small namespaces.
+    
+    Each namespace is stored as a contiguous L2-normalized float32 matrix
+    (``<name>.f32``, read through a memory map) with its chunk ids in
+    ``<name>.ids.txt``. Matrices are built from the vector store on first use
+    and dropped by ``invalidate`` whenever the namespace changes, so they are
+    rebuilt lazily after the next write.
+    
+    Every matrix and skip decision is tagged with the namespace generation it
+    was derived from. Generations are kept by the caller in shared storage,
+    and ``refresh`` drops entries of an older generation, so a change made by
+    another process is noticed on the next lookup.
+    """
+    
+    def __init__(self, index_dir: str, dimension: int):
+        self.index_dir = index_dir
+        self.dimension = dimension
+        self._loaded: Dict[str, Tuple[List[str], np.ndarray]] = {}
+        # Namespaces known to be too large (or empty) for exact search until their next change
+        self._skipped = set()
+        # Generation each loaded matrix or skip decision was derived from
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.queries = 0
+        self._initialize()
+    
+    def _initialize(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        logger.info(f"Exact search index ready at {self.index_dir}")
+    
+    def _paths(self, namespace: str) -> Tuple[str, str]:
+        digest = hashlib.sha1(namespace.encode('utf-8')).hexdigest()[:8]
+        name = f"{UNSAFE_FILE_CHARS.sub('_', namespace)[:60]}-{digest}"
+        return os.path.join(self.index_dir, f"{name}.f32"), os.path.join(self.index_dir, f"{name}.ids.txt")
+    
+    def get_loaded(self, namespace: str) -> Optional[Tuple[List[str], np.ndarray]]:
+        return self._loaded.get(namespace)
+    
+    def is_skipped(self, namespace: str) -> bool:
+        return namespace in self._skipped
+    
+    def skip(self, namespace: str, generation: int):
+        with self._lock:
+            self._skipped.add(namespace)
+            self._generations[namespace] = generation
+    
+    def refresh(self, namespace: str, generation: int):
+        """Forget the matrix or skip decision of ``namespace`` if it predates ``generation``."""
+        if self._generations.get(namespace) == generation:
+            return
+        with self._lock:
+            if self._generations.pop(namespace, None) is not None:
+                self._loaded.pop(namespace, None)
+                self._skipped.discard(namespace)
+    
+    def load(self, namespace: str, expected_rows: int, generation: int) -> Optional[Tuple[List[str], np.ndarray]]:
+        """Map a persisted matrix, or return None if it is missing, stale or does not hold ``expected_rows`` rows."""
+        vectors_path, ids_path = self._paths(namespace)
+        if not os.path.exists(vectors_path) or not os.path.exists(ids_path):
+            return None
+        
+        with open(ids_path, 'r', encoding='utf-8') as ids_file:
+            header, _, body = ids_file.read().partition('\n')
+        if header != f"generation {generation}":
+            return None
+        ids = body.split('\n') if expected_rows else []
+        if len(ids) != expected_rows or os.path.getsize(vectors_path) != expected_rows * self.dimension * 4:
+            return None
+        
+        vectors = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=(expected_rows, self.dimension))
+        with self._lock:
+            self._loaded[namespace] = (ids, vectors)
+            self._generations[namespace] = generation
+        return ids, vectors
+    
+    def build(
+        self,
+        namespace: str,
+        ids: List[str],
+        embeddings: Sequence[Sequence[float]],
+        generation: int
+    ) -> Tuple[List[str], np.ndarray]:
+        """Normalize, persist and map the embeddings of a namespace.
+        
+        ``generation`` must be read before the embeddings are fetched. If the
+        namespace changes meanwhile, the matrix carries the older generation
+        and is dropped and rebuilt on the next lookup.
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        
+        with self._lock:
+            vectors_path, ids_path = self._paths(namespace)
+            # Unique temporary names, as processes sharing the directory may build the same namespace
+            suffix = f"{os.getpid()}-{threading.get_ident()}.tmp"
+            vectors.tofile(f"{vectors_path}.{suffix}")
+            with open(f"{ids_path}.{suffix}", 'w', encoding='utf-8') as ids_file:
+                ids_file.write(f"generation {generation}\n" + '\n'.join(ids))
+            os.replace(f"{vectors_path}.{suffix}", vectors_path)
+            os.replace(f"{ids_path}.{suffix}", ids_path)
+            
+            mapped = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=vectors.shape) if len(ids) else vectors
+            self._loaded[namespace] = (list(ids), mapped)
+            self._generations[namespace] = generation
+        
+        logger.info(f"Built exact search matrix for {namespace} ({len(ids)} chunks)")
+        return self._loaded[namespace]
+    
+    def invalidate(self, namespace: str):
+        """Drop the matrix of a changed namespace."""
+        with self._lock:
+            self._generations.pop(namespace, None)
+            self._loaded.pop(namespace, None)
+            self._skipped.discard(namespace)
+            for path in self._paths(namespace):
+                if os.path.exists(path):
+                    os.unlink(path)
+    
+    def search(
+        self, namespace: str, query_vector: np.ndarray, top_k: int
+    ) -> Tuple[List[str], np.ndarray]:
+        """Return the ids and cosine scores of the ``top_k`` best chunks of a loaded namespace."""
+        ids, vectors = self._loaded[namespace]
+        positions, scores = top_k_cosine(vectors, query_vector, top_k)
+        self.queries += 1
+        return [ids[position] for position in positions], scores
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'loaded_namespaces': len(self._loaded),
+                'loaded_chunks': sum(len(ids) for ids, _ in self._loaded.values()),
+                'ann_namespaces': len(self._skipped),
+                'queries': self.queries
+            }
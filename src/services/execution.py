@@ -0,0 +1,158 @@
+import asyncio
+import functools
+import threading
+from contextlib import asynccontextmanager
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict
+from loguru import logger
+
+
+class ServiceOverloadedError(Exception):
+    """Raised when a pool already has its maximum number of pending tasks."""
+    
+    def __init__(self, pool_name: str, max_pending: int):
+        self.pool_name = pool_name
+        self.max_pending = max_pending
+        super().__init__(f"{pool_name} pool is overloaded ({max_pending} tasks pending)")
+
+
+class BoundedExecutor:
+    """Runs blocking callables on an executor with a cap on pending tasks."""
+    
+    def __init__(self, name: str, executor: Executor, max_pending: int):
+        self.name = name
+        self.executor = executor
+        self.max_pending = max_pending
+        self._pending = 0
+        # Tasks are also submitted from worker threads (see ``submit``)
+        self._lock = threading.Lock()
+    
+    @property
+    def pending(self) -> int:
+        return self._pending
+    
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise ServiceOverloadedError(self.name, self.max_pending)
+            self._pending += 1
+    
+    def _release(self, *_):
+        with self._lock:
+            self._pending -= 1
+    
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``func`` on the pool, or raise if the queue is full."""
+        self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self.executor, functools.partial(func, *args, **kwargs)
+            )
+        finally:
+            self._release()
+    
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> Future:
+        """Submit ``func`` from any thread, or raise if the queue is full."""
+        self._acquire()
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncConcurrencyLimiter:
+    """Bounds in-flight and queued coroutines for async I/O work."""
+    
+    def __init__(self, name: str, max_concurrency: int, max_pending: int):
+        self.name = name
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending = 0
+    
+    @property
+    def pending(self) -> int:
+        return self._pending
+    
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one concurrency slot for the duration of the block, or raise if the queue is full."""
+        if self._pending >= self.max_pending:
+            raise ServiceOverloadedError(self.name, self.max_pending)
+        
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                yield
+        finally:
+            self._pending -= 1
+    
+    async def run(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await ``func(*args, **kwargs)`` once a slot is free, or raise if the queue is full."""
+        async with self.slot():
+            return await func(*args, **kwargs)
+
+
+class ExecutionLayer:
+    """Dedicated pools for PDF parsing, ingestion, embedding and LLM calls.
+    
+    PDF parsing is CPU-bound and runs in a process pool. Uploads run their
+    lazy extract-embed-store pipeline on the ingestion thread pool for the
+    whole upload, so they never hold the embedding pool that serves query
+    embedding and retrieval for chat (the encoder releases the GIL). LLM
+    calls are plain async I/O bounded by a semaphore. Keeping them separate
+    means a large upload cannot starve chat requests.
+    """
+    
+    def __init__(
+        self,
+        pdf_workers: int = 2,
+        pdf_queue_limit: int = 8,
+        embedding_workers: int = 2,
+        embedding_queue_limit: int = 64,
+        ingestion_workers: int = 1,
+        ingestion_queue_limit: int = 4,
+        llm_concurrency: int = 8,
+        llm_queue_limit: int = 64
+    ):
+        self.pdf = BoundedExecutor(
+            "pdf",
+            ProcessPoolExecutor(max_workers=pdf_workers),
+            pdf_queue_limit
+        )
+        self.embedding = BoundedExecutor(
+            "embedding",
+            ThreadPoolExecutor(max_workers=embedding_workers, thread_name_prefix="embedding"),
+            embedding_queue_limit
+        )
+        self.ingestion = BoundedExecutor(
+            "ingestion",
+            ThreadPoolExecutor(max_workers=ingestion_workers, thread_name_prefix="ingestion"),
+            ingestion_queue_limit
+        )
+        self.llm = AsyncConcurrencyLimiter("llm", llm_concurrency, llm_queue_limit)
+        
+        logger.info(
+            f"Execution layer initialized (pdf={pdf_workers}, embedding={embedding_workers}, "
+            f"ingestion={ingestion_workers}, llm={llm_concurrency})"
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get current queue depth per pool."""
+        return {
+            pool.name: {'pending': pool.pending, 'max_pending': pool.max_pending}
+            for pool in (self.pdf, self.embedding, self.ingestion, self.llm)
+        }
+    
+    def shutdown(self):
+        """Stop the worker pools."""
+        self.pdf.shutdown()
+        self.embedding.shutdown()
+        self.ingestion.shutdown()
+        logger.info("Execution layer shut down")
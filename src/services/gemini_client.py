@@ -0,0 +1,254 @@
+import asyncio
+import json
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Optional
+import httpx
+from loguru import logger
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class GeminiAPIError(Exception):
+    """A Gemini request failed after all retries or before its deadline."""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter.
+    
+    Tokens refill at ``rate`` per second up to ``capacity``; ``acquire``
+    waits for a token instead of failing, as long as one becomes available
+    before the caller's deadline.
+    """
+    
+    def __init__(self, rate: float, capacity: int):
+        if rate <= 0:
+            raise ValueError(f"Rate limit must be positive, got {rate} requests per second")
+        if capacity < 1:
+            raise ValueError(f"Rate limit burst must be at least 1, got {capacity}")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+    
+    async def acquire(self, deadline: Optional[float] = None):
+        """Take one token, waiting until ``deadline`` (a ``time.monotonic`` value) at most."""
+        async with self._lock:
+            self._refill()
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise GeminiAPIError("Rate limit queue wait exceeds the request deadline", status_code=429)
+            
+            # Reserve the token now so waiters are served in arrival order
+            self._tokens -= 1
+        
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _extract_text(payload: Dict[str, Any]) -> str:
+    """Concatenate the text parts of the first candidate."""
+    candidates = payload.get('candidates') or []
+    if not candidates:
+        feedback = payload.get('promptFeedback', {})
+        raise GeminiAPIError(f"No candidates returned (block reason: {feedback.get('blockReason', 'unknown')})")
+    parts = candidates[0].get('content', {}).get('parts', [])
+    return ''.join(part.get('text', '') for part in parts)
+
+
+class GeminiAsyncClient:
+    """Async client for the Gemini REST API over one pooled HTTP connection pool.
+    
+    Every call has a deadline covering rate-limit queueing, all attempts and
+    backoff sleeps. 429 and 5xx responses and transport errors are retried
+    with full-jitter exponential backoff, never sleeping less than the
+    server's Retry-After. Every attempt takes its own rate-limit token, so
+    retries count against the request rate like first attempts.
+    """
+    
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = 'gemini-1.5-flash',
+        base_url: str = 'https://generativelanguage.googleapis.com',
+        timeout_seconds: float = 30.0,
+        max_retries: int = 4,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 8.0,
+        requests_per_minute: int = 60,
+        burst: int = 10,
+        max_connections: int = 20
+    ):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.base_url = base_url.rstrip('/')
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.max_connections = max_connections
+        self.rate_limiter = TokenBucket(rate=requests_per_minute / 60, capacity=burst)
+        self._client: Optional[httpx.AsyncClient] = None
+        
+        self.retries = 0
+        self.rate_limited = 0
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                headers={'x-goog-api-key': self.api_key}
+            )
+        return self._client
+    
+    async def aclose(self):
+        """Close the pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        delay = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+    
+    @staticmethod
+    def _body(prompt: str, max_tokens: Optional[int], temperature: Optional[float]) -> Dict[str, Any]:
+        generation_config = {}
+        if max_tokens is not None:
+            generation_config['maxOutputTokens'] = max_tokens
+        if temperature is not None:
+            generation_config['temperature'] = temperature
+        
+        body: Dict[str, Any] = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+        if generation_config:
+            body['generationConfig'] = generation_config
+        return body
+    
+    async def _send(self, method: str, body: Dict[str, Any], deadline: float, stream: bool) -> httpx.Response:
+        """Send a request with rate limiting and retries; the caller closes streamed responses."""
+        client = self._get_client()
+        url = f"/v1beta/models/{self.model_name}:{method}"
+        params = {'alt': 'sse'} if stream else None
+        
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(deadline)
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise GeminiAPIError(f"Gemini request exceeded its {self.timeout_seconds}s deadline")
+            
+            retry_after = None
+            try:
+                request = client.build_request('POST', url, params=params, json=body, timeout=remaining)
+                response = await client.send(request, stream=stream)
+                if response.status_code < 400:
+                    return response
+                
+                if stream:
+                    await response.aread()
+                    await response.aclose()
+                error = GeminiAPIError(
+                    f"Gemini API returned {response.status_code}: {response.text[:200]}",
+                    status_code=response.status_code
+                )
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise error
+                if response.status_code == 429:
+                    self.rate_limited += 1
+                retry_after = _parse_retry_after(response.headers.get('retry-after'))
+            except httpx.TransportError as e:
+                error = GeminiAPIError(f"Gemini request failed: {type(e).__name__} {e}".strip())
+            
+            if attempt >= self.max_retries:
+                raise error
+            
+            delay = self._backoff(attempt, retry_after)
+            if time.monotonic() + delay >= deadline:
+                raise error
+            
+            logger.warning(f"Retrying Gemini request in {delay:.2f}s (attempt {attempt + 1}): {error}")
+            self.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+    
+    async def generate(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        timeout_seconds: Optional[float] = None
+    ) -> str:
+        """Generate a complete answer for ``prompt``."""
+        deadline = time.monotonic() + (timeout_seconds or self.timeout_seconds)
+        response = await self._send('generateContent', self._body(prompt, max_tokens, temperature), deadline, False)
+        return _extract_text(response.json())
+    
+    async def stream(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        timeout_seconds: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """Yield answer text pieces as Server-Sent Events arrive.
+        
+        Retries only happen before the first piece; the deadline covers the
+        whole stream.
+        """
+        deadline = time.monotonic() + (timeout_seconds or self.timeout_seconds)
+        response = await self._send(
+            'streamGenerateContent', self._body(prompt, max_tokens, temperature), deadline, True
+        )
+        try:
+            async for line in response.aiter_lines():
+                if time.monotonic() > deadline:
+                    raise GeminiAPIError(f"Gemini stream exceeded its {self.timeout_seconds}s deadline")
+                if not line.startswith('data:'):
+                    continue
+                text = _extract_text(json.loads(line[len('data:'):]))
+                if text:
+                    yield text
+        finally:
+            await response.aclose()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'retries': self.retries,
+            'rate_limited': self.rate_limited,
+            'rate_limit_tokens_available': round(self.rate_limiter.available, 2)
+        }
@@ -1,13 +1,30 @@
 import google.generativeai as genai
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, AsyncIterator
 from loguru import logger
+import threading
 import time
+from .context_packer import estimate_tokens
+from .gemini_client import GeminiAsyncClient
+
+ERROR_RESPONSE_PREFIX = "Maaf, terjadi kesalahan"
+
+# Consecutive failed requests after which Gemini is reported as unhealthy
+UNHEALTHY_AFTER_FAILURES = 3
 
 
 class GeminiService:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, client: Optional[GeminiAsyncClient] = None):
         self.api_key = api_key
         self.model = None
+        # Async requests go through the pooled REST client when one is given
+        self.client = client
+        self._health_lock = threading.Lock()
+        self._successes = 0
+        self._failures = 0
+        self._consecutive_failures = 0
+        self._last_success_at = None
+        self._last_failure_at = None
+        self._last_error = None
         self._initialize()
     
     def _initialize(self):
@@ -20,6 +37,114 @@ class GeminiService:
             logger.error(f"Error initializing Gemini service: {e}")
             raise
     
+    def _record_success(self):
+        with self._health_lock:
+            self._successes += 1
+            self._consecutive_failures = 0
+            self._last_success_at = time.time()
+    
+    def _record_failure(self, error: Exception):
+        with self._health_lock:
+            self._failures += 1
+            self._consecutive_failures += 1
+            self._last_failure_at = time.time()
+            self._last_error = str(error)
+    
+    def get_health(self) -> Dict[str, Any]:
+        """Get Gemini health derived from the outcomes of real requests.
+        
+        No request is sent to the API; the status is ``unknown`` until the
+        first answer has been generated.
+        """
+        with self._health_lock:
+            if self._consecutive_failures >= UNHEALTHY_AFTER_FAILURES:
+                status = 'unhealthy'
+            elif self._consecutive_failures:
+                status = 'degraded'
+            elif self._successes:
+                status = 'healthy'
+            else:
+                status = 'unknown'
+            
+            return {
+                'status': status,
+                'successes': self._successes,
+                'failures': self._failures,
+                'consecutive_failures': self._consecutive_failures,
+                'last_success_at': self._last_success_at,
+                'last_failure_at': self._last_failure_at,
+                'last_error': self._last_error,
+                'client': self.client.get_stats() if self.client is not None else None
+            }
+    
+    @staticmethod
+    def is_error_response(text: str) -> bool:
+        """Check whether a generated answer is one of the fallback error messages."""
+        return text.startswith(ERROR_RESPONSE_PREFIX)
+    
+    def _build_prompt(self, question: str, context_chunks: List[Dict[str, Any]]) -> str:
+        """Build the RAG prompt from retrieved chunks."""
+        # Separate guidelines and thesis contexts
+        guidelines_context = []
+        thesis_context = []
+        
+        for chunk in context_chunks:
+            metadata = chunk.get('metadata', {})
+            content = chunk.get('content', '')
+            namespace = metadata.get('namespace', '')
+            
+            if 'pedoman' in namespace:
+                chapter = metadata.get('chapter', 'Unknown Chapter')
+                guidelines_context.append(f"[Pedoman - {chapter}]: {content}")
+            elif 'skripsi_mahasiswa' in namespace:
+                chapter = metadata.get('chapter', 'Unknown Chapter')
+                thesis_context.append(f"[Skripsi - {chapter}]: {content}")
+        
+        # Build comprehensive prompt
+        prompt_parts = [
+            "Anda adalah asisten AI yang membantu mahasiswa memahami Pedoman Skripsi UIN Imam Bonjol Padang.",
+            "Berikan jawaban yang akurat berdasarkan konteks yang diberikan.",
+            "Prioritaskan informasi dari Pedoman Skripsi sebagai referensi utama.",
+            "Jika ada informasi dari skripsi mahasiswa, gunakan sebagai contoh atau referensi tambahan.",
+            "Berikan jawaban dalam bahasa Indonesia yang jelas dan mudah dipahami.",
+            "",
+            "[KONTEKS PEDOMAN SKRIPSI]:"
+        ]
+        
+        if guidelines_context:
+            prompt_parts.extend(guidelines_context)
+        else:
+            prompt_parts.append("Tidak ada konteks Pedoman Skripsi yang relevan ditemukan.")
+        
+        prompt_parts.append("\n[KONTEKS SKRIPSI MAHASISWA]:")
+        
+        if thesis_context:
+            prompt_parts.extend(thesis_context)
+        else:
+            prompt_parts.append("Tidak ada konteks skripsi mahasiswa yang relevan.")
+        
+        prompt_parts.extend([
+            "",
+            f"[PERTANYAAN MAHASISWA]: {question}",
+            "",
+            "[JAWABAN]:",
+            "Berdasarkan Pedoman Skripsi UIN Imam Bonjol Padang dan konteks yang tersedia, berikut adalah penjelasan untuk pertanyaan Anda:"
+        ])
+        
+        prompt = "\n".join(prompt_parts)
+        logger.info(f"Prompt size: ~{estimate_tokens(prompt)} tokens from {len(context_chunks)} context blocks")
+        return prompt
+    
+    def _build_simple_prompt(self, question: str) -> str:
+        """Build the prompt used when no RAG context is available."""
+        return f"""
+            Anda adalah asisten AI yang membantu mahasiswa dengan pertanyaan umum tentang skripsi.
+            
+            Pertanyaan: {question}
+            
+            Berikan jawaban yang informatif dan membantu dalam bahasa Indonesia.
+            """
+    
     def generate_response(
         self,
         question: str,
@@ -29,57 +154,7 @@ class GeminiService:
     ) -> str:
         """Generate response using Gemini with RAG context."""
         try:
-            # Build context from retrieved chunks
-            context_parts = []
-            
-            # Separate guidelines and thesis contexts
-            guidelines_context = []
-            thesis_context = []
-            
-            for chunk in context_chunks:
-                metadata = chunk.get('metadata', {})
-                content = chunk.get('content', '')
-                namespace = metadata.get('namespace', '')
-                
-                if 'pedoman' in namespace:
-                    chapter = metadata.get('chapter', 'Unknown Chapter')
-                    guidelines_context.append(f"[Pedoman - {chapter}]: {content}")
-                elif 'skripsi_mahasiswa' in namespace:
-                    chapter = metadata.get('chapter', 'Unknown Chapter')
-                    thesis_context.append(f"[Skripsi - {chapter}]: {content}")
-            
-            # Build comprehensive prompt
-            prompt_parts = [
-                "Anda adalah asisten AI yang membantu mahasiswa memahami Pedoman Skripsi UIN Imam Bonjol Padang.",
-                "Berikan jawaban yang akurat berdasarkan konteks yang diberikan.",
-                "Prioritaskan informasi dari Pedoman Skripsi sebagai referensi utama.",
-                "Jika ada informasi dari skripsi mahasiswa, gunakan sebagai contoh atau referensi tambahan.",
-                "Berikan jawaban dalam bahasa Indonesia yang jelas dan mudah dipahami.",
-                "",
-                "[KONTEKS PEDOMAN SKRIPSI]:"
-            ]
-            
-            if guidelines_context:
-                prompt_parts.extend(guidelines_context)
-            else:
-                prompt_parts.append("Tidak ada konteks Pedoman Skripsi yang relevan ditemukan.")
-            
-            prompt_parts.append("\n[KONTEKS SKRIPSI MAHASISWA]:")
-            
-            if thesis_context:
-                prompt_parts.extend(thesis_context)
-            else:
-                prompt_parts.append("Tidak ada konteks skripsi mahasiswa yang relevan.")
-            
-            prompt_parts.extend([
-                "",
-                f"[PERTANYAAN MAHASISWA]: {question}",
-                "",
-                "[JAWABAN]:",
-                "Berdasarkan Pedoman Skripsi UIN Imam Bonjol Padang dan konteks yang tersedia, berikut adalah penjelasan untuk pertanyaan Anda:"
-            ])
-            
-            full_prompt = "\n".join(prompt_parts)
+            full_prompt = self._build_prompt(question, context_chunks)
             
             # Generate response with Gemini
             response = self.model.generate_content(
@@ -90,28 +165,117 @@ class GeminiService:
                 )
             )
             
+            self._record_success()
             return response.text
+        
+        except Exception as e:
+            logger.error(f"Error generating Gemini response: {e}")
+            self._record_failure(e)
+            return f"Maaf, terjadi kesalahan saat memproses pertanyaan Anda. Error: {str(e)}"
+    
+    async def generate_response_async(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        max_tokens: int = 1000,
+        temperature: float = 0.7
+    ) -> str:
+        """Generate response using Gemini with RAG context without blocking the event loop."""
+        try:
+            full_prompt = self._build_prompt(question, context_chunks)
             
+            if self.client is not None:
+                text = await self.client.generate(full_prompt, max_tokens=max_tokens, temperature=temperature)
+                self._record_success()
+                return text
+            
+            response = await self.model.generate_content_async(
+                full_prompt,
+                generation_config=genai.types.GenerationConfig(
+                    max_output_tokens=max_tokens,
+                    temperature=temperature,
+                )
+            )
+            
+            self._record_success()
+            return response.text
+        
         except Exception as e:
             logger.error(f"Error generating Gemini response: {e}")
+            self._record_failure(e)
             return f"Maaf, terjadi kesalahan saat memproses pertanyaan Anda. Error: {str(e)}"
     
-    def generate_simple_response(self, question: str) -> str:
-        """Generate a simple response without RAG context."""
+    async def stream_response_async(
+        self,
+        question: str,
+        context_chunks: List[Dict[str, Any]],
+        max_tokens: int = 1000,
+        temperature: float = 0.7
+    ) -> AsyncIterator[str]:
+        """Stream response text from Gemini as it is generated.
+        
+        Falls back to the prompt without RAG context when ``context_chunks``
+        is empty.
+        """
         try:
-            prompt = f"""
-            Anda adalah asisten AI yang membantu mahasiswa dengan pertanyaan umum tentang skripsi.
+            if context_chunks:
+                prompt = self._build_prompt(question, context_chunks)
+            else:
+                prompt = self._build_simple_prompt(question)
             
-            Pertanyaan: {question}
+            if self.client is not None:
+                async for text in self.client.stream(prompt, max_tokens=max_tokens, temperature=temperature):
+                    yield text
+                self._record_success()
+                return
             
-            Berikan jawaban yang informatif dan membantu dalam bahasa Indonesia.
-            """
+            response = await self.model.generate_content_async(
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    max_output_tokens=max_tokens,
+                    temperature=temperature,
+                ),
+                stream=True
+            )
+            
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
             
-            response = self.model.generate_content(prompt)
+            self._record_success()
+        
+        except Exception as e:
+            logger.error(f"Error streaming Gemini response: {e}")
+            self._record_failure(e)
+            yield f"Maaf, terjadi kesalahan saat memproses pertanyaan Anda. Error: {str(e)}"
+    
+    def generate_simple_response(self, question: str) -> str:
+        """Generate a simple response without RAG context."""
+        try:
+            response = self.model.generate_content(self._build_simple_prompt(question))
+            self._record_success()
             return response.text
+        
+        except Exception as e:
+            logger.error(f"Error generating simple response: {e}")
+            self._record_failure(e)
+            return "Maaf, terjadi kesalahan saat memproses pertanyaan Anda."
+    
+    async def generate_simple_response_async(self, question: str) -> str:
+        """Generate a simple response without RAG context without blocking the event loop."""
+        try:
+            if self.client is not None:
+                text = await self.client.generate(self._build_simple_prompt(question))
+                self._record_success()
+                return text
             
+            response = await self.model.generate_content_async(self._build_simple_prompt(question))
+            self._record_success()
+            return response.text
+        
         except Exception as e:
             logger.error(f"Error generating simple response: {e}")
+            self._record_failure(e)
             return "Maaf, terjadi kesalahan saat memproses pertanyaan Anda."
     
     def test_connection(self) -> bool:
@@ -0,0 +1,410 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import chain
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+from loguru import logger
+from .execution import BoundedExecutor, ServiceOverloadedError
+from .pdf_processor import PDFProcessor
+from .vector_store import VectorStore
+from .document_registry import DocumentRegistry, file_sha256
+
+
+class IngestionJobQueue:
+    """Persistent SQLite-backed queue of files waiting to be ingested.
+    
+    A job groups the files of one bulk upload; every file is tracked
+    separately so progress and failures are reported per file. A claimed
+    file is leased to the claiming queue instance for ``lease_seconds`` and
+    the lease is renewed by ``heartbeat``; only files whose lease expired
+    (their worker died or was restarted) are handed out again, so several
+    server processes can share one queue.
+    """
+    
+    def __init__(self, db_path: str, lease_seconds: float = 120.0):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._initialize()
+    
+    def _initialize(self):
+        """Create tables."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS job_files (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL REFERENCES jobs(id),
+                    filename TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    document_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    chunks_created INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_job_files_job ON job_files(job_id);
+                CREATE INDEX IF NOT EXISTS idx_job_files_status ON job_files(status);
+            """)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(job_files)")}
+            if 'owner' not in columns:
+                # Queues created before leases existed
+                conn.execute("ALTER TABLE job_files ADD COLUMN owner TEXT")
+                conn.execute("ALTER TABLE job_files ADD COLUMN lease_expires_at REAL")
+        
+        logger.info("Ingestion job queue initialized successfully")
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def create_job(self, files: List[Tuple[str, str]]) -> str:
+        """Enqueue ``(filename, path)`` pairs as one job and return its id."""
+        job_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        
+        with self._connect() as conn:
+            conn.execute("INSERT INTO jobs (id, created_at) VALUES (?, ?)", (job_id, now))
+            conn.executemany(
+                "INSERT INTO job_files (job_id, filename, path, document_id, status, updated_at) "
+                "VALUES (?, ?, ?, ?, 'queued', ?)",
+                [(job_id, filename, path, str(uuid.uuid4()), now) for filename, path in files]
+            )
+        
+        logger.info(f"Created ingestion job {job_id} with {len(files)} files")
+        return job_id
+    
+    def claim_files(self, limit: int) -> List[Dict[str, Any]]:
+        """Atomically lease up to ``limit`` queued files (or files with an expired lease) and return them.
+        
+        The claim runs in a ``BEGIN IMMEDIATE`` transaction, so two processes
+        can never claim the same file.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM job_files WHERE status = 'queued' "
+                "OR (status = 'processing' AND (lease_expires_at IS NULL OR lease_expires_at < ?)) "
+                "ORDER BY id LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            expired = sum(1 for row in rows if row['status'] == 'processing')
+            if rows:
+                conn.executemany(
+                    "UPDATE job_files SET status = 'processing', owner = ?, lease_expires_at = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    [
+                        (self.owner, now + self.lease_seconds, datetime.now().isoformat(), row['id'])
+                        for row in rows
+                    ]
+                )
+        
+        if expired:
+            logger.info(f"Reclaimed {expired} ingestion files whose lease expired")
+        return [dict(row) for row in rows]
+    
+    def heartbeat(self, file_ids: List[int]):
+        """Extend the leases this queue instance holds on ``file_ids``."""
+        if not file_ids:
+            return
+        
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE job_files SET lease_expires_at = ? WHERE id = ? AND owner = ? AND status = 'processing'",
+                [(time.time() + self.lease_seconds, file_id, self.owner) for file_id in file_ids]
+            )
+    
+    def has_queued_files(self) -> bool:
+        """Check whether any file is waiting to be ingested, including files whose lease expired."""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM job_files WHERE status = 'queued' "
+                "OR (status = 'processing' AND (lease_expires_at IS NULL OR lease_expires_at < ?)) LIMIT 1",
+                (time.time(),)
+            ).fetchone() is not None
+    
+    def release_files(self, file_ids: List[int]):
+        """Put claimed files back in the queue without waiting for their lease to expire."""
+        if not file_ids:
+            return
+        
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE job_files SET status = 'queued', owner = NULL, lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND status = 'processing'",
+                [(datetime.now().isoformat(), file_id, self.owner) for file_id in file_ids]
+            )
+    
+    def mark_completed(self, file_id: int, chunks_created: int):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_files SET status = 'completed', chunks_created = ?, updated_at = ? WHERE id = ?",
+                (chunks_created, datetime.now().isoformat(), file_id)
+            )
+    
+    def mark_duplicate(self, file_id: int, document_id: str, chunks_created: int):
+        """Complete a file that was already ingested, pointing it at the existing document."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_files SET status = 'completed', document_id = ?, chunks_created = ?, updated_at = ? "
+                "WHERE id = ?",
+                (document_id, chunks_created, datetime.now().isoformat(), file_id)
+            )
+    
+    def mark_failed(self, file_id: int, error: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_files SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                (error, datetime.now().isoformat(), file_id)
+            )
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job with per-file progress, or None if it does not exist."""
+        with self._connect() as conn:
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            
+            files = [
+                dict(row) for row in conn.execute(
+                    "SELECT id, filename, document_id, status, chunks_created, error, updated_at "
+                    "FROM job_files WHERE job_id = ? ORDER BY id", (job_id,)
+                )
+            ]
+        
+        counts = {status: 0 for status in ('queued', 'processing', 'completed', 'failed')}
+        for file in files:
+            counts[file['status']] += 1
+        
+        if counts['queued'] or counts['processing']:
+            status = 'processing' if counts['processing'] or counts['completed'] or counts['failed'] else 'queued'
+        else:
+            if counts['failed'] == len(files):
+                status = 'failed'
+            elif counts['failed']:
+                status = 'completed_with_errors'
+            else:
+                status = 'completed'
+        
+        return {
+            'job_id': job['id'],
+            'created_at': job['created_at'],
+            'status': status,
+            'total_files': len(files),
+            'progress': counts,
+            'files': files
+        }
+
+
+class BulkIngestionWorker:
+    """Background worker pool that drains the ingestion job queue.
+    
+    Each worker claims several files at once and feeds their chunks into a
+    single ``add_documents`` stream, so embedding batches span document
+    boundaries instead of being limited to one small thesis at a time. A
+    heartbeat thread renews the leases of the files being processed.
+    
+    With an ``executor`` (the ingestion pool of the execution layer) every
+    batch runs on that pool, sharing its workers and pending cap with
+    uploads; a batch the pool cannot take is put back in the queue.
+    """
+    
+    def __init__(
+        self,
+        job_queue: IngestionJobQueue,
+        pdf_processor: PDFProcessor,
+        vector_store: VectorStore,
+        document_registry: Optional[DocumentRegistry] = None,
+        workers: int = 2,
+        files_per_batch: int = 8,
+        poll_interval: float = 1.0,
+        executor: Optional[BoundedExecutor] = None
+    ):
+        self.job_queue = job_queue
+        self.pdf_processor = pdf_processor
+        self.vector_store = vector_store
+        self.document_registry = document_registry
+        self.workers = workers
+        self.files_per_batch = files_per_batch
+        self.poll_interval = poll_interval
+        self.executor = executor
+        self._threads: List[threading.Thread] = []
+        self._stop_event = threading.Event()
+        # Ids of the claimed files currently being processed, renewed by the heartbeat
+        self._held: set = set()
+        self._held_lock = threading.Lock()
+    
+    def start(self):
+        """Start the worker threads and the lease heartbeat."""
+        self._stop_event.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"bulk-ingestion-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="bulk-ingestion-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        logger.info(f"Bulk ingestion started with {self.workers} workers")
+    
+    def stop(self, timeout: float = 5.0):
+        """Signal the workers to stop after their current batch."""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        logger.info("Bulk ingestion stopped")
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            if self.executor is not None and self.executor.pending >= self.executor.max_pending:
+                # Leave the files queued while uploads fill the ingestion pool
+                self._stop_event.wait(self.poll_interval)
+                continue
+            
+            try:
+                files = self.job_queue.claim_files(self.files_per_batch)
+            except Exception as e:
+                logger.error(f"Error claiming ingestion files: {e}")
+                files = []
+            
+            if not files:
+                self._stop_event.wait(self.poll_interval)
+                continue
+            
+            file_ids = {file['id'] for file in files}
+            with self._held_lock:
+                self._held |= file_ids
+            try:
+                if self.executor is None:
+                    self.process_files(files)
+                else:
+                    self.executor.submit(self.process_files, files).result()
+            except ServiceOverloadedError as e:
+                logger.warning(f"Returning {len(files)} ingestion files to the queue: {e}")
+                self._release(file_ids)
+                self._stop_event.wait(self.poll_interval)
+            except Exception as e:
+                # Files not marked done keep their spool file and are claimed again once the lease expires
+                logger.error(f"Error processing ingestion batch: {e}")
+            finally:
+                with self._held_lock:
+                    self._held -= file_ids
+    
+    def _release(self, file_ids: set):
+        try:
+            self.job_queue.release_files(list(file_ids))
+        except Exception as e:
+            # The leases expire and the files are claimed again
+            logger.error(f"Error returning ingestion files to the queue: {e}")
+    
+    def _heartbeat(self):
+        interval = max(self.job_queue.lease_seconds / 3, 1.0)
+        while not self._stop_event.wait(interval):
+            with self._held_lock:
+                file_ids = list(self._held)
+            try:
+                self.job_queue.heartbeat(file_ids)
+            except Exception as e:
+                logger.error(f"Error renewing ingestion leases: {e}")
+    
+    def _iter_file_chunks(self, file: Dict[str, Any], progress: Dict[int, Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yield a file's chunks, recording extraction failures instead of raising."""
+        try:
+            for chunk in self.pdf_processor.iter_student_thesis_chunks(
+                file['path'], file['document_id'], file['filename']
+            ):
+                progress[file['id']]['chunks'] += 1
+                yield chunk
+        except Exception as e:
+            logger.error(f"Error extracting {file['filename']}: {e}")
+            progress[file['id']]['error'] = str(e)
+    
+    def _register_files(self, files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Register claimed files in the document registry, completing duplicates right away."""
+        if self.document_registry is None:
+            return files
+        
+        new_files = []
+        for file in files:
+            content_hash = file_sha256(file['path'])
+            existing = self.document_registry.find_by_hash(content_hash)
+            if existing:
+                logger.info(f"Skipping {file['filename']}: already ingested as document {existing['id']}")
+                self.job_queue.mark_duplicate(file['id'], existing['id'], existing['chunk_count'])
+                self._remove_spool_file(file)
+                continue
+            
+            self.document_registry.register(file['document_id'], file['filename'], content_hash)
+            new_files.append(file)
+        
+        return new_files
+    
+    @staticmethod
+    def _remove_spool_file(file: Dict[str, Any]):
+        if os.path.exists(file['path']):
+            os.unlink(file['path'])
+    
+    def process_files(self, files: List[Dict[str, Any]]):
+        """Ingest a group of claimed files with shared embedding batches.
+        
+        A spool file is deleted only once its file is marked completed or
+        failed, so a batch that dies before that (e.g. the process is
+        killed) can be claimed again after the lease expires.
+        """
+        progress = {file['id']: {'chunks': 0, 'error': None} for file in files}
+        
+        try:
+            files = self._register_files(files)
+            
+            self.vector_store.add_documents(
+                chain.from_iterable(self._iter_file_chunks(file, progress) for file in files),
+                collection_name="documents"
+            )
+            
+            for file in files:
+                state = progress[file['id']]
+                if state['error']:
+                    # Chunks written before the failure are removed with the partial document
+                    self.vector_store.delete_documents_by_namespace(f"skripsi_mahasiswa_{file['document_id']}")
+                    self.job_queue.mark_failed(file['id'], state['error'])
+                    if self.document_registry is not None:
+                        self.document_registry.mark_failed(file['document_id'], state['error'])
+                else:
+                    self.job_queue.mark_completed(file['id'], state['chunks'])
+                    if self.document_registry is not None:
+                        self.document_registry.mark_ready(file['document_id'], state['chunks'])
+                self._remove_spool_file(file)
+            
+            logger.info(f"Bulk ingested {len(files)} files")
+        
+        except Exception as e:
+            logger.error(f"Error in bulk ingestion batch: {e}")
+            for file in files:
+                # Remove chunks already written for the file, as for a per-file failure
+                try:
+                    self.vector_store.delete_documents_by_namespace(f"skripsi_mahasiswa_{file['document_id']}")
+                except Exception as cleanup_error:
+                    logger.error(f"Error removing partial thesis {file['document_id']}: {cleanup_error}")
+                self.job_queue.mark_failed(file['id'], str(e))
+                if self.document_registry is not None:
+                    self.document_registry.mark_failed(file['document_id'], str(e))
+                self._remove_spool_file(file)
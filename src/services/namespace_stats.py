@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+from loguru import logger
+
+
+class NamespaceCounter:
+    """Per-namespace chunk counts kept next to the vector store.
+    
+    Counts are adjusted on every add and delete, so collection statistics
+    are read from a table with one row per namespace instead of scanning
+    every stored chunk. A collection that predates the table is counted
+    once by ``backfill``. The same database keeps a generation per namespace,
+    bumped on every change, so caches of several processes can tell when
+    their copy of a namespace is stale.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # Generation reads share one connection and an in-memory copy of the
+        # stamps, dropped whenever any connection commits a change
+        self._reader: Optional[sqlite3.Connection] = None
+        self._reader_lock = threading.Lock()
+        self._data_version: Optional[int] = None
+        self._generations: Dict[str, Dict[str, int]] = {}
+        self._initialize()
+    
+    def _initialize(self):
+        """Create the counter tables."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS namespace_counts (
+                    collection TEXT NOT NULL,
+                    namespace TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (collection, namespace)
+                );
+                CREATE TABLE IF NOT EXISTS counted_collections (
+                    collection TEXT PRIMARY KEY,
+                    counted_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS namespace_generations (
+                    collection TEXT NOT NULL,
+                    namespace TEXT NOT NULL,
+                    generation INTEGER NOT NULL,
+                    PRIMARY KEY (collection, namespace)
+                );
+            """)
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def is_counted(self, collection: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM counted_collections WHERE collection = ?", (collection,)
+            ).fetchone() is not None
+    
+    def backfill(self, collection: str, namespaces: Iterable[Optional[str]]):
+        """Replace the counts of ``collection`` with a full count of ``namespaces``."""
+        counts: Dict[str, int] = {}
+        for namespace in namespaces:
+            namespace = namespace or 'unknown'
+            counts[namespace] = counts.get(namespace, 0) + 1
+        
+        now = datetime.now().isoformat()
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM namespace_counts WHERE collection = ?", (collection,))
+            conn.executemany(
+                "INSERT INTO namespace_counts (collection, namespace, chunk_count, updated_at) VALUES (?, ?, ?, ?)",
+                [(collection, namespace, count, now) for namespace, count in counts.items()]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO counted_collections (collection, counted_at) VALUES (?, ?)",
+                (collection, now)
+            )
+        
+        logger.info(f"Counted {sum(counts.values())} chunks in {len(counts)} namespaces of {collection}")
+    
+    def adjust(self, collection: str, deltas: Dict[Optional[str], int]):
+        """Add ``deltas`` (negative for deletions) to the namespace counts."""
+        now = datetime.now().isoformat()
+        rows = [(collection, namespace or 'unknown', delta, now) for namespace, delta in deltas.items() if delta]
+        if not rows:
+            return
+        
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO namespace_counts (collection, namespace, chunk_count, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (collection, namespace) DO UPDATE SET "
+                "chunk_count = chunk_count + excluded.chunk_count, updated_at = excluded.updated_at",
+                rows
+            )
+            conn.execute("DELETE FROM namespace_counts WHERE collection = ? AND chunk_count <= 0", (collection,))
+    
+    def set_count(self, collection: str, namespace: str, count: int):
+        """Overwrite the count of one namespace with a fresh count of its stored chunks."""
+        now = datetime.now().isoformat()
+        with self._lock, self._connect() as conn:
+            if count > 0:
+                conn.execute(
+                    "INSERT OR REPLACE INTO namespace_counts (collection, namespace, chunk_count, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (collection, namespace, count, now)
+                )
+            else:
+                conn.execute(
+                    "DELETE FROM namespace_counts WHERE collection = ? AND namespace = ?", (collection, namespace)
+                )
+    
+    def get_counts(self, collection: str, namespace: Optional[str] = None) -> Dict[str, int]:
+        """Get chunk counts per namespace for a collection, optionally for one namespace only."""
+        with self._connect() as conn:
+            if namespace is not None:
+                return dict(conn.execute(
+                    "SELECT namespace, chunk_count FROM namespace_counts WHERE collection = ? AND namespace = ?",
+                    (collection, namespace)
+                ).fetchall())
+            return dict(conn.execute(
+                "SELECT namespace, chunk_count FROM namespace_counts WHERE collection = ? ORDER BY namespace",
+                (collection,)
+            ).fetchall())
+    
+    def bump_generation(self, collection: str, namespace: str):
+        """Mark ``namespace`` as changed."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO namespace_generations (collection, namespace, generation) VALUES (?, ?, 1) "
+                "ON CONFLICT (collection, namespace) DO UPDATE SET generation = generation + 1",
+                (collection, namespace)
+            )
+    
+    def get_generations(self, collection: str, namespaces: List[str]) -> Dict[str, int]:
+        """Get the current generation of each namespace (0 if it never changed).
+        
+        Served from memory while ``PRAGMA data_version`` is unchanged, i.e.
+        until this or another process commits to the database.
+        """
+        if not namespaces:
+            return {}
+        with self._reader_lock:
+            if self._reader is None:
+                self._reader = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+            version = self._reader.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self._generations.clear()
+                self._data_version = version
+            stamps = self._generations.get(collection)
+            if stamps is None:
+                stamps = self._generations[collection] = dict(self._reader.execute(
+                    "SELECT namespace, generation FROM namespace_generations WHERE collection = ?", (collection,)
+                ).fetchall())
+        return {namespace: stamps.get(namespace, 0) for namespace in namespaces}
+    
+    def close(self):
+        """Close the connection used for generation reads."""
+        with self._reader_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+            self._generations.clear()
+            self._data_version = None
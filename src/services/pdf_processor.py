@@ -1,165 +1,464 @@
 import fitz  # PyMuPDF
+import hashlib
 import re
-from typing import List, Dict, Any, Tuple
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import List, Dict, Any, Tuple, Iterator, Iterable, Optional, Callable, NamedTuple
 from pdfminer.high_level import extract_text
+from pdfminer.pdfpage import PDFPage
 from loguru import logger
+from .execution import BoundedExecutor, ServiceOverloadedError
+
+# Headings are matched against single lines, so the patterns are anchored
+CHAPTER_PATTERN = re.compile(r'^(BAB|CHAPTER|BAGIAN)\s+([IVXLC]+|\d+)\b\.?\s*(.*)$', re.IGNORECASE)
+SECTION_PATTERN = re.compile(r'^(\d+(?:\.\d+)+)\.?\s+(\S.*)$')
+# Table of contents entries end in dot leaders followed by a page number
+TOC_ENTRY_PATTERN = re.compile(r'(?:\.{3,}|\u2026)\s*\d+\s*$')
+PAGE_MARKER_PATTERN = re.compile(r'--- Page (\d+) ---')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s\.\,\;\:\!\?\-\(\)]')
+ROMAN_VALUES = {'I': 1, 'V': 5, 'X': 10, 'L': 50, 'C': 100}
+
+MAX_HEADING_WORDS = 20
+# A line counts as heading-styled when its font is this much larger than body text
+HEADING_SIZE_RATIO = 1.1
+BOLD_FLAG = 16
+
+
+class TextLine(NamedTuple):
+    """One extracted text line with its font size (0 when unknown) and weight."""
+    text: str
+    size: float = 0.0
+    bold: bool = False
+
+
+def roman_to_int(numeral: str) -> Optional[int]:
+    """Convert a chapter number written as a Roman or Arabic numeral."""
+    if numeral.isdigit():
+        return int(numeral)
+    
+    total = 0
+    previous = 0
+    for char in reversed(numeral.upper()):
+        value = ROMAN_VALUES.get(char)
+        if value is None:
+            return None
+        total = total - value if value < previous else total + value
+        previous = max(previous, value)
+    return total
+
+
+def extract_page_range_pymupdf(pdf_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract pages ``[start, end)`` with PyMuPDF; runs in worker processes."""
+    doc = fitz.open(pdf_path)
+    try:
+        return [(page_num + 1, doc.load_page(page_num).get_text()) for page_num in range(start, end)]
+    finally:
+        doc.close()
+
+
+def extract_page_range_pdfminer(pdf_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract pages ``[start, end)`` with pdfminer; runs in worker processes."""
+    # pdfminer terminates every page with a form feed
+    texts = extract_text(pdf_path, page_numbers=set(range(start, end))).split('\f')
+    return list(zip(range(start + 1, end + 1), texts))
+
+
+def extract_page_range_layout(pdf_path: str, start: int, end: int) -> List[Tuple[int, List[TextLine]]]:
+    """Extract the lines of pages ``[start, end)`` with font information; runs in worker processes.
+    
+    Each line gets the size of the span holding most of its characters and
+    is bold only when all of its spans are.
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        pages = []
+        for page_num in range(start, end):
+            lines = []
+            for block in doc.load_page(page_num).get_text('dict')['blocks']:
+                for line in block.get('lines', []):
+                    spans = [span for span in line['spans'] if span['text'].strip()]
+                    if not spans:
+                        continue
+                    
+                    main_span = max(spans, key=lambda span: len(span['text']))
+                    lines.append(TextLine(
+                        ''.join(span['text'] for span in line['spans']),
+                        round(main_span['size'] * 2) / 2,
+                        all(span['flags'] & BOLD_FLAG for span in spans)
+                    ))
+            pages.append((page_num + 1, lines))
+        return pages
+    finally:
+        doc.close()
+
+
+def lines_from_text(text: str) -> List[TextLine]:
+    """Split plain text into lines without font information."""
+    return [TextLine(line) for line in text.split('\n') if line.strip()]
+
+
+def count_pages_pymupdf(pdf_path: str) -> int:
+    doc = fitz.open(pdf_path)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def count_pages_pdfminer(pdf_path: str) -> int:
+    with open(pdf_path, 'rb') as pdf_file:
+        return sum(1 for _ in PDFPage.get_pages(pdf_file))
 
 
 class PDFProcessor:
-    def __init__(self, max_chunk_size: int = 500, chunk_overlap: int = 50):
+    def __init__(
+        self,
+        max_chunk_size: int = 500,
+        chunk_overlap: int = 50,
+        executor: Optional[BoundedExecutor] = None,
+        pages_per_task: int = 16,
+        workers: int = 1
+    ):
         self.max_chunk_size = max_chunk_size
         self.chunk_overlap = chunk_overlap
+        # Optional process pool (with ``workers`` processes) for page-parallel extraction
+        self.executor = executor
+        self.pages_per_task = pages_per_task
+        self.workers = workers
     
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract text from PDF using PyMuPDF for better formatting."""
+    def _iter_page_ranges(
+        self,
+        extractor: Callable[[str, int, int], List[Tuple[int, str]]],
+        pdf_path: str,
+        page_count: int
+    ) -> Iterator[Tuple[int, str]]:
+        """Extract pages in ranges of ``pages_per_task``, in order.
+        
+        With an executor, ranges are extracted concurrently by workers that
+        each open the file themselves; at most two ranges per worker are in
+        flight so memory stays bounded. When the pool already holds its
+        maximum number of pending tasks, a range is extracted in the calling
+        thread instead.
+        """
+        ranges = [
+            (start, min(start + self.pages_per_task, page_count))
+            for start in range(0, page_count, self.pages_per_task)
+        ]
+        
+        if self.executor is None or len(ranges) <= 1:
+            for start, end in ranges:
+                yield from extractor(pdf_path, start, end)
+            return
+        
+        max_in_flight = max(2, 2 * self.workers)
+        pending = deque()
         try:
-            doc = fitz.open(pdf_path)
-            text = ""
+            for start, end in ranges:
+                try:
+                    future = self.executor.submit(extractor, pdf_path, start, end)
+                except ServiceOverloadedError:
+                    future = Future()
+                    future.set_result(extractor(pdf_path, start, end))
+                pending.append(future)
+                if len(pending) >= max_in_flight:
+                    yield from pending.popleft().result()
             
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                text += f"\n--- Page {page_num + 1} ---\n"
-                text += page.get_text()
-            
-            doc.close()
-            return text
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+    
+    def iter_pages(self, pdf_path: str) -> Iterator[Tuple[int, str]]:
+        """Yield ``(page_number, text)`` for each page in order."""
+        pages_yielded = 0
+        try:
+            page_count = count_pages_pymupdf(pdf_path)
+            for page in self._iter_page_ranges(extract_page_range_pymupdf, pdf_path, page_count):
+                yield page
+                pages_yielded += 1
         
         except Exception as e:
+            if pages_yielded:
+                raise
             logger.error(f"Error extracting text with PyMuPDF: {e}")
             # Fallback to pdfminer
-            return extract_text(pdf_path)
+            page_count = count_pages_pdfminer(pdf_path)
+            for page_number, page_text in self._iter_page_ranges(extract_page_range_pdfminer, pdf_path, page_count):
+                if page_text.strip():
+                    yield page_number, page_text
+    
+    def iter_page_lines(self, pdf_path: str) -> Iterator[Tuple[int, List[TextLine]]]:
+        """Yield ``(page_number, lines)`` for each page in order, with font sizes when available.
+        
+        Falls back to pdfminer text (lines without font information) when
+        PyMuPDF cannot read the file.
+        """
+        pages_yielded = 0
+        try:
+            page_count = count_pages_pymupdf(pdf_path)
+            for page in self._iter_page_ranges(extract_page_range_layout, pdf_path, page_count):
+                yield page
+                pages_yielded += 1
+        
+        except Exception as e:
+            if pages_yielded:
+                raise
+            logger.error(f"Error extracting layout with PyMuPDF: {e}")
+            page_count = count_pages_pdfminer(pdf_path)
+            for page_number, page_text in self._iter_page_ranges(extract_page_range_pdfminer, pdf_path, page_count):
+                lines = lines_from_text(page_text)
+                if lines:
+                    yield page_number, lines
+    
+    def extract_text_from_pdf(self, pdf_path: str) -> str:
+        """Extract text from PDF using PyMuPDF for better formatting."""
+        parts = []
+        for page_number, page_text in self.iter_pages(pdf_path):
+            parts.append(f"\n--- Page {page_number} ---\n")
+            parts.append(page_text)
+        return "".join(parts)
+    
+    def split_page_markers(self, text: str) -> Iterator[Tuple[Optional[int], str]]:
+        """Split text produced by ``extract_text_from_pdf`` back into pages."""
+        parts = PAGE_MARKER_PATTERN.split(text)
+        
+        if parts[0].strip():
+            yield None, parts[0]
+        
+        for i in range(1, len(parts) - 1, 2):
+            yield int(parts[i]), parts[i + 1]
     
     def clean_text(self, text: str) -> str:
         """Clean and normalize extracted text."""
         # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
+        text = WHITESPACE_PATTERN.sub(' ', text)
         
         # Remove special characters but keep basic punctuation
-        text = re.sub(r'[^\w\s\.\,\;\:\!\?\-\(\)]', ' ', text)
+        text = SPECIAL_CHARS_PATTERN.sub(' ', text)
         
         # Remove page headers/footers (common patterns)
-        text = re.sub(r'--- Page \d+ ---', '', text)
+        text = PAGE_MARKER_PATTERN.sub('', text)
         
         return text.strip()
     
-    def extract_chapters_and_sections(self, text: str) -> List[Dict[str, Any]]:
-        """Extract chapters and sections from text."""
-        sections = []
-        
-        # Pattern for detecting chapters/sections (customize based on your document format)
-        chapter_pattern = r'(BAB|CHAPTER|BAGIAN)\s+([IVX\d]+)\.?\s*([^\n]+)'
-        section_pattern = r'(\d+\.\d+\.?\s*[^\n]+)'
-        
-        current_chapter = "Introduction"
+    def segment_lines(
+        self,
+        lines: Iterable[TextLine],
+        state: Dict[str, Any]
+    ) -> Iterator[Tuple[str, Optional[str], str]]:
+        """Assign ``(chapter, section, text)`` to each line in one pass.
         
-        # Split text into paragraphs
-        paragraphs = text.split('\n\n')
+        A line is a chapter heading when it matches ``BAB``/``CHAPTER``/
+        ``BAGIAN`` and a numbered section heading when it matches ``2.1``
+        style numbering, in both cases only if it is short, is not a table of
+        contents entry and is set larger or bolder than body text. Body size
+        is the most common font size seen so far in the document. Without
+        font information (pdfminer or plain text) short matching lines are
+        accepted. A chapter heading without a title takes the next line.
+        ``state`` carries the current chapter and section across pages.
+        """
+        sizes: Counter = state.setdefault('sizes', Counter())
         
-        for para in paragraphs:
-            para = para.strip()
-            if not para:
+        for line in lines:
+            text = self.clean_text(line.text)
+            if not text:
                 continue
+            if line.size:
+                sizes[line.size] += len(text)
             
-            # Check for chapter
-            chapter_match = re.search(chapter_pattern, para, re.IGNORECASE)
-            if chapter_match:
-                current_chapter = f"{chapter_match.group(1)} {chapter_match.group(2)}: {chapter_match.group(3)}"
-                continue
+            word_count = text.count(' ') + 1
+            if state.get('awaiting_title'):
+                state['awaiting_title'] = False
+                if word_count <= MAX_HEADING_WORDS and not SECTION_PATTERN.match(text) \
+                        and not CHAPTER_PATTERN.match(text):
+                    state['chapter'] = f"{state['chapter']}: {text}"
+                    yield state['chapter'], state.get('section'), text
+                    continue
+            
+            if word_count <= MAX_HEADING_WORDS and not TOC_ENTRY_PATTERN.search(line.text):
+                if line.size:
+                    body_size = sizes.most_common(1)[0][0]
+                    styled = line.bold or line.size >= body_size * HEADING_SIZE_RATIO
+                else:
+                    styled = True
+                
+                chapter_match = CHAPTER_PATTERN.match(text) if styled else None
+                if chapter_match:
+                    keyword, number, title = chapter_match.groups()
+                    state['chapter'] = f"{keyword.upper()} {number.upper()}"
+                    state['chapter_number'] = roman_to_int(number)
+                    state['section'] = None
+                    if title:
+                        state['chapter'] = f"{state['chapter']}: {title}"
+                    else:
+                        state['awaiting_title'] = True
+                    yield state['chapter'], None, text
+                    continue
+                
+                section_match = SECTION_PATTERN.match(text) if styled else None
+                if section_match:
+                    number = section_match.group(1)
+                    chapter_number = state.get('chapter_number')
+                    # Numbering must belong to the current chapter when it is known
+                    if chapter_number is None or number.split('.')[0] == str(chapter_number):
+                        state['section'] = text
+                        yield state['chapter'], text, text
+                        continue
             
-            # Check for section
-            section_match = re.search(section_pattern, para)
-            if section_match:
-                sections.append({
-                    'chapter': current_chapter,
-                    'section': section_match.group(1),
-                    'content': para
-                })
-            else:
-                # Regular paragraph
-                sections.append({
-                    'chapter': current_chapter,
-                    'section': None,
-                    'content': para
-                })
-        
-        return sections
+            yield state['chapter'], state.get('section'), text
     
-    def chunk_text(self, text: str, metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-        """Split text into chunks with metadata."""
+    def extract_chapters_and_sections(self, text: str, current_chapter: str = "Introduction") -> List[Dict[str, Any]]:
+        """Extract chapters and sections from plain text, line by line."""
+        state = {'chapter': current_chapter}
+        return [
+            {'chapter': chapter, 'section': section, 'content': content}
+            for chapter, section, content in self.segment_lines(lines_from_text(text), state)
+        ]
+    
+    @staticmethod
+    def make_chunk_id(namespace: str, document_id: str, content: str, occurrence: int = 0) -> str:
+        """Build a globally unique, deterministic chunk id.
+        
+        The id is scoped by namespace and document and derived from the
+        whitespace-normalized content, not the chunk position, so a chunk
+        keeps its id when text is inserted before it. ``occurrence`` counts
+        earlier chunks of the document with the same content. Full ingestion
+        and ``VectorStore.sync_namespace`` both store these ids.
+        """
+        content_hash = hashlib.sha256(' '.join(content.split()).encode('utf-8')).hexdigest()[:24]
+        return f"{namespace}:{document_id}:{content_hash}:{occurrence}"
+    
+    def chunk_pages(
+        self,
+        pages: Iterable[Tuple[Optional[int], List[TextLine]]],
+        metadata: Dict[str, Any] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Split ``(page_number, lines)`` pairs into chunks, page by page.
+        
+        Lines are segmented into chapters and sections by ``segment_lines``.
+        Words of the same chapter/section are accumulated across pages into
+        windows of ``max_chunk_size`` words with ``chunk_overlap`` words of
+        overlap; a new chapter or section always starts a new chunk. Every
+        chunk records the first and last page it came from. Only the current
+        window is held in memory.
+        """
         if metadata is None:
             metadata = {}
         
-        # Clean the text first
-        text = self.clean_text(text)
+        namespace = metadata.get('namespace', 'default')
+        document_id = metadata.get('document_id', 'document')
+        step = self.max_chunk_size - self.chunk_overlap
         
-        # Extract structured content
-        sections = self.extract_chapters_and_sections(text)
-        
-        chunks = []
         chunk_id = 0
+        # Chunks seen per content id, so repeated identical chunks get distinct ids
+        occurrences: Dict[str, int] = {}
+        state = {'chapter': "Introduction"}
+        current_key = None
+        words: List[str] = []
+        word_pages: List[Optional[int]] = []
+        is_continuation = False
         
-        for section in sections:
-            content = section['content']
+        def make_chunk(chunk_words, chunk_pages, continuation):
+            content = ' '.join(chunk_words)
+            known_pages = [page for page in chunk_pages if page is not None]
+            chunk_metadata = {
+                **metadata,
+                'chapter': current_key[0],
+                'section': current_key[1],
+                'chunk_index': chunk_id,
+                'word_count': len(chunk_words),
+                'is_continuation': continuation
+            }
+            if known_pages:
+                chunk_metadata['page_start'] = known_pages[0]
+                chunk_metadata['page_end'] = known_pages[-1]
             
-            # If content is smaller than max_chunk_size, keep as is
-            if len(content.split()) <= self.max_chunk_size:
-                chunks.append({
-                    'id': f"chunk_{chunk_id}",
-                    'content': content,
-                    'metadata': {
-                        **metadata,
-                        'chapter': section.get('chapter', 'Unknown'),
-                        'section': section.get('section'),
-                        'chunk_index': chunk_id,
-                        'word_count': len(content.split())
-                    }
-                })
-                chunk_id += 1
-            else:
-                # Split large content into smaller chunks
-                words = content.split()
-                for i in range(0, len(words), self.max_chunk_size - self.chunk_overlap):
-                    chunk_words = words[i:i + self.max_chunk_size]
-                    chunk_content = ' '.join(chunk_words)
-                    
-                    chunks.append({
-                        'id': f"chunk_{chunk_id}",
-                        'content': chunk_content,
-                        'metadata': {
-                            **metadata,
-                            'chapter': section.get('chapter', 'Unknown'),
-                            'section': section.get('section'),
-                            'chunk_index': chunk_id,
-                            'word_count': len(chunk_words),
-                            'is_continuation': i > 0
-                        }
-                    })
+            base_id = self.make_chunk_id(namespace, document_id, content)
+            occurrence = occurrences.get(base_id, 0)
+            occurrences[base_id] = occurrence + 1
+            
+            return {
+                'id': self.make_chunk_id(namespace, document_id, content, occurrence),
+                'content': content,
+                'metadata': chunk_metadata
+            }
+        
+        for page_number, page_lines in pages:
+            for chapter, section, text in self.segment_lines(page_lines, state):
+                key = (chapter, section)
+                
+                # A new chapter/section starts a new chunk; a chapter title
+                # completed on the next line only renames the open chunk
+                if key != current_key and not (
+                    current_key is not None and section is None and current_key[1] is None
+                    and chapter.startswith(f"{current_key[0]}: ")
+                ):
+                    # A bare chapter heading is carried into its first section instead of becoming a chunk
+                    carry_heading = (
+                        current_key is not None and current_key[0] == chapter and current_key[1] is None
+                        and section is not None and not is_continuation and len(words) <= MAX_HEADING_WORDS
+                    )
+                    if words and not carry_heading:
+                        yield make_chunk(words, word_pages, is_continuation)
+                        chunk_id += 1
+                        words, word_pages = [], []
+                    is_continuation = False
+                current_key = key
+                
+                section_words = text.split()
+                words.extend(section_words)
+                word_pages.extend([page_number] * len(section_words))
+                
+                while len(words) > self.max_chunk_size:
+                    yield make_chunk(words[:self.max_chunk_size], word_pages[:self.max_chunk_size], is_continuation)
                     chunk_id += 1
+                    words, word_pages = words[step:], word_pages[step:]
+                    is_continuation = True
         
-        logger.info(f"Created {len(chunks)} chunks from document")
-        return chunks
-    
-    def process_guidelines_pdf(self, pdf_path: str) -> List[Dict[str, Any]]:
-        """Process thesis guidelines PDF."""
-        text = self.extract_text_from_pdf(pdf_path)
+        if words:
+            yield make_chunk(words, word_pages, is_continuation)
+            chunk_id += 1
         
-        metadata = {
+        logger.info(f"Created {chunk_id} chunks from document")
+    
+    def chunk_text(self, text: str, metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Split text into chunks with metadata."""
+        pages = ((page_number, lines_from_text(page_text)) for page_number, page_text in self.split_page_markers(text))
+        return list(self.chunk_pages(pages, metadata))
+    
+    def guidelines_metadata(self) -> Dict[str, Any]:
+        """Base metadata for chunks of the thesis guidelines."""
+        return {
             'document_type': 'thesis_guidelines',
             'source': 'UIN Imam Bonjol Padang Thesis Guidelines',
-            'namespace': 'pedoman'
+            'namespace': 'pedoman',
+            'document_id': 'guidelines'
         }
-        
-        return self.chunk_text(text, metadata)
     
-    def process_student_thesis_pdf(self, pdf_path: str, student_id: str, filename: str) -> List[Dict[str, Any]]:
-        """Process student thesis PDF."""
-        text = self.extract_text_from_pdf(pdf_path)
-        
-        metadata = {
+    def student_thesis_metadata(self, student_id: str, filename: str) -> Dict[str, Any]:
+        """Base metadata for chunks of a student thesis."""
+        return {
             'document_type': 'student_thesis',
             'student_id': student_id,
+            'document_id': student_id,
             'filename': filename,
             'namespace': f'skripsi_mahasiswa_{student_id}'
         }
-        
-        return self.chunk_text(text, metadata)
\ No newline at end of file
+    
+    def iter_guidelines_chunks(self, pdf_path: str) -> Iterator[Dict[str, Any]]:
+        """Lazily yield chunks of the thesis guidelines PDF."""
+        return self.chunk_pages(self.iter_page_lines(pdf_path), self.guidelines_metadata())
+    
+    def iter_student_thesis_chunks(self, pdf_path: str, student_id: str, filename: str) -> Iterator[Dict[str, Any]]:
+        """Lazily yield chunks of a student thesis PDF."""
+        return self.chunk_pages(self.iter_page_lines(pdf_path), self.student_thesis_metadata(student_id, filename))
+    
+    def process_guidelines_pdf(self, pdf_path: str) -> List[Dict[str, Any]]:
+        """Process thesis guidelines PDF."""
+        return list(self.iter_guidelines_chunks(pdf_path))
+    
+    def process_student_thesis_pdf(self, pdf_path: str, student_id: str, filename: str) -> List[Dict[str, Any]]:
+        """Process student thesis PDF."""
+        return list(self.iter_student_thesis_chunks(pdf_path, student_id, filename))
@@ -0,0 +1,62 @@
+import re
+from typing import NamedTuple, Optional
+from .pdf_processor import roman_to_int
+
+SECTION_REFERENCE_PATTERN = re.compile(
+    r'\b(?:sub\s*-?\s*bab|subbagian|section|seksi|bagian|bab|poin|butir)\s+(\d+(?:\.\d+)+)\b',
+    re.IGNORECASE
+)
+# "bab" takes Roman numerals in any case; after "chapter" only uppercase ones, so the English "I" is not chapter 1
+CHAPTER_REFERENCE_PATTERN = re.compile(
+    r'\b(?:(?i:bab)\s+((?i:[IVXLC]+)|\d+)|(?i:chapter)\s+([IVXLC]+|\d+))\b(?!\.\d)'
+)
+QUESTION_WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+# Words that do not make a question about a chapter more specific
+NAVIGATIONAL_WORDS = {
+    'apa', 'apakah', 'isi', 'isinya', 'tentang', 'membahas', 'dibahas', 'bahas', 'jelaskan', 'ringkas',
+    'ringkasan', 'rangkum', 'rangkuman', 'uraikan', 'tampilkan', 'tunjukkan', 'saja', 'dari', 'di', 'pada',
+    'dalam', 'yang', 'ada', 'the', 'pedoman', 'skripsi', 'saya', 'what', 'is', 'in', 'of', 'about', 'show',
+    'summarize', 'summary', 'contents', 'guidelines', 'thesis'
+}
+
+
+class StructureReference(NamedTuple):
+    """An explicit chapter or section named in a question."""
+    chapter_number: Optional[int]
+    section_number: Optional[str]
+    # True when the question asks for the chapter or section as a whole
+    navigational: bool
+
+
+class QueryRouter:
+    """Detects questions that name a chapter or section.
+    
+    Such questions can be served from the structure index instead of a
+    vector search. ``navigational`` is set when, apart from the reference,
+    the question consists only of words like "apa isi ... pedoman", i.e. it
+    asks for the referenced part as a whole.
+    """
+    
+    def __init__(self, max_chunks: int = 8):
+        self.max_chunks = max_chunks
+    
+    def route(self, question: str) -> Optional[StructureReference]:
+        """Return the chapter/section reference of ``question``, or None for free-form questions."""
+        section_match = SECTION_REFERENCE_PATTERN.search(question)
+        if section_match:
+            section_number = section_match.group(1)
+            reference = StructureReference(int(section_number.split('.')[0]), section_number, False)
+            match = section_match
+        else:
+            match = CHAPTER_REFERENCE_PATTERN.search(question)
+            if not match:
+                return None
+            chapter_number = roman_to_int(match.group(1) or match.group(2))
+            if chapter_number is None:
+                return None
+            reference = StructureReference(chapter_number, None, False)
+        
+        remainder = question[:match.start()] + ' ' + question[match.end():]
+        words = [word for word in QUESTION_WORD_PATTERN.findall(remainder.lower()) if word not in NAVIGATIONAL_WORDS]
+        return reference._replace(navigational=not words)
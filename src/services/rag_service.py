@@ -1,15 +1,209 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from loguru import logger
 import time
 from .vector_store import VectorStore
 from .gemini_service import GeminiService
+from .execution import ExecutionLayer, ServiceOverloadedError
+from .answer_cache import SemanticAnswerCache
+from .reranker import CrossEncoderReranker
+from .context_packer import ContextPacker
+from .query_router import QueryRouter
 from ..models.schemas import SourceReference
 
+NO_CONTEXT_NOTE = "\n\n*Catatan: Tidak ditemukan konteks yang relevan dari dokumen yang tersedia."
 
 class RAGService:
-    def __init__(self, vector_store: VectorStore, gemini_service: GeminiService):
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        gemini_service: GeminiService,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        reranker: Optional[CrossEncoderReranker] = None,
+        rerank_candidates: int = 20,
+        rerank_budget_ms: float = 300.0,
+        context_packer: Optional[ContextPacker] = None,
+        query_router: Optional[QueryRouter] = None
+    ):
         self.vector_store = vector_store
         self.gemini_service = gemini_service
+        self.answer_cache = answer_cache
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.rerank_budget_ms = rerank_budget_ms
+        self.context_packer = context_packer
+        self.query_router = query_router
+        self.structured_hits = 0
+    
+    def resolve_namespaces(self, document_id: Optional[str] = None, include_guidelines: bool = True) -> List[str]:
+        """Determine which namespaces a question should search."""
+        search_namespaces = []
+        
+        if include_guidelines:
+            search_namespaces.append('pedoman')
+        
+        if document_id:
+            search_namespaces.append(f'skripsi_mahasiswa_{document_id}')
+        
+        if not search_namespaces:
+            # If no specific namespaces, search all
+            search_namespaces = ['pedoman']
+        
+        return search_namespaces
+    
+    def retrieve_structured(self, question: str, namespaces: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Serve a question that names a chapter or section from the structure index.
+        
+        Returns the chunks of the referenced part in document order, or None
+        when the question should go through vector search instead: it names
+        no chapter or section, the part is not indexed, or the part is larger
+        than ``max_chunks`` and the question asks about something specific
+        inside it rather than the part as a whole. The ``max_chunks`` slots
+        are shared out between the namespaces that have the part, the
+        student's thesis first, so the guidelines cannot crowd it out.
+        """
+        if self.query_router is None:
+            return None
+        
+        reference = self.query_router.route(question)
+        if reference is None:
+            return None
+        
+        refs = self.vector_store.lookup_structure(namespaces, reference.chapter_number, reference.section_number)
+        if not refs or (len(refs) > self.query_router.max_chunks and not reference.navigational):
+            return None
+        
+        chunks = self.vector_store.get_chunks(self._share_structured_refs(refs))
+        for chunk in chunks:
+            # Exact structural match; no similarity was computed
+            chunk['similarity_score'] = 1.0
+        
+        self.structured_hits += 1
+        logger.info(
+            f"Served {len(chunks)} of {len(refs)} chunks from the structure index "
+            f"(chapter {reference.chapter_number}, section {reference.section_number})"
+        )
+        return chunks
+    
+    def _share_structured_refs(self, refs: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Keep at most ``max_chunks`` refs, taking them in turn from each namespace, thesis namespaces first."""
+        by_namespace: Dict[str, List[Tuple[str, str]]] = {}
+        for ref in refs:
+            by_namespace.setdefault(ref[1], []).append(ref)
+        groups = sorted(by_namespace.values(), key=lambda group: group[0][1] == 'pedoman')
+        
+        quotas = [0] * len(groups)
+        remaining = self.query_router.max_chunks
+        while remaining > 0 and any(quota < len(group) for quota, group in zip(quotas, groups)):
+            for position, group in enumerate(groups):
+                if remaining > 0 and quotas[position] < len(group):
+                    quotas[position] += 1
+                    remaining -= 1
+        return [ref for quota, group in zip(quotas, groups) for ref in group[:quota]]
+    
+    def retrieve(
+        self,
+        question: str,
+        document_id: Optional[str] = None,
+        include_guidelines: bool = True,
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Retrieve the most relevant chunks for a question.
+        
+        With a reranker configured, ``rerank_candidates`` chunks are returned
+        instead of ``top_k`` so that ``rerank`` has candidates to choose from.
+        """
+        search_namespaces = self.resolve_namespaces(document_id, include_guidelines)
+        if self.reranker is not None:
+            top_k = max(top_k, self.rerank_candidates)
+        
+        if self.vector_store.hybrid_enabled:
+            top_chunks = self.vector_store.hybrid_search(
+                query=question,
+                namespaces=search_namespaces,
+                top_k=top_k,
+                query_embedding=query_embedding
+            )
+            logger.info(f"Retrieved {len(top_chunks)} relevant chunks for question (hybrid)")
+            return top_chunks
+        
+        # Retrieve relevant documents, already ranked by similarity
+        # (one embedding and one index query regardless of namespace count)
+        top_chunks = self.vector_store.search_namespaces(
+            query=question,
+            namespaces=search_namespaces,
+            top_k=top_k,
+            top_k_per_namespace=top_k // len(search_namespaces) + 1,
+            query_embedding=query_embedding
+        )
+        
+        logger.info(f"Retrieved {len(top_chunks)} relevant chunks for question")
+        return top_chunks
+    
+    def rerank(
+        self, question: str, chunks: List[Dict[str, Any]], top_k: int
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Keep the ``top_k`` best candidates, reranked by the cross-encoder if configured."""
+        if self.reranker is None:
+            return chunks[:top_k], {'rerank_time': 0.0, 'reranked': False, 'timed_out': False}
+        
+        try:
+            return self.reranker.rerank(question, chunks, top_k, self.rerank_budget_ms)
+        except Exception as e:
+            logger.error(f"Error reranking chunks: {e}")
+            return chunks[:top_k], {'rerank_time': 0.0, 'reranked': False, 'timed_out': False}
+    
+    def pack_context(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Deduplicate, merge and trim chunks to the prompt token budget."""
+        if self.context_packer is None or not chunks:
+            return chunks
+        
+        packed, _ = self.context_packer.pack(chunks)
+        return packed
+    
+    def namespace_generations(self, namespaces: List[str]) -> Optional[Dict[str, int]]:
+        """Snapshot the namespace generations before retrieval, for ``lookup_cached_answer`` and ``cache_answer``."""
+        if self.answer_cache is None:
+            return None
+        return self.vector_store.namespace_generations(namespaces)
+    
+    def lookup_cached_answer(
+        self,
+        namespaces: List[str],
+        query_embedding: List[float],
+        generations: Optional[Dict[str, int]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Look up a previously generated answer for a semantically equal question."""
+        if self.answer_cache is None:
+            return None
+        
+        cached = self.answer_cache.lookup(namespaces, query_embedding, generations)
+        if cached:
+            logger.info(f"Answer cache hit (similarity {cached['similarity_score']:.3f})")
+        return cached
+    
+    def cache_answer(
+        self,
+        namespaces: List[str],
+        query_embedding: Optional[List[float]],
+        answer: str,
+        sources: List[SourceReference],
+        generations: Optional[Dict[str, int]] = None
+    ):
+        """Store a generated answer, skipping error responses and questions that were never embedded.
+        
+        ``generations`` is the snapshot taken before retrieval; if a namespace
+        changed since, the answer may be built from removed chunks and is
+        not stored.
+        """
+        if self.answer_cache is None or query_embedding is None or GeminiService.is_error_response(answer):
+            return
+        
+        if generations is not None and self.vector_store.namespace_generations(namespaces) != generations:
+            logger.info("Not caching answer: its namespaces changed during generation")
+            return
+        
+        self.answer_cache.store(namespaces, query_embedding, answer, sources, generations)
     
     def process_question(
         self,
@@ -22,63 +216,197 @@ class RAGService:
         start_time = time.time()
         
         try:
-            # Determine which namespaces to search
-            search_namespaces = []
+            namespaces = self.resolve_namespaces(document_id, include_guidelines)
+            query_embedding = None
+            generations = None
+            top_chunks = self.retrieve_structured(question, namespaces)
             
-            if include_guidelines:
-                search_namespaces.append('pedoman')
-            
-            if document_id:
-                search_namespaces.append(f'skripsi_mahasiswa_{document_id}')
-            
-            if not search_namespaces:
-                # If no specific namespaces, search all
-                search_namespaces = ['pedoman']
-            
-            # Retrieve relevant documents
-            all_retrieved_chunks = []
-            
-            for namespace in search_namespaces:
-                chunks = self.vector_store.search_similar_documents(
-                    query=question,
-                    namespace_filter=namespace,
-                    top_k=top_k // len(search_namespaces) + 1
-                )
-                all_retrieved_chunks.extend(chunks)
-            
-            # Sort by similarity score and take top results
-            all_retrieved_chunks.sort(key=lambda x: x['similarity_score'], reverse=True)
-            top_chunks = all_retrieved_chunks[:top_k]
-            
-            logger.info(f"Retrieved {len(top_chunks)} relevant chunks for question")
+            if top_chunks is None:
+                query_embedding = self.vector_store.embed_query(question)
+                
+                generations = self.namespace_generations(namespaces)
+                cached = self.lookup_cached_answer(namespaces, query_embedding, generations)
+                if cached:
+                    return cached['answer'], cached['sources'], time.time() - start_time
+                
+                candidates = self.retrieve(question, document_id, include_guidelines, top_k, query_embedding)
+                top_chunks, _ = self.rerank(question, candidates, top_k)
             
             # Generate response using Gemini
             if top_chunks:
                 answer = self.gemini_service.generate_response(
                     question=question,
-                    context_chunks=top_chunks
+                    context_chunks=self.pack_context(top_chunks)
                 )
             else:
                 # No relevant context found, use simple response
                 answer = self.gemini_service.generate_simple_response(question)
-                answer += "\n\n*Catatan: Tidak ditemukan konteks yang relevan dari dokumen yang tersedia."
+                answer += NO_CONTEXT_NOTE
             
             # Extract source references
-            sources = self._extract_source_references(top_chunks)
+            sources = self.extract_source_references(top_chunks)
+            
+            self.cache_answer(namespaces, query_embedding, answer, sources, generations)
             
             processing_time = time.time() - start_time
             
             return answer, sources, processing_time
-            
+        
         except Exception as e:
             logger.error(f"Error in RAG processing: {e}")
             processing_time = time.time() - start_time
             error_answer = f"Maaf, terjadi kesalahan saat memproses pertanyaan Anda: {str(e)}"
             return error_answer, [], processing_time
     
-    def _extract_source_references(self, chunks: List[Dict[str, Any]]) -> List[SourceReference]:
-        """Extract source references from retrieved chunks."""
+    async def retrieve_async(
+        self,
+        question: str,
+        execution: ExecutionLayer,
+        document_id: Optional[str] = None,
+        include_guidelines: bool = True,
+        top_k: int = 5
+    ) -> Dict[str, Any]:
+        """Run the retrieve phase on the embedding pool.
+        
+        Questions naming a chapter or section are served from the structure
+        index without embedding (``query_embedding`` is then None). Otherwise
+        the question is embedded once and checked against the answer cache;
+        the vector search and rerank only run on a cache miss. Returns the
+        searched ``namespaces``, the ``query_embedding``, the namespace
+        ``generations`` snapshot for ``cache_answer``, the ``cached`` answer
+        (or None), the retrieved ``chunks`` and the ``rerank_time``.
+        """
+        namespaces = self.resolve_namespaces(document_id, include_guidelines)
+        if self.query_router is not None:
+            structured = await execution.embedding.run(self.retrieve_structured, question, namespaces)
+            if structured is not None:
+                return {
+                    'namespaces': namespaces,
+                    'query_embedding': None,
+                    'generations': None,
+                    'cached': None,
+                    'chunks': structured,
+                    'rerank_time': 0.0
+                }
+        
+        if self.vector_store.query_batcher is not None:
+            # Waits for the shared batch without holding an embedding pool thread
+            query_embedding = await self.vector_store.query_batcher.embed_async(question)
+        else:
+            query_embedding = await execution.embedding.run(self.vector_store.embed_query, question)
+        
+        generations = self.namespace_generations(namespaces)
+        cached = self.lookup_cached_answer(namespaces, query_embedding, generations)
+        chunks = []
+        rerank_time = 0.0
+        if not cached:
+            candidates = await execution.embedding.run(
+                self.retrieve, question, document_id, include_guidelines, top_k, query_embedding
+            )
+            if self.reranker is not None:
+                chunks, rerank_info = await execution.embedding.run(self.rerank, question, candidates, top_k)
+                rerank_time = rerank_info['rerank_time']
+            else:
+                chunks = candidates[:top_k]
+        
+        return {
+            'namespaces': namespaces,
+            'query_embedding': query_embedding,
+            'generations': generations,
+            'cached': cached,
+            'chunks': chunks,
+            'rerank_time': rerank_time
+        }
+    
+    async def generate_answer_async(
+        self,
+        question: str,
+        top_chunks: List[Dict[str, Any]],
+        execution: ExecutionLayer
+    ) -> str:
+        """Generate the answer for already retrieved chunks through the LLM limiter."""
+        if top_chunks:
+            return await execution.llm.run(
+                self.gemini_service.generate_response_async,
+                question=question,
+                context_chunks=self.pack_context(top_chunks)
+            )
+        
+        answer = await execution.llm.run(
+            self.gemini_service.generate_simple_response_async, question
+        )
+        return answer + NO_CONTEXT_NOTE
+    
+    async def stream_answer_async(
+        self,
+        question: str,
+        top_chunks: List[Dict[str, Any]],
+        execution: ExecutionLayer
+    ) -> AsyncIterator[str]:
+        """Stream the answer for already retrieved chunks, holding one LLM slot."""
+        context_chunks = self.pack_context(top_chunks)
+        async with execution.llm.slot():
+            async for text in self.gemini_service.stream_response_async(question, context_chunks):
+                yield text
+        
+        if not top_chunks:
+            yield NO_CONTEXT_NOTE
+    
+    async def process_question_async(
+        self,
+        question: str,
+        execution: ExecutionLayer,
+        document_id: Optional[str] = None,
+        include_guidelines: bool = True,
+        top_k: int = 5
+    ) -> Tuple[str, List[SourceReference], float, float]:
+        """Process question using RAG pipeline without blocking the event loop.
+        
+        Retrieval runs on the embedding pool and generation goes through the
+        LLM limiter. ``ServiceOverloadedError`` is propagated so callers can
+        reject the request instead of answering with an error message.
+        Returns the answer, sources, total processing time and rerank time.
+        """
+        start_time = time.time()
+        
+        try:
+            retrieval = await self.retrieve_async(
+                question, execution, document_id, include_guidelines, top_k
+            )
+            
+            cached = retrieval['cached']
+            if cached:
+                return cached['answer'], cached['sources'], time.time() - start_time, 0.0
+            
+            top_chunks = retrieval['chunks']
+            answer = await self.generate_answer_async(question, top_chunks, execution)
+            
+            sources = self.extract_source_references(top_chunks)
+            
+            self.cache_answer(
+                retrieval['namespaces'], retrieval['query_embedding'], answer, sources, retrieval['generations']
+            )
+            
+            processing_time = time.time() - start_time
+            
+            return answer, sources, processing_time, retrieval['rerank_time']
+        
+        except ServiceOverloadedError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in RAG processing: {e}")
+            processing_time = time.time() - start_time
+            error_answer = f"Maaf, terjadi kesalahan saat memproses pertanyaan Anda: {str(e)}"
+            return error_answer, [], processing_time, 0.0
+    
+    def extract_source_references(self, chunks: List[Dict[str, Any]]) -> List[SourceReference]:
+        """Extract source references from retrieved chunks.
+        
+        Duplicates are dropped before any ``SourceReference`` is built, and
+        building stops at the top 5 sources.
+        """
         sources = []
+        seen_sources = set()
         
         for chunk in chunks:
             metadata = chunk.get('metadata', {})
@@ -86,26 +414,23 @@ class RAGService:
             source_name = self._get_source_name(metadata)
             page_number = self._extract_page_number(metadata)
             chapter = metadata.get('chapter', 'Unknown Chapter')
-            similarity_score = chunk.get('similarity_score', 0.0)
+            
+            # Remove duplicates while preserving order
+            source_key = (source_name, page_number, chapter)
+            if source_key in seen_sources:
+                continue
+            seen_sources.add(source_key)
             
             sources.append(SourceReference(
                 source=source_name,
                 page=page_number,
                 chapter=chapter,
-                similarity_score=similarity_score
+                similarity_score=chunk.get('similarity_score', 0.0)
             ))
+            if len(sources) == 5:  # Limit to top 5 sources
+                break
         
-        # Remove duplicates while preserving order
-        unique_sources = []
-        seen_sources = set()
-        
-        for source in sources:
-            source_key = (source.source, source.page, source.chapter)
-            if source_key not in seen_sources:
-                unique_sources.append(source)
-                seen_sources.add(source_key)
-        
-        return unique_sources[:5]  # Limit to top 5 sources
+        return sources
     
     def _get_source_name(self, metadata: Dict[str, Any]) -> str:
         """Get readable source name from metadata."""
@@ -122,7 +447,7 @@ class RAGService:
     def _extract_page_number(self, metadata: Dict[str, Any]) -> Optional[int]:
         """Extract page number from metadata."""
         # Try different possible page indicators
-        page_indicators = ['page', 'page_number', 'halaman']
+        page_indicators = ['page', 'page_start', 'page_number', 'halaman']
         
         for indicator in page_indicators:
             if indicator in metadata:
@@ -147,15 +472,40 @@ class RAGService:
         """Get comprehensive system statistics."""
         try:
             vector_stats = self.vector_store.get_collection_stats()
-            gemini_status = self.gemini_service.test_connection()
+            # Passive health from real requests; no API call is made here
+            gemini_health = self.gemini_service.get_health()
+            gemini_status = gemini_health['status'] != 'unhealthy'
             
-            return {
+            stats = {
                 'vector_store': vector_stats,
                 'gemini_connection': gemini_status,
-                'available_namespaces': self.get_available_namespaces(),
+                'gemini_health': gemini_health,
+                'available_namespaces': list(vector_stats.get('namespace_distribution', {}).keys()),
                 'status': 'healthy' if gemini_status else 'degraded'
             }
             
+            if self.answer_cache is not None:
+                stats['answer_cache'] = self.answer_cache.get_stats()
+            
+            if self.reranker is not None:
+                stats['reranker'] = self.reranker.get_stats()
+            
+            if self.query_router is not None:
+                stats['structure_index'] = {
+                    **self.vector_store.structure_index.get_stats('documents'),
+                    'structured_answers': self.structured_hits
+                }
+            
+            if self.vector_store.keyword_indexes:
+                stats['keyword_index'] = {
+                    name: index.get_stats() for name, index in self.vector_store.keyword_indexes.items()
+                }
+            
+            if self.vector_store.query_batcher is not None:
+                stats['query_embedding_batcher'] = self.vector_store.query_batcher.get_stats()
+            
+            return stats
+        
         except Exception as e:
             logger.error(f"Error getting system stats: {e}")
             return {
@@ -0,0 +1,101 @@
+import threading
+import time
+from typing import List, Dict, Any, Tuple
+from loguru import logger
+
+
+class CrossEncoderReranker:
+    """Reorders retrieved chunks with a local cross-encoder under a time budget.
+    
+    Candidates are scored in retrieval order, in batches sized from the
+    remaining budget and the measured time per pair. Once ``budget_ms`` is
+    spent the remaining candidates are left unscored: the scored ones are
+    reordered and the rest follow in retrieval order, so reranking only adds
+    a bounded amount of latency to a question.
+    """
+    
+    def __init__(self, model_name: str, batch_size: int = 16, max_length: int = 512):
+        from sentence_transformers import CrossEncoder
+        
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name, max_length=max_length)
+        
+        self._lock = threading.Lock()
+        # Running estimate of the cross-encoder time per (question, chunk) pair
+        self._pair_seconds = None
+        self.calls = 0
+        self.timeouts = 0
+        self.total_time = 0.0
+        
+        logger.info(f"Cross-encoder reranker loaded ({model_name})")
+    
+    def rerank(
+        self,
+        question: str,
+        chunks: List[Dict[str, Any]],
+        top_k: int,
+        budget_ms: float
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Return the ``top_k`` best chunks and rerank timing information.
+        
+        When the budget runs out before every candidate is scored, the
+        scored candidates are reordered and followed by the unscored ones in
+        their original order (``timed_out`` is then set).
+        """
+        start_time = time.perf_counter()
+        budget = budget_ms / 1000
+        
+        if len(chunks) <= 1:
+            return chunks[:top_k], {'rerank_time': 0.0, 'reranked': False, 'timed_out': False}
+        
+        scores: List[float] = []
+        while len(scores) < len(chunks):
+            remaining = budget - (time.perf_counter() - start_time)
+            batch_size = self.batch_size
+            if self._pair_seconds:
+                # Only take as many pairs as the remaining budget is expected to cover
+                batch_size = min(batch_size, int(remaining / self._pair_seconds))
+            if batch_size <= 0 or remaining <= 0:
+                break
+            
+            batch = chunks[len(scores):len(scores) + batch_size]
+            batch_start = time.perf_counter()
+            scores.extend(float(score) for score in self.model.predict(
+                [(question, chunk.get('content', '')) for chunk in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            ))
+            pair_seconds = (time.perf_counter() - batch_start) / len(batch)
+            with self._lock:
+                self._pair_seconds = pair_seconds if self._pair_seconds is None \
+                    else 0.8 * self._pair_seconds + 0.2 * pair_seconds
+        
+        timed_out = len(scores) < len(chunks)
+        elapsed = time.perf_counter() - start_time
+        with self._lock:
+            self.calls += 1
+            self.total_time += elapsed
+            if timed_out:
+                self.timeouts += 1
+        
+        if timed_out:
+            logger.warning(
+                f"Rerank budget of {budget_ms:.0f}ms exceeded after {len(scores)} of {len(chunks)} candidates, "
+                f"keeping retrieval order for the rest"
+            )
+        if not scores:
+            return chunks[:top_k], {'rerank_time': elapsed, 'reranked': False, 'timed_out': True}
+        
+        order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        reranked = [{**chunks[i], 'rerank_score': scores[i]} for i in order] + chunks[len(scores):]
+        return reranked[:top_k], {'rerank_time': elapsed, 'reranked': True, 'timed_out': timed_out}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'model': self.model_name,
+                'calls': self.calls,
+                'timeouts': self.timeouts,
+                'mean_rerank_time': self.total_time / self.calls if self.calls else 0.0
+            }
@@ -0,0 +1,66 @@
+from typing import List, NamedTuple, Optional, Sequence
+import numpy as np
+
+
+class SearchHits(NamedTuple):
+    """Columnar vector search results: ids, namespaces and cosine similarities.
+    
+    Filtering and ranking work on the arrays; text and metadata are only
+    fetched (``VectorStore._materialize``) for the hits that survive, so
+    over-fetched candidates never become dicts.
+    """
+    ids: np.ndarray
+    namespaces: np.ndarray
+    scores: np.ndarray
+    
+    @classmethod
+    def empty(cls) -> 'SearchHits':
+        return cls(np.empty(0, dtype=object), np.empty(0, dtype=object), np.empty(0, dtype=np.float32))
+    
+    @classmethod
+    def from_lists(cls, ids: Sequence[str], namespaces: Sequence[Optional[str]], scores: Sequence[float]) -> 'SearchHits':
+        id_array = np.empty(len(ids), dtype=object)
+        id_array[:] = ids
+        namespace_array = np.empty(len(namespaces), dtype=object)
+        namespace_array[:] = namespaces
+        return cls(id_array, namespace_array, np.asarray(scores, dtype=np.float32))
+    
+    @classmethod
+    def concat(cls, parts: List['SearchHits']) -> 'SearchHits':
+        """Join hits of several sources, best first."""
+        parts = [part for part in parts if part.size]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        hits = cls(*(np.concatenate(columns) for columns in zip(*parts)))
+        return hits.take(np.argsort(-hits.scores, kind='stable'))
+    
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+    
+    def take(self, positions: np.ndarray) -> 'SearchHits':
+        return SearchHits(self.ids[positions], self.namespaces[positions], self.scores[positions])
+    
+    def above(self, threshold: float) -> 'SearchHits':
+        """Keep hits with a similarity of at least ``threshold``."""
+        mask = self.scores >= threshold
+        return self if mask.all() else self.take(mask)
+    
+    def top(self, k: int) -> 'SearchHits':
+        """Keep the first ``k`` hits (hits are kept best first)."""
+        return self if self.size <= k else self.take(np.arange(k))
+    
+    def per_namespace(self, k: int) -> 'SearchHits':
+        """Keep at most ``k`` hits of every namespace, preserving order."""
+        if self.size <= k:
+            return self
+        _, inverse = np.unique(self.namespaces.astype(str), return_inverse=True)
+        # Rank of each hit within its namespace: position minus first position of its namespace run after a stable sort
+        order = np.argsort(inverse, kind='stable')
+        sorted_groups = inverse[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(sorted_groups)) + 1]
+        ranks = np.empty(self.size, dtype=np.int64)
+        ranks[order] = np.arange(self.size) - np.repeat(starts, np.diff(np.r_[starts, self.size]))
+        return self.take(np.flatnonzero(ranks < k))
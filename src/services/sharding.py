@@ -0,0 +1,57 @@
+import hashlib
+import re
+from typing import Optional
+
+SHARDING_MODES = ('none', 'namespace', 'bucket')
+SHARD_SEPARATOR = '__'
+# Chroma collection names are 3-63 characters of [a-zA-Z0-9._-] starting and ending alphanumeric
+MAX_COLLECTION_NAME_LENGTH = 63
+UNSAFE_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_-]')
+
+
+class ShardRouter:
+    """Maps namespaces of a logical collection to physical Chroma collections.
+    
+    ``none`` keeps every namespace in the logical collection itself,
+    ``namespace`` gives each namespace its own collection, and ``bucket``
+    spreads namespaces over ``buckets`` collections by a stable hash. With
+    dedicated per-namespace collections no namespace filter is needed at
+    query time, so HNSW searches only the chunks of that namespace.
+    """
+    
+    def __init__(self, mode: str = 'none', buckets: int = 16):
+        if mode not in SHARDING_MODES:
+            raise ValueError(f"Unknown sharding mode {mode!r}, expected one of {', '.join(SHARDING_MODES)}")
+        self.mode = mode
+        self.buckets = buckets
+    
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'none'
+    
+    @property
+    def dedicated(self) -> bool:
+        """Whether every physical collection holds exactly one namespace."""
+        return self.mode == 'namespace'
+    
+    def shard_for(self, collection_name: str, namespace: Optional[str]) -> str:
+        """Get the physical collection holding ``namespace``."""
+        if not self.enabled:
+            return collection_name
+        
+        namespace = namespace or 'unknown'
+        digest = hashlib.sha1(namespace.encode('utf-8')).hexdigest()
+        if self.mode == 'bucket':
+            return f"{collection_name}{SHARD_SEPARATOR}b{int(digest[:8], 16) % self.buckets:03d}"
+        
+        name = f"{collection_name}{SHARD_SEPARATOR}{namespace}"
+        if UNSAFE_NAME_CHARS.search(namespace) or len(name) > MAX_COLLECTION_NAME_LENGTH or not name[-1].isalnum():
+            # Keep a readable prefix and make the name unique with the hash
+            safe = UNSAFE_NAME_CHARS.sub('-', namespace)[:40].rstrip('-_')
+            name = f"{collection_name}{SHARD_SEPARATOR}{safe}-{digest[:10]}"
+        return name
+    
+    def is_shard_of(self, collection_name: str, physical_name: str) -> bool:
+        if not self.enabled:
+            return physical_name == collection_name
+        return physical_name.startswith(f"{collection_name}{SHARD_SEPARATOR}")
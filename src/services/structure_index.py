@@ -0,0 +1,179 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from loguru import logger
+from .pdf_processor import CHAPTER_PATTERN, SECTION_PATTERN, roman_to_int
+
+
+def parse_chapter_number(chapter: Optional[str]) -> Optional[int]:
+    """Get the number of a chapter label such as ``"BAB II: KAJIAN PUSTAKA"``."""
+    match = CHAPTER_PATTERN.match(chapter or '')
+    return roman_to_int(match.group(2)) if match else None
+
+
+def parse_section_number(section: Optional[str]) -> Optional[str]:
+    """Get the number of a section label such as ``"2.1 Landasan Teori"``."""
+    match = SECTION_PATTERN.match(section or '')
+    return match.group(1) if match else None
+
+
+class StructureIndex:
+    """Chapter/section index of stored chunks, kept next to the vector store.
+    
+    One row per chunk with its chapter number, section number and position
+    in the document, taken from the metadata ``PDFProcessor`` attaches, so
+    questions that name a chapter or section can be answered with an indexed
+    lookup instead of an embedding and a vector search. A collection that
+    predates the index is indexed once by ``backfill``.
+    """
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._initialize()
+    
+    def _initialize(self):
+        """Create the index tables."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS chunk_structure (
+                    collection TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    namespace TEXT NOT NULL,
+                    chapter TEXT,
+                    chapter_number INTEGER,
+                    section_number TEXT,
+                    chunk_index INTEGER,
+                    PRIMARY KEY (collection, chunk_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_structure_chapter
+                    ON chunk_structure(collection, namespace, chapter_number, section_number);
+                CREATE TABLE IF NOT EXISTS indexed_collections (
+                    collection TEXT PRIMARY KEY,
+                    indexed_at TEXT NOT NULL
+                );
+            """)
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def _row(collection: str, chunk_id: str, metadata: Dict[str, Any]) -> Tuple[Any, ...]:
+        chapter = metadata.get('chapter')
+        return (
+            collection,
+            chunk_id,
+            metadata.get('namespace') or 'unknown',
+            chapter,
+            parse_chapter_number(chapter),
+            parse_section_number(metadata.get('section')),
+            metadata.get('chunk_index')
+        )
+    
+    def is_indexed(self, collection: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT 1 FROM indexed_collections WHERE collection = ?", (collection,)
+            ).fetchone() is not None
+    
+    def add(self, collection: str, chunks: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Index or re-index ``(chunk_id, metadata)`` pairs."""
+        rows = [self._row(collection, chunk_id, metadata or {}) for chunk_id, metadata in chunks]
+        if not rows:
+            return
+        
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_structure "
+                "(collection, chunk_id, namespace, chapter, chapter_number, section_number, chunk_index) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+    
+    def remove(self, collection: str, chunk_ids: Iterable[str]):
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "DELETE FROM chunk_structure WHERE collection = ? AND chunk_id = ?",
+                [(collection, chunk_id) for chunk_id in chunk_ids]
+            )
+    
+    def delete_namespace(self, collection: str, namespace: str):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM chunk_structure WHERE collection = ? AND namespace = ?", (collection, namespace)
+            )
+    
+    def backfill(self, collection: str, chunks: Iterable[Tuple[str, Dict[str, Any]]]):
+        """Replace the index of ``collection`` with ``(chunk_id, metadata)`` pairs of every stored chunk."""
+        rows = [self._row(collection, chunk_id, metadata or {}) for chunk_id, metadata in chunks]
+        
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM chunk_structure WHERE collection = ?", (collection,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_structure "
+                "(collection, chunk_id, namespace, chapter, chapter_number, section_number, chunk_index) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO indexed_collections (collection, indexed_at) VALUES (?, ?)",
+                (collection, datetime.now().isoformat())
+            )
+        
+        logger.info(f"Indexed the structure of {len(rows)} chunks in {collection}")
+    
+    def lookup(
+        self,
+        collection: str,
+        namespaces: List[str],
+        chapter_number: Optional[int] = None,
+        section_number: Optional[str] = None
+    ) -> List[Tuple[str, str]]:
+        """Get ``(chunk_id, namespace)`` of the chunks of a chapter or section, in document order.
+        
+        A section includes its subsections (``3.2`` also matches ``3.2.1``).
+        Namespaces are returned in the given order.
+        """
+        if not namespaces or (chapter_number is None and section_number is None):
+            return []
+        
+        clauses = ["collection = ?", f"namespace IN ({', '.join('?' * len(namespaces))})"]
+        params: List[Any] = [collection, *namespaces]
+        if section_number is not None:
+            clauses.append("(section_number = ? OR section_number LIKE ?)")
+            params.extend([section_number, f"{section_number}.%"])
+        else:
+            clauses.append("chapter_number = ?")
+            params.append(chapter_number)
+        
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT chunk_id, namespace FROM chunk_structure WHERE {' AND '.join(clauses)} "
+                "ORDER BY chunk_index",
+                params
+            ).fetchall()
+        
+        order = {namespace: position for position, namespace in enumerate(namespaces)}
+        rows.sort(key=lambda row: order[row[1]])
+        return [(chunk_id, namespace) for chunk_id, namespace in rows]
+    
+    def get_stats(self, collection: str) -> Dict[str, int]:
+        with self._connect() as conn:
+            chunks, chapters, sections = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT namespace || ':' || chapter_number), "
+                "COUNT(DISTINCT namespace || ':' || section_number) FROM chunk_structure WHERE collection = ?",
+                (collection,)
+            ).fetchone()
+        return {'chunks': chunks, 'chapters': chapters, 'sections': sections}
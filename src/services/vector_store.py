@@ -1,16 +1,85 @@
 import chromadb
-from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, Tuple
+from itertools import islice
 from loguru import logger
+import numpy as np
 import uuid
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .embedding_cache import EmbeddingCache
+from .embedding_batcher import QueryEmbeddingBatcher
+from .embedding_backends import EmbeddingBackend, create_embedding_backend
+from .namespace_stats import NamespaceCounter
+from .structure_index import StructureIndex
+from .bm25_index import BM25Index, reciprocal_rank_fusion
+from .sharding import ShardRouter
+from .exact_search import ExactSearchIndex
+from .search_hits import SearchHits
+
+try:
+    from chromadb.errors import InvalidCollectionException
+except ImportError:
+    # Older chromadb releases report a missing collection as a ValueError
+    InvalidCollectionException = ValueError
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+NAMESPACE_COUNTS_DB = 'namespace_counts.sqlite3'
+STRUCTURE_INDEX_DB = 'structure_index.sqlite3'
 
 
 class VectorStore:
-    def __init__(self, persist_directory: str = "./data/chroma_db"):
+    def __init__(
+        self,
+        persist_directory: str = "./data/chroma_db",
+        embedding_backend: str = "torch",
+        onnx_model_dir: str = "./data/onnx",
+        embedding_cache_dir: Optional[str] = None,
+        batch_size: int = 256,
+        query_batching: bool = False,
+        query_batch_max_size: int = 32,
+        query_batch_max_wait_ms: float = 5.0,
+        embedding_model: Optional[EmbeddingBackend] = None,
+        keyword_index_dir: Optional[str] = None,
+        rrf_k: int = 60,
+        hybrid_similarity_threshold: float = 0.3,
+        sharding: str = "none",
+        shard_buckets: int = 16,
+        search_workers: int = 4,
+        exact_search_dir: Optional[str] = None,
+        exact_search_max_chunks: int = 2000
+    ):
         self.persist_directory = persist_directory
+        self.embedding_backend = embedding_backend
+        self.onnx_model_dir = onnx_model_dir
+        self.embedding_cache_dir = embedding_cache_dir
+        self.batch_size = batch_size
+        self.query_batching = query_batching
+        self.query_batch_max_size = query_batch_max_size
+        self.query_batch_max_wait_ms = query_batch_max_wait_ms
+        self.keyword_index_dir = keyword_index_dir
+        self.rrf_k = rrf_k
+        self.hybrid_similarity_threshold = hybrid_similarity_threshold
+        self.keyword_indexes: Dict[str, BM25Index] = {}
+        self.shard_router = ShardRouter(sharding, shard_buckets)
+        self.search_workers = search_workers
+        self.exact_search_dir = exact_search_dir
+        self.exact_search_max_chunks = exact_search_max_chunks
+        self.exact_indexes: Dict[str, ExactSearchIndex] = {}
+        self.query_batcher = None
         self.client = None
-        self.embedding_model = None
+        self.embedding_model = embedding_model
+        self.embedding_cache = None
+        self.namespace_counter = None
+        self.structure_index = None
+        self._prepared_collections = set()
+        self._prepare_lock = threading.Lock()
+        # Chroma handles by physical collection name, so lookups never hit the client
+        self._collections: Dict[str, Any] = {}
+        self._collection_names = None
+        self._collections_lock = threading.Lock()
+        self._search_pool = None
+        self._change_listeners: List[Callable[[str], Any]] = []
         self._initialize()
     
     def _initialize(self):
@@ -22,60 +91,632 @@ class VectorStore:
             # Initialize ChromaDB client
             self.client = chromadb.PersistentClient(path=self.persist_directory)
             
-            # Initialize embedding model
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+            # Namespace chunk counts, maintained on every write so stats never scan the collection
+            self.namespace_counter = NamespaceCounter(os.path.join(self.persist_directory, NAMESPACE_COUNTS_DB))
             
-            logger.info("Vector store initialized successfully")
+            # Chapter/section of every chunk, for questions that name a chapter or section
+            self.structure_index = StructureIndex(os.path.join(self.persist_directory, STRUCTURE_INDEX_DB))
+            
+            # Initialize embedding model unless a preloaded one was passed in
+            if self.embedding_model is None:
+                self.embedding_model = create_embedding_backend(
+                    self.embedding_backend, EMBEDDING_MODEL_NAME, self.onnx_model_dir
+                )
+            
+            # Persistent cache so unchanged chunks are never re-encoded
+            if self.embedding_cache_dir:
+                self.embedding_cache = EmbeddingCache(
+                    cache_dir=self.embedding_cache_dir,
+                    model_name=self.embedding_model.name,
+                    dimension=self.embedding_model.get_sentence_embedding_dimension()
+                )
             
+            # Coalesce concurrent query embeddings into batched encoder calls
+            if self.query_batching:
+                self.query_batcher = QueryEmbeddingBatcher(
+                    encode=self.embedding_model.encode,
+                    max_batch_size=self.query_batch_max_size,
+                    max_wait_ms=self.query_batch_max_wait_ms
+                )
+            
+            logger.info("Vector store initialized successfully")
+        
         except Exception as e:
             logger.error(f"Error initializing vector store: {e}")
             raise
     
+    def add_change_listener(self, listener: Callable[[str], Any]):
+        """Register a callback invoked with the namespace whenever its documents change."""
+        self._change_listeners.append(listener)
+    
+    def _notify_namespace_changed(self, namespace: str):
+        for listener in self._change_listeners:
+            try:
+                listener(namespace)
+            except Exception as e:
+                logger.error(f"Error in change listener for namespace {namespace}: {e}")
+    
     def get_or_create_collection(self, collection_name: str):
-        """Get or create a collection in ChromaDB."""
+        """Get or create a physical collection in ChromaDB; handles are cached."""
         try:
-            return self.client.get_or_create_collection(
-                name=collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
+            return self._get_physical_collection(collection_name)
         except Exception as e:
             logger.error(f"Error creating collection {collection_name}: {e}")
             raise
     
-    def add_documents(self, documents: List[Dict[str, Any]], collection_name: str = "documents"):
-        """Add documents to the vector store."""
+    def _get_physical_collection(self, name: str, create: bool = True):
+        """Get a cached collection handle, or None if it does not exist and ``create`` is False."""
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        
+        with self._collections_lock:
+            collection = self._collections.get(name)
+            if collection is not None:
+                return collection
+            
+            if self._collection_names is None or (not create and name not in self._collection_names):
+                # Another process may have created it since the names were listed
+                self._collection_names = {existing.name for existing in self.client.list_collections()}
+            if not create and name not in self._collection_names:
+                return None
+            
+            collection = self.client.get_or_create_collection(
+                name=name,
+                metadata={"hnsw:space": "cosine"}
+            )
+            self._collections[name] = collection
+            self._collection_names.add(name)
+            return collection
+    
+    def _drop_physical_collection(self, name: str):
+        with self._collections_lock:
+            self.client.delete_collection(name)
+            self._collections.pop(name, None)
+            if self._collection_names is not None:
+                self._collection_names.discard(name)
+    
+    def _forget_collection(self, name: str):
+        """Drop a cached handle that Chroma no longer recognizes, e.g. after another process dropped the collection."""
+        with self._collections_lock:
+            self._collections.pop(name, None)
+            self._collection_names = None
+    
+    def _call_collection(self, name: str, method: str, create: bool = False, **kwargs) -> Any:
+        """Call ``method`` on a physical collection, or return None if it does not exist and ``create`` is False.
+        
+        A cached handle rejected by Chroma as an invalid collection is
+        dropped and the call is retried once on a fresh handle.
+        """
+        collection = self._get_physical_collection(name, create)
+        if collection is None:
+            return None
         try:
-            collection = self.get_or_create_collection(collection_name)
-            
-            # Prepare data for ChromaDB
-            ids = []
-            documents_text = []
-            metadatas = []
-            
-            for doc in documents:
-                doc_id = doc.get('id', str(uuid.uuid4()))
-                ids.append(doc_id)
-                documents_text.append(doc['content'])
-                metadatas.append(doc.get('metadata', {}))
-            
-            # Generate embeddings
-            embeddings = self.embedding_model.encode(documents_text).tolist()
-            
-            # Add to collection
-            collection.add(
-                ids=ids,
-                documents=documents_text,
-                metadatas=metadatas,
-                embeddings=embeddings
+            return getattr(collection, method)(**kwargs)
+        except InvalidCollectionException:
+            logger.warning(f"Collection handle {name} is stale, reopening it")
+            self._forget_collection(name)
+            collection = self._get_physical_collection(name, create)
+            if collection is None:
+                return None
+            return getattr(collection, method)(**kwargs)
+    
+    def _shard_names(self, collection_name: str) -> List[str]:
+        """Get the names of every existing physical collection of a logical collection."""
+        if not self.shard_router.enabled:
+            return [collection_name]
+        
+        # Listed on every call, so shards created by other processes are included
+        names = {existing.name for existing in self.client.list_collections()}
+        with self._collections_lock:
+            self._collection_names = names
+        return sorted(name for name in names if self.shard_router.is_shard_of(collection_name, name))
+    
+    def _prepare_collection(self, collection_name: str):
+        """Load the side indexes of a logical collection, building them once for data stored before they existed.
+        
+        Counts, structure and keyword indexes are kept per logical collection,
+        so they stay valid when its namespaces are moved between shards.
+        """
+        if collection_name in self._prepared_collections:
+            return
+        
+        with self._prepare_lock:
+            if collection_name in self._prepared_collections:
+                return
+            
+            if not self.namespace_counter.is_counted(collection_name):
+                self.namespace_counter.backfill(
+                    collection_name,
+                    (metadata.get('namespace') for _, metadata, _ in self._iter_stored_chunks(collection_name, False))
+                )
+            
+            if not self.structure_index.is_indexed(collection_name):
+                self.structure_index.backfill(
+                    collection_name,
+                    ((doc_id, metadata) for doc_id, metadata, _ in self._iter_stored_chunks(collection_name, False))
+                )
+            
+            if self.keyword_index_dir:
+                keyword_index = BM25Index(os.path.join(self.keyword_index_dir, collection_name))
+                if not keyword_index.is_built:
+                    keyword_index.add_documents(
+                        (doc_id, metadata.get('namespace'), text)
+                        for doc_id, metadata, text in self._iter_stored_chunks(collection_name, True)
+                    )
+                    keyword_index.flush()
+                    keyword_index.mark_built()
+                self.keyword_indexes[collection_name] = keyword_index
+            
+            if self.exact_search_dir:
+                self.exact_indexes[collection_name] = ExactSearchIndex(
+                    os.path.join(self.exact_search_dir, collection_name),
+                    self.embedding_model.get_sentence_embedding_dimension()
+                )
+            
+            self._prepared_collections.add(collection_name)
+    
+    def _iter_stored_chunks(
+        self, collection_name: str, include_text: bool, page_size: int = 5000
+    ) -> Iterator[Tuple[str, Dict[str, Any], Optional[str]]]:
+        """Yield ``(id, metadata, text)`` for every stored chunk of all shards, reading page by page."""
+        include = ['metadatas', 'documents'] if include_text else ['metadatas']
+        for name in self._shard_names(collection_name):
+            offset = 0
+            while True:
+                page = self._call_collection(
+                    name, 'get', create=not self.shard_router.enabled, include=include, limit=page_size, offset=offset
+                )
+                if page is None or not page['ids']:
+                    break
+                texts = page['documents'] if include_text else [None] * len(page['ids'])
+                for doc_id, metadata, text in zip(page['ids'], page['metadatas'], texts):
+                    yield doc_id, metadata or {}, text
+                offset += len(page['ids'])
+    
+    def _get_search_pool(self) -> ThreadPoolExecutor:
+        if self._search_pool is None:
+            with self._collections_lock:
+                if self._search_pool is None:
+                    self._search_pool = ThreadPoolExecutor(
+                        max_workers=self.search_workers, thread_name_prefix="shard-search"
+                    )
+        return self._search_pool
+    
+    def _query_shards(
+        self,
+        targets: List[Tuple[Any, Optional[Dict[str, Any]], int, Optional[str]]],
+        query_embedding: List[float]
+    ) -> SearchHits:
+        """Query ``(collection name, where, n_results, namespace)`` targets and merge the hits, best first.
+        
+        Several targets (shards) are queried in parallel. Only distances (and
+        metadata when the target's ``namespace`` is None and the namespace
+        has to be read from each hit) are requested from Chroma.
+        """
+        def query(target):
+            name, where, n_results, namespace = target
+            include = ['distances'] if namespace is not None else ['distances', 'metadatas']
+            raw = self._call_collection(
+                name, 'query', query_embeddings=[query_embedding], n_results=n_results, where=where, include=include
             )
+            if raw is None:
+                return SearchHits.empty()
+            ids = raw['ids'][0]
+            if namespace is not None:
+                namespaces = [namespace] * len(ids)
+            else:
+                namespaces = [(metadata or {}).get('namespace') for metadata in raw['metadatas'][0]]
+            return SearchHits.from_lists(ids, namespaces, 1 - np.asarray(raw['distances'][0], dtype=np.float32))
+        
+        if not targets:
+            return SearchHits.empty()
+        if len(targets) == 1:
+            return query(targets[0])
+        return SearchHits.concat(list(self._get_search_pool().map(query, targets)))
+    
+    def _fetch_chunks(
+        self,
+        refs: List[Tuple[str, Optional[str]]],
+        include: List[str],
+        collection_name: str = "documents"
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fetch stored fields of ``(id, namespace)`` chunks, reading each shard once."""
+        groups: Dict[str, List[str]] = {}
+        for doc_id, namespace in refs:
+            groups.setdefault(self.shard_router.shard_for(collection_name, namespace), []).append(doc_id)
+        
+        fetched = {}
+        for name, ids in groups.items():
+            stored = self._call_collection(name, 'get', ids=ids, include=include)
+            if stored is None:
+                continue
+            for i, doc_id in enumerate(stored['ids']):
+                fetched[doc_id] = {field: stored[field][i] for field in include}
+        return fetched
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+    
+    def _exact_namespace(
+        self, collection_name: str, namespace: str, generation: int
+    ) -> Optional[ExactSearchIndex]:
+        """Get the exact index holding ``namespace``'s matrix, or None if it should be searched with HNSW.
+        
+        Namespaces of at most ``exact_search_max_chunks`` chunks are scanned
+        exactly; their matrix is loaded (or built from the stored embeddings)
+        on first use. The decision is cached until the namespace changes,
+        which is detected through its shared ``generation``.
+        """
+        exact_index = self.exact_indexes.get(collection_name)
+        if exact_index is None:
+            return None
+        exact_index.refresh(namespace, generation)
+        if exact_index.is_skipped(namespace):
+            return None
+        if exact_index.get_loaded(namespace) is not None:
+            return exact_index
+        
+        count = self.namespace_counter.get_counts(collection_name, namespace).get(namespace, 0)
+        if not count or count > self.exact_search_max_chunks:
+            exact_index.skip(namespace, generation)
+            return None
+        
+        if exact_index.load(namespace, count, generation) is None:
+            stored = self._call_collection(
+                self.shard_router.shard_for(collection_name, namespace), 'get',
+                where={"namespace": namespace}, include=['embeddings']
+            )
+            if stored is None:
+                return None
+            exact_index.build(namespace, stored['ids'], stored['embeddings'], generation)
+        return exact_index
+    
+    def _invalidate_exact(self, collection_name: str, namespace: Optional[str]):
+        if not namespace:
+            return
+        # Bump the shared generation first so no process keeps using its copy (exact matrices, cached answers)
+        self.namespace_counter.bump_generation(collection_name, namespace)
+        exact_index = self.exact_indexes.get(collection_name)
+        if exact_index is not None:
+            exact_index.invalidate(namespace)
+    
+    def namespace_generations(self, namespaces: List[str], collection_name: str = "documents") -> Dict[str, int]:
+        """Get the change generation of each namespace, shared by every process using the same store."""
+        return self.namespace_counter.get_generations(collection_name, namespaces)
+    
+    def _search_exact(
+        self,
+        collection_name: str,
+        namespaces: List[str],
+        query_vector: np.ndarray,
+        top_k: int
+    ) -> Tuple[SearchHits, List[str]]:
+        """Search the small namespaces exactly.
+        
+        Returns the hits, best first, and the namespaces that still need an
+        HNSW query.
+        """
+        parts = []
+        remaining = []
+        if collection_name not in self.exact_indexes:
+            return SearchHits.empty(), list(namespaces)
+        
+        generations = self.namespace_counter.get_generations(collection_name, namespaces)
+        for namespace in namespaces:
+            exact_index = self._exact_namespace(collection_name, namespace, generations[namespace])
+            if exact_index is None:
+                remaining.append(namespace)
+                continue
+            ids, scores = exact_index.search(namespace, query_vector, top_k)
+            parts.append(SearchHits.from_lists(ids, [namespace] * len(ids), scores))
+        return SearchHits.concat(parts), remaining
+    
+    def _materialize(self, hits: SearchHits, collection_name: str) -> List[Dict[str, Any]]:
+        """Fetch text and metadata of ``hits`` and build result dicts in hit order."""
+        if not hits.size:
+            return []
+        
+        stored = self._fetch_chunks(list(zip(hits.ids, hits.namespaces)), ['documents', 'metadatas'], collection_name)
+        return [
+            {
+                'id': doc_id,
+                'content': stored[doc_id]['documents'],
+                'metadata': stored[doc_id]['metadatas'] or {},
+                'similarity_score': score
+            }
+            for doc_id, score in zip(hits.ids, hits.scores.tolist()) if doc_id in stored
+        ]
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Encode document texts, running the model only on embedding cache misses."""
+        if self.embedding_cache is None:
+            return self.embedding_model.encode(texts).tolist()
+        
+        hashes = [EmbeddingCache.text_hash(text) for text in texts]
+        embeddings = self.embedding_cache.get_many(hashes)
+        
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if misses:
+            encoded = np.asarray(self.embedding_model.encode([texts[i] for i in misses]), dtype=np.float32)
+            self.embedding_cache.put_many([hashes[i] for i in misses], encoded)
+            for i, embedding in zip(misses, encoded):
+                embeddings[i] = embedding
+        
+        logger.info(f"Embedding cache: {len(texts) - len(misses)} hits, {len(misses)} misses")
+        return np.stack(embeddings).tolist() if embeddings else []
+    
+    def _iter_batches(self, documents: Iterable[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        """Group an iterable of documents into lists of ``batch_size``."""
+        iterator = iter(documents)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            yield batch
+    
+    def add_documents(self, documents: Iterable[Dict[str, Any]], collection_name: str = "documents") -> int:
+        """Add documents to the vector store.
+        
+        ``documents`` may be any iterable, including a generator, and is
+        consumed in batches of ``batch_size`` so only one batch is held in
+        memory and embedding starts before the source is exhausted. Chunks
+        whose id is already stored are skipped, so an interrupted ingestion
+        can simply be retried without redoing finished batches. Namespaces
+        with skipped chunks are recounted afterwards, since the interrupted
+        run may have stored chunks without adjusting their counts. Returns
+        the number of documents consumed.
+        """
+        try:
+            self._prepare_collection(collection_name)
+            
+            namespaces = set()
+            # Namespaces of chunks that were already stored, whose counts may be stale
+            skipped_namespaces = set()
+            total = 0
+            written = 0
+            
+            for batch in self._iter_batches(documents):
+                total += len(batch)
+                
+                # Prepare data for ChromaDB
+                ids = []
+                documents_text = []
+                metadatas = []
+                
+                for doc in batch:
+                    doc_id = doc.get('id', str(uuid.uuid4()))
+                    ids.append(doc_id)
+                    documents_text.append(doc['content'])
+                    metadatas.append(doc.get('metadata', {}))
+                    namespaces.add(metadatas[-1].get('namespace'))
+                
+                shards: Dict[str, List[int]] = {}
+                for i, metadata in enumerate(metadatas):
+                    shards.setdefault(
+                        self.shard_router.shard_for(collection_name, metadata.get('namespace')), []
+                    ).append(i)
+                
+                # Chunk ids are content-derived, so a stored id means the chunk is done
+                pending_by_shard = {}
+                for shard_name, positions in shards.items():
+                    stored_ids = set(self._call_collection(
+                        shard_name, 'get', create=True, ids=[ids[i] for i in positions], include=[]
+                    )['ids'])
+                    pending_by_shard[shard_name] = [i for i in positions if ids[i] not in stored_ids]
+                    skipped_namespaces.update(metadatas[i].get('namespace') for i in positions if ids[i] in stored_ids)
+                pending = [i for positions in pending_by_shard.values() for i in positions]
+                if not pending:
+                    continue
+                
+                # Generate embeddings for the whole batch at once, then write each shard
+                embeddings = dict(zip(pending, self.embed_documents([documents_text[i] for i in pending])))
+                for shard_name, positions in pending_by_shard.items():
+                    if not positions:
+                        continue
+                    self._call_collection(
+                        shard_name, 'upsert', create=True,
+                        ids=[ids[i] for i in positions],
+                        documents=[documents_text[i] for i in positions],
+                        metadatas=[metadatas[i] for i in positions],
+                        embeddings=[embeddings[i] for i in positions]
+                    )
+                written += len(pending)
+                
+                keyword_index = self.keyword_indexes.get(collection_name)
+                if keyword_index is not None:
+                    keyword_index.add_documents(
+                        (ids[i], metadatas[i].get('namespace'), documents_text[i]) for i in pending
+                    )
+                
+                self.structure_index.add(collection_name, ((ids[i], metadatas[i]) for i in pending))
+                
+                deltas = {}
+                for i in pending:
+                    namespace = metadatas[i].get('namespace')
+                    deltas[namespace] = deltas.get(namespace, 0) + 1
+                self.namespace_counter.adjust(collection_name, deltas)
             
-            logger.info(f"Added {len(documents)} documents to collection {collection_name}")
-            return True
+            if collection_name in self.keyword_indexes:
+                self.keyword_indexes[collection_name].flush()
             
+            for namespace in skipped_namespaces:
+                self._recount_namespace(collection_name, namespace)
+            
+            logger.info(
+                f"Added {written} documents to collection {collection_name} "
+                f"({total - written} already stored)"
+            )
+            
+            if written:
+                for namespace in namespaces:
+                    self._invalidate_exact(collection_name, namespace)
+                    if namespace:
+                        self._notify_namespace_changed(namespace)
+            
+            return total
+        
         except Exception as e:
             logger.error(f"Error adding documents to vector store: {e}")
             raise
     
+    @staticmethod
+    def _comparable_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        # Chroma does not persist None values, so ignore them when diffing
+        return {key: value for key, value in (metadata or {}).items() if value is not None}
+    
+    def _rollback_sync(
+        self,
+        collection,
+        collection_name: str,
+        namespace: str,
+        added_ids: List[str],
+        updated_ids: List[str],
+        counted: int,
+        existing_metadata: Dict[str, Dict[str, Any]]
+    ):
+        """Undo the writes of a sync whose document stream failed, restoring the previous version."""
+        try:
+            keyword_index = self.keyword_indexes.get(collection_name)
+            if added_ids:
+                collection.delete(ids=added_ids)
+                self.structure_index.remove(collection_name, added_ids)
+                if keyword_index is not None:
+                    keyword_index.remove_documents(namespace, added_ids)
+                    keyword_index.flush()
+            if counted:
+                self.namespace_counter.adjust(collection_name, {namespace: -counted})
+            if updated_ids:
+                previous = [existing_metadata[doc_id] for doc_id in updated_ids]
+                collection.update(ids=updated_ids, metadatas=previous)
+                self.structure_index.add(collection_name, zip(updated_ids, previous))
+            
+            logger.warning(
+                f"Rolled back partial sync of namespace {namespace} "
+                f"({len(added_ids)} added, {len(updated_ids)} updated)"
+            )
+        except Exception as e:
+            logger.error(f"Error rolling back sync of namespace {namespace}: {e}")
+        
+        self._invalidate_exact(collection_name, namespace)
+        self._notify_namespace_changed(namespace)
+    
+    def sync_namespace(
+        self,
+        documents: Iterable[Dict[str, Any]],
+        namespace: str,
+        collection_name: str = "documents"
+    ) -> Dict[str, int]:
+        """Replace the contents of a namespace, touching only chunks that changed.
+        
+        Chunks are matched by their ``id``, which must be the content-derived
+        id of ``PDFProcessor.make_chunk_id`` that full ingestion stores too,
+        so re-ingesting a new version of a document only embeds new chunks,
+        updates metadata of moved chunks and deletes chunks that disappeared. ``documents`` is
+        consumed in batches; only the ids and metadata of the stored chunks
+        are kept in memory. If the stream fails part way, the chunks added
+        and metadata updated so far are rolled back, so the previous version
+        stays intact instead of being mixed with part of the new one.
+        """
+        try:
+            self._prepare_collection(collection_name)
+            shard_name = self.shard_router.shard_for(collection_name, namespace)
+            keyword_index = self.keyword_indexes.get(collection_name)
+            
+            # Read through _call_collection so a stale cached handle is replaced before any write
+            existing = self._call_collection(
+                shard_name, 'get', create=True, where={"namespace": namespace}, include=['metadatas']
+            )
+            collection = self._get_physical_collection(shard_name)
+            existing_metadata = dict(zip(existing['ids'], existing['metadatas']))
+            
+            seen_ids = set()
+            counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+            
+            # Written so far, so a failed stream can be rolled back
+            pending_added: List[str] = []
+            pending_updated: List[str] = []
+            try:
+                for batch in self._iter_batches(documents):
+                    batch_docs = {}
+                    for doc in batch:
+                        if 'id' not in doc:
+                            raise ValueError("sync_namespace needs chunks with content-derived ids")
+                        batch_docs[doc['id']] = doc
+                    seen_ids.update(batch_docs)
+                    
+                    added_ids = [doc_id for doc_id in batch_docs if doc_id not in existing_metadata]
+                    updated_ids = [
+                        doc_id for doc_id in batch_docs
+                        if doc_id in existing_metadata
+                        and self._comparable_metadata(existing_metadata[doc_id])
+                        != self._comparable_metadata(batch_docs[doc_id].get('metadata', {}))
+                    ]
+                    
+                    if added_ids:
+                        pending_added.extend(added_ids)
+                        added_text = [batch_docs[doc_id]['content'] for doc_id in added_ids]
+                        collection.upsert(
+                            ids=added_ids,
+                            documents=added_text,
+                            metadatas=[batch_docs[doc_id].get('metadata', {}) for doc_id in added_ids],
+                            embeddings=self.embed_documents(added_text)
+                        )
+                        if keyword_index is not None:
+                            keyword_index.add_documents(
+                                (doc_id, namespace, text) for doc_id, text in zip(added_ids, added_text)
+                            )
+                    
+                    if updated_ids:
+                        pending_updated.extend(updated_ids)
+                        # Content is unchanged, so the stored embedding stays valid
+                        collection.update(
+                            ids=updated_ids,
+                            metadatas=[batch_docs[doc_id].get('metadata', {}) for doc_id in updated_ids]
+                        )
+                    
+                    self.structure_index.add(
+                        collection_name,
+                        ((doc_id, batch_docs[doc_id].get('metadata', {})) for doc_id in added_ids + updated_ids)
+                    )
+                    
+                    self.namespace_counter.adjust(collection_name, {namespace: len(added_ids)})
+                    counts['added'] += len(added_ids)
+                    counts['updated'] += len(updated_ids)
+                    counts['unchanged'] += len(batch_docs) - len(added_ids) - len(updated_ids)
+            except Exception:
+                self._rollback_sync(
+                    collection, collection_name, namespace, pending_added, pending_updated,
+                    counts['added'], existing_metadata
+                )
+                raise
+            
+            removed_ids = [doc_id for doc_id in existing_metadata if doc_id not in seen_ids]
+            if removed_ids:
+                collection.delete(ids=removed_ids)
+                self.namespace_counter.adjust(collection_name, {namespace: -len(removed_ids)})
+                self.structure_index.remove(collection_name, removed_ids)
+                if keyword_index is not None:
+                    keyword_index.remove_documents(namespace, removed_ids)
+            counts['removed'] = len(removed_ids)
+            
+            if keyword_index is not None:
+                keyword_index.flush()
+            
+            logger.info(f"Synced namespace {namespace}: {counts}")
+            
+            if counts['added'] or counts['updated'] or counts['removed']:
+                self._invalidate_exact(collection_name, namespace)
+                self._notify_namespace_changed(namespace)
+            
+            return counts
+        
+        except Exception as e:
+            logger.error(f"Error syncing namespace {namespace}: {e}")
+            raise
+    
     def search_similar_documents(
         self, 
         query: str, 
@@ -84,106 +725,335 @@ class VectorStore:
         top_k: int = 5,
         similarity_threshold: float = 0.7
     ) -> List[Dict[str, Any]]:
-        """Search for similar documents."""
+        """Search for similar documents.
+        
+        Without ``namespace_filter`` every shard is searched in parallel and
+        the hits are merged. A small filtered namespace is scanned exactly.
+        """
         try:
-            collection = self.get_or_create_collection(collection_name)
-            
             # Generate query embedding
-            query_embedding = self.embedding_model.encode([query]).tolist()[0]
+            query_embedding = self.embed_query(query)
             
-            # Prepare where filter for namespace
-            where_clause = {}
+            self._prepare_collection(collection_name)
             if namespace_filter:
-                where_clause["namespace"] = namespace_filter
-            
-            # Search
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=top_k,
-                where=where_clause if where_clause else None
-            )
+                hits = self._search_namespace_hits(collection_name, [namespace_filter], query_embedding, top_k)
+            else:
+                targets = [(name, None, top_k, None) for name in self._shard_names(collection_name)]
+                hits = self._query_shards(targets, query_embedding)
             
-            # Format results
-            formatted_results = []
-            if results['documents'][0]:  # Check if results exist
-                for i in range(len(results['documents'][0])):
-                    similarity_score = 1 - results['distances'][0][i]  # Convert distance to similarity
-                    
-                    if similarity_score >= similarity_threshold:
-                        formatted_results.append({
-                            'id': results['ids'][0][i],
-                            'content': results['documents'][0][i],
-                            'metadata': results['metadatas'][0][i],
-                            'similarity_score': similarity_score
-                        })
+            # Only the hits above the threshold are fetched and formatted
+            formatted_results = self._materialize(hits.above(similarity_threshold).top(top_k), collection_name)
             
             logger.info(f"Found {len(formatted_results)} similar documents for query")
             return formatted_results
-            
+        
         except Exception as e:
             logger.error(f"Error searching similar documents: {e}")
             return []
     
+    def embed_query(self, query: str) -> List[float]:
+        """Encode a single query into an embedding vector."""
+        if self.query_batcher is not None:
+            return self.query_batcher.embed(query)
+        return self.embedding_model.encode([query]).tolist()[0]
+    
+    def _search_namespace_hits(
+        self,
+        collection_name: str,
+        namespaces: List[str],
+        query_embedding: List[float],
+        top_k_per_namespace: int
+    ) -> SearchHits:
+        """Get up to ``top_k_per_namespace`` hits of every namespace, best first.
+        
+        Namespaces small enough for exact search skip HNSW entirely. The
+        others are served by one ``$in`` filtered query per shard (unfiltered
+        for dedicated per-namespace shards), several shards in parallel.
+        """
+        exact_hits, remaining = self._search_exact(
+            collection_name, namespaces, self._normalize(query_embedding), top_k_per_namespace
+        )
+        
+        shards: Dict[str, List[str]] = {}
+        for namespace in remaining:
+            shards.setdefault(self.shard_router.shard_for(collection_name, namespace), []).append(namespace)
+        
+        targets = []
+        for shard_name, shard_namespaces in shards.items():
+            if self.shard_router.dedicated:
+                where_clause = None
+            elif len(shard_namespaces) == 1:
+                where_clause = {"namespace": shard_namespaces[0]}
+            else:
+                where_clause = {"namespace": {"$in": shard_namespaces}}
+            
+            # Over-fetch so that one dominant namespace cannot starve the others
+            n_results = top_k_per_namespace * len(shard_namespaces) * 2
+            namespace = shard_namespaces[0] if len(shard_namespaces) == 1 else None
+            targets.append((shard_name, where_clause, n_results, namespace))
+        
+        ann_hits = self._query_shards(targets, query_embedding)
+        return SearchHits.concat([exact_hits, ann_hits]).per_namespace(top_k_per_namespace)
+    
     def search_multiple_namespaces(
         self,
         query: str,
         namespaces: List[str],
         collection_name: str = "documents",
-        top_k_per_namespace: int = 3
+        top_k_per_namespace: int = 3,
+        similarity_threshold: float = 0.7,
+        query_embedding: Optional[List[float]] = None
     ) -> Dict[str, List[Dict[str, Any]]]:
-        """Search across multiple namespaces."""
-        results = {}
+        """Search across multiple namespaces with one embedding and one query per shard.
         
-        for namespace in namespaces:
-            results[namespace] = self.search_similar_documents(
-                query=query,
-                collection_name=collection_name,
-                namespace_filter=namespace,
-                top_k=top_k_per_namespace
+        The query is encoded once (unless ``query_embedding`` is given) and
+        results are split per namespace, keeping at most
+        ``top_k_per_namespace`` hits for each.
+        """
+        results = {namespace: [] for namespace in namespaces}
+        if not namespaces:
+            return results
+        
+        try:
+            self._prepare_collection(collection_name)
+            
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            
+            hits = self._search_namespace_hits(collection_name, namespaces, query_embedding, top_k_per_namespace)
+            for chunk in self._materialize(hits.above(similarity_threshold), collection_name):
+                bucket = results.get(chunk['metadata'].get('namespace'))
+                if bucket is not None:
+                    bucket.append(chunk)
+            
+            found = sum(len(chunks) for chunks in results.values())
+            logger.info(f"Found {found} similar documents across {len(namespaces)} namespaces")
+            return results
+        
+        except Exception as e:
+            logger.error(f"Error searching multiple namespaces: {e}")
+            return results
+    
+    def search_namespaces(
+        self,
+        query: str,
+        namespaces: List[str],
+        collection_name: str = "documents",
+        top_k: int = 5,
+        top_k_per_namespace: Optional[int] = None,
+        similarity_threshold: float = 0.7,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Get the ``top_k`` best chunks across namespaces, best first.
+        
+        Like ``search_multiple_namespaces`` but ranked as one list, with
+        at most ``top_k_per_namespace`` (default ``top_k``) chunks from each
+        namespace. Only the returned chunks are fetched from the store.
+        """
+        if not namespaces:
+            return []
+        
+        try:
+            self._prepare_collection(collection_name)
+            
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            
+            hits = self._search_namespace_hits(
+                collection_name, namespaces, query_embedding, top_k_per_namespace or top_k
             )
+            results = self._materialize(hits.above(similarity_threshold).top(top_k), collection_name)
+            
+            logger.info(f"Found {len(results)} similar documents across {len(namespaces)} namespaces")
+            return results
         
-        return results
+        except Exception as e:
+            logger.error(f"Error searching namespaces: {e}")
+            return []
     
-    def delete_documents_by_namespace(self, namespace: str, collection_name: str = "documents"):
-        """Delete all documents in a specific namespace."""
+    @property
+    def hybrid_enabled(self) -> bool:
+        return bool(self.keyword_index_dir)
+    
+    def hybrid_search(
+        self,
+        query: str,
+        namespaces: List[str],
+        collection_name: str = "documents",
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Search with BM25 and vectors and fuse both rankings with reciprocal-rank fusion.
+        
+        Exact terms such as "BAB III" or "2.1" that embeddings match poorly
+        are found by the keyword index, so a lower vector similarity
+        threshold (``hybrid_similarity_threshold``) is used for the vector
+        side. Keyword-only hits get their cosine similarity computed from the
+        stored embeddings, so ``similarity_score`` stays meaningful. Results
+        carry ``rrf_score`` and ``bm25_score`` and are sorted by ``rrf_score``.
+        """
+        if not namespaces:
+            return []
+        
         try:
-            collection = self.get_or_create_collection(collection_name)
+            self._prepare_collection(collection_name)
+            keyword_index = self.keyword_indexes.get(collection_name)
+            
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+            
+            vector_hits = self._search_namespace_hits(
+                collection_name, namespaces, query_embedding, top_k
+            ).above(self.hybrid_similarity_threshold)
+            vector_ids = vector_hits.ids.tolist()
+            keyword_hits = keyword_index.search(query, namespaces, top_k * 2) if keyword_index else []
+            
+            fused = reciprocal_rank_fusion(
+                [vector_ids, [doc_id for doc_id, _, _ in keyword_hits]],
+                k=self.rrf_k
+            )
+            top_ids = sorted(fused, key=fused.get, reverse=True)[:top_k]
             
-            # Get all documents in the namespace
-            results = collection.get(where={"namespace": namespace})
+            # Only fused winners are fetched; vector hits keep their HNSW/exact similarity
+            positions = {doc_id: position for position, doc_id in enumerate(vector_ids)}
+            winners = np.array([positions[doc_id] for doc_id in top_ids if doc_id in positions], dtype=np.int64)
+            chunks = {chunk['id']: chunk for chunk in self._materialize(vector_hits.take(winners), collection_name)}
+            bm25_scores = {doc_id: score for doc_id, _, score in keyword_hits}
+            keyword_namespaces = {doc_id: namespace for doc_id, namespace, _ in keyword_hits}
             
-            if results['ids']:
-                collection.delete(ids=results['ids'])
-                logger.info(f"Deleted {len(results['ids'])} documents from namespace {namespace}")
-                return len(results['ids'])
+            missing = [(doc_id, keyword_namespaces.get(doc_id)) for doc_id in top_ids if doc_id not in chunks]
+            if missing:
+                stored = self._fetch_chunks(missing, ['documents', 'metadatas', 'embeddings'], collection_name)
+                query_vector = self._normalize(query_embedding)
+                for doc_id, fields in stored.items():
+                    vector = np.asarray(fields['embeddings'], dtype=np.float32)
+                    chunks[doc_id] = {
+                        'id': doc_id,
+                        'content': fields['documents'],
+                        'metadata': fields['metadatas'] or {},
+                        'similarity_score': float(vector @ query_vector / max(float(np.linalg.norm(vector)), 1e-12))
+                    }
             
-            return 0
+            results = []
+            for doc_id in top_ids:
+                chunk = chunks.get(doc_id)
+                if chunk is None:
+                    continue
+                results.append({**chunk, 'rrf_score': fused[doc_id], 'bm25_score': bm25_scores.get(doc_id)})
             
+            logger.info(
+                f"Hybrid search: {vector_hits.size} vector hits, {len(keyword_hits)} keyword hits, "
+                f"{len(results)} fused results"
+            )
+            return results
+        
+        except Exception as e:
+            logger.error(f"Error in hybrid search: {e}")
+            return []
+    
+    def lookup_structure(
+        self,
+        namespaces: List[str],
+        chapter_number: Optional[int] = None,
+        section_number: Optional[str] = None,
+        collection_name: str = "documents"
+    ) -> List[Tuple[str, str]]:
+        """Get ``(id, namespace)`` of the chunks of a chapter or section in document order, without a vector search."""
+        self._prepare_collection(collection_name)
+        return self.structure_index.lookup(collection_name, namespaces, chapter_number, section_number)
+    
+    def get_chunks(self, refs: List[Tuple[str, str]], collection_name: str = "documents") -> List[Dict[str, Any]]:
+        """Fetch stored chunks by ``(id, namespace)``, in the order of ``refs``."""
+        if not refs:
+            return []
+        
+        stored = self._fetch_chunks(refs, ['documents', 'metadatas'], collection_name)
+        return [
+            {'id': doc_id, 'content': stored[doc_id]['documents'], 'metadata': stored[doc_id]['metadatas'] or {}}
+            for doc_id, _ in refs if doc_id in stored
+        ]
+    
+    def _recount_namespace(self, collection_name: str, namespace: Optional[str]):
+        """Reset the counter of a namespace to the number of chunks actually stored."""
+        if not namespace:
+            return
+        stored = self._call_collection(
+            self.shard_router.shard_for(collection_name, namespace), 'get', where={"namespace": namespace}, include=[]
+        )
+        count = len(stored['ids']) if stored is not None else 0
+        if count != self.namespace_counter.get_counts(collection_name, namespace).get(namespace, 0):
+            logger.warning(f"Recounted namespace {namespace} of {collection_name}: {count} chunks")
+        self.namespace_counter.set_count(collection_name, namespace, count)
+    
+    def delete_documents_by_namespace(self, namespace: str, collection_name: str = "documents"):
+        """Delete all documents in a specific namespace."""
+        try:
+            self._prepare_collection(collection_name)
+            
+            # The counter only sizes the report; chunks are deleted even if it has drifted to 0
+            count = self.namespace_counter.get_counts(collection_name, namespace).get(namespace, 0)
+            
+            shard_name = self.shard_router.shard_for(collection_name, namespace)
+            if self.shard_router.dedicated:
+                # The whole shard is this namespace, so drop it instead of deleting row by row
+                if self._get_physical_collection(shard_name, create=False) is not None:
+                    self._drop_physical_collection(shard_name)
+            else:
+                self._call_collection(shard_name, 'delete', where={"namespace": namespace})
+            if count:
+                self.namespace_counter.adjust(collection_name, {namespace: -count})
+            self.structure_index.delete_namespace(collection_name, namespace)
+            if collection_name in self.keyword_indexes:
+                self.keyword_indexes[collection_name].delete_namespace(namespace)
+            self._invalidate_exact(collection_name, namespace)
+            logger.info(f"Deleted {count} documents from namespace {namespace}")
+            self._notify_namespace_changed(namespace)
+            return count
+        
         except Exception as e:
             logger.error(f"Error deleting documents from namespace {namespace}: {e}")
             raise
     
+    def count_namespace(self, namespace: str, collection_name: str = "documents") -> int:
+        """Get the number of chunks stored in a namespace."""
+        self._prepare_collection(collection_name)
+        return self.namespace_counter.get_counts(collection_name, namespace).get(namespace, 0)
+    
     def get_collection_stats(self, collection_name: str = "documents") -> Dict[str, Any]:
         """Get statistics about the collection."""
         try:
-            collection = self.get_or_create_collection(collection_name)
-            count = collection.count()
+            self._prepare_collection(collection_name)
             
-            # Get namespace distribution
-            all_docs = collection.get()
-            namespace_counts = {}
+            # Namespace distribution from the maintained counter table
+            namespace_counts = self.namespace_counter.get_counts(collection_name)
             
-            if all_docs['metadatas']:
-                for metadata in all_docs['metadatas']:
-                    namespace = metadata.get('namespace', 'unknown')
-                    namespace_counts[namespace] = namespace_counts.get(namespace, 0) + 1
+            if self.shard_router.enabled:
+                count = sum(namespace_counts.values())
+                shards = len(self._shard_names(collection_name))
+            else:
+                count = self.get_or_create_collection(collection_name).count()
+                shards = 1
             
             return {
                 'total_documents': count,
                 'namespace_distribution': namespace_counts,
-                'collection_name': collection_name
+                'collection_name': collection_name,
+                'sharding': self.shard_router.mode,
+                'shards': shards,
+                'exact_search': (
+                    self.exact_indexes[collection_name].get_stats() if collection_name in self.exact_indexes else None
+                )
             }
-            
+        
         except Exception as e:
             logger.error(f"Error getting collection stats: {e}")
-            return {'error': str(e)}
\ No newline at end of file
+            return {'error': str(e)}
+    
+    def close(self):
+        """Stop the query batcher and the shard search pool, and close the counter database."""
+        if self.query_batcher is not None:
+            self.query_batcher.stop()
+        if self._search_pool is not None:
+            self._search_pool.shutdown(wait=False)
+        if self.namespace_counter is not None:
+            self.namespace_counter.close()
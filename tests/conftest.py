@@ -0,0 +1,33 @@
+import argparse
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from scripts.gemini_stub_server import make_handler
+
+
+@pytest.fixture
+def gemini_stub():
+    """Start the Gemini stub server in-process; call with stub options, get its base URL."""
+    servers = []
+    
+    def start(fail_every: int = 0, fail_status: int = 429, retry_after: float = 1, latency_ms: float = 0) -> str:
+        args = argparse.Namespace(
+            fail_every=fail_every, fail_status=fail_status, retry_after=retry_after, latency_ms=latency_ms
+        )
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+    
+    yield start
+    
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+import pytest
+
+from src.services.gemini_client import GeminiAPIError, GeminiAsyncClient, TokenBucket
+
+
+def make_client(base_url: str, **overrides) -> GeminiAsyncClient:
+    options = dict(
+        api_key='test-key',
+        base_url=base_url,
+        timeout_seconds=5.0,
+        max_retries=3,
+        backoff_base_seconds=0.01,
+        backoff_max_seconds=0.02,
+        # Slow refill, so the bucket level shows how many tokens were taken
+        requests_per_minute=1,
+        burst=10
+    )
+    options.update(overrides)
+    return GeminiAsyncClient(**options)
+
+
+def run(client: GeminiAsyncClient, call):
+    """Run ``call(client)`` to completion and close the client afterwards."""
+    async def main():
+        try:
+            return await call(client)
+        finally:
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def test_generate_retries_failed_attempts(gemini_stub):
+    client = make_client(gemini_stub(fail_every=2, fail_status=503))
+    
+    async def calls(client):
+        first = await client.generate('halo')
+        second = await client.generate('halo')
+        return first, second
+    
+    first, second = run(client, calls)
+    
+    assert first.startswith('Stub answer #1')
+    # Request #2 failed with 503 and was retried as request #3
+    assert second.startswith('Stub answer #3')
+    assert client.retries == 1
+    assert client.rate_limited == 0
+
+
+def test_generate_gives_up_after_max_retries(gemini_stub):
+    client = make_client(gemini_stub(fail_every=1, fail_status=500), max_retries=2)
+    
+    with pytest.raises(GeminiAPIError) as error:
+        run(client, lambda client: client.generate('halo'))
+    
+    assert error.value.status_code == 500
+    assert client.retries == 2
+
+
+def test_every_attempt_takes_a_rate_limit_token(gemini_stub):
+    client = make_client(gemini_stub(fail_every=2, fail_status=503))
+    
+    async def calls(client):
+        await client.generate('halo')
+        await client.generate('halo')
+    
+    run(client, calls)
+    
+    # Two calls, three attempts
+    assert 6.9 < client.rate_limiter.available < 7.1
+
+
+def test_generate_waits_for_retry_after(gemini_stub):
+    client = make_client(gemini_stub(fail_every=2, fail_status=429, retry_after=0.5))
+    
+    async def calls(client):
+        await client.generate('halo')
+        start = time.monotonic()
+        answer = await client.generate('halo')
+        return answer, time.monotonic() - start
+    
+    answer, elapsed = run(client, calls)
+    
+    assert answer.startswith('Stub answer #3')
+    assert elapsed >= 0.5
+    assert client.rate_limited == 1
+    assert client.retries == 1
+
+
+def test_retry_after_beyond_deadline_fails_without_sleeping(gemini_stub):
+    client = make_client(gemini_stub(fail_every=1, fail_status=429, retry_after=30), timeout_seconds=1.0)
+    
+    start = time.monotonic()
+    with pytest.raises(GeminiAPIError) as error:
+        run(client, lambda client: client.generate('halo'))
+    
+    assert error.value.status_code == 429
+    assert time.monotonic() - start < 1.0
+    assert client.retries == 0
+
+
+def test_generate_stops_at_deadline(gemini_stub):
+    client = make_client(gemini_stub(latency_ms=1000), timeout_seconds=0.3)
+    
+    start = time.monotonic()
+    with pytest.raises(GeminiAPIError):
+        run(client, lambda client: client.generate('halo'))
+    
+    assert time.monotonic() - start < 0.9
+
+
+def test_rate_limit_wait_beyond_deadline_fails(gemini_stub):
+    client = make_client(gemini_stub(), burst=1, timeout_seconds=1.0)
+    
+    async def calls(client):
+        await client.generate('halo')
+        await client.generate('halo')
+    
+    with pytest.raises(GeminiAPIError) as error:
+        run(client, calls)
+    
+    assert error.value.status_code == 429
+
+
+def test_stream_yields_pieces(gemini_stub):
+    client = make_client(gemini_stub())
+    
+    async def collect(client):
+        return [piece async for piece in client.stream('halo')]
+    
+    pieces = run(client, collect)
+    
+    assert len(pieces) > 1
+    assert ''.join(pieces).strip() == 'Stub answer #1 for a 4-character prompt.'
+
+
+def test_stream_retries_before_first_piece(gemini_stub):
+    client = make_client(gemini_stub(fail_every=1, fail_status=503), max_retries=1)
+    
+    async def collect(client):
+        return [piece async for piece in client.stream('halo')]
+    
+    with pytest.raises(GeminiAPIError) as error:
+        run(client, collect)
+    
+    assert error.value.status_code == 503
+    assert client.retries == 1
+
+
+@pytest.mark.parametrize('rate, capacity', [(0, 10), (-1, 10), (1, 0)])
+def test_token_bucket_rejects_unusable_limits(rate, capacity):
+    with pytest.raises(ValueError):
+        TokenBucket(rate=rate, capacity=capacity)
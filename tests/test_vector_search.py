@@ -0,0 +1,211 @@
+"""Columnar search results (SearchHits) against the former per-hit formatting, on an in-memory collection."""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pytest
+
+pytest.importorskip('chromadb')
+
+from src.services import vector_store as vector_store_module
+from src.services.embedding_backends import EmbeddingBackend
+from src.services.vector_store import VectorStore
+
+DIMENSION = 16
+NAMESPACES = ['pedoman', 'skripsi_mahasiswa_a', 'skripsi_mahasiswa_b']
+QUERIES = ['metode penelitian', 'rumusan masalah', 'daftar pustaka', 'kerangka teori', 'hasil']
+
+
+def _matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (where or {}).items():
+        if isinstance(condition, dict):
+            if metadata.get(key) not in condition['$in']:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """Brute-force stand-in for a Chroma collection with cosine distance; records every ``include``."""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.query_includes: List[List[str]] = []
+    
+    def count(self) -> int:
+        return len(self.rows)
+    
+    def upsert(self, ids, documents, metadatas, embeddings):
+        for doc_id, text, metadata, embedding in zip(ids, documents, metadatas, embeddings):
+            self.rows[doc_id] = {
+                'documents': text,
+                'metadatas': dict(metadata),
+                'embeddings': np.asarray(embedding, dtype=np.float32)
+            }
+    
+    def get(self, ids=None, where=None, include=('metadatas', 'documents'), limit=None, offset=0):
+        keys = [doc_id for doc_id in (self.rows if ids is None else ids) if doc_id in self.rows]
+        keys = [doc_id for doc_id in keys if _matches(self.rows[doc_id]['metadatas'], where)]
+        keys = keys[offset:None if limit is None else offset + limit]
+        result = {'ids': keys}
+        for field in ('documents', 'metadatas', 'embeddings'):
+            result[field] = [self.rows[doc_id][field] for doc_id in keys] if field in include else None
+        return result
+    
+    def query(self, query_embeddings, n_results, where=None, include=('metadatas', 'documents', 'distances')):
+        self.query_includes.append(list(include))
+        query = np.asarray(query_embeddings[0], dtype=np.float32)
+        query = query / np.linalg.norm(query)
+        keys = [doc_id for doc_id, row in self.rows.items() if _matches(row['metadatas'], where)]
+        distances = [
+            1 - float(self.rows[doc_id]['embeddings'] @ query / np.linalg.norm(self.rows[doc_id]['embeddings']))
+            for doc_id in keys
+        ]
+        order = np.argsort(distances, kind='stable')[:n_results]
+        ids = [keys[position] for position in order]
+        return {
+            'ids': [ids],
+            'distances': [[distances[position] for position in order]] if 'distances' in include else None,
+            'documents': [[self.rows[doc_id]['documents'] for doc_id in ids]] if 'documents' in include else None,
+            'metadatas': [[self.rows[doc_id]['metadatas'] for doc_id in ids]] if 'metadatas' in include else None
+        }
+
+
+class FakeClient:
+    def __init__(self, path: str):
+        self.collections: Dict[str, FakeCollection] = {}
+    
+    def get_or_create_collection(self, name: str, metadata=None) -> FakeCollection:
+        return self.collections.setdefault(name, FakeCollection(name))
+    
+    def list_collections(self) -> List[FakeCollection]:
+        return list(self.collections.values())
+    
+    def delete_collection(self, name: str):
+        del self.collections[name]
+
+
+class HashEncoder(EmbeddingBackend):
+    """Deterministic unit vectors seeded from the characters of each text."""
+    
+    name = 'hash-encoder'
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = []
+        for text in texts:
+            seed = sum(ord(char) * (position + 1) for position, char in enumerate(text))
+            vector = np.random.default_rng(seed).standard_normal(DIMENSION).astype(np.float32)
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.stack(vectors)
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return DIMENSION
+
+
+def reference_query(store: VectorStore, targets, query_embedding):
+    """The former ``_query_shards``: full rows from every target, merged by distance."""
+    hits = []
+    for name, where, n_results in targets:
+        collection = store.client.collections.get(name)
+        if collection is None:
+            continue
+        raw = collection.query(
+            query_embeddings=[query_embedding], n_results=n_results, where=where,
+            include=['metadatas', 'documents', 'distances']
+        )
+        hits.extend(zip(raw['ids'][0], raw['documents'][0], raw['metadatas'][0], raw['distances'][0]))
+    hits.sort(key=lambda hit: hit[3])
+    return hits
+
+
+def reference_search_similar(store: VectorStore, query: str, top_k: int, threshold: float):
+    """The former ``search_similar_documents`` without a namespace filter."""
+    query_embedding = store.embed_query(query)
+    names = sorted(store.client.collections)
+    hits = reference_query(store, [(name, None, top_k) for name in names], query_embedding)[:top_k]
+    return [
+        {'id': doc_id, 'content': text, 'metadata': metadata, 'similarity_score': 1 - distance}
+        for doc_id, text, metadata, distance in hits if 1 - distance >= threshold
+    ]
+
+
+def reference_search_multiple(store: VectorStore, query: str, namespaces: List[str], top_k: int, threshold: float):
+    """The former ``search_multiple_namespaces``: per-hit filtering into namespace buckets."""
+    query_embedding = store.embed_query(query)
+    shards: Dict[str, List[str]] = {}
+    for namespace in namespaces:
+        shards.setdefault(store.shard_router.shard_for('documents', namespace), []).append(namespace)
+    
+    targets = []
+    for shard_name, shard_namespaces in shards.items():
+        if store.shard_router.dedicated:
+            where = None
+        elif len(shard_namespaces) == 1:
+            where = {'namespace': shard_namespaces[0]}
+        else:
+            where = {'namespace': {'$in': shard_namespaces}}
+        targets.append((shard_name, where, top_k * len(shard_namespaces) * 2))
+    
+    results = {namespace: [] for namespace in namespaces}
+    for doc_id, text, metadata, distance in reference_query(store, targets, query_embedding):
+        bucket = results.get(metadata.get('namespace'))
+        if bucket is None or len(bucket) >= top_k or 1 - distance < threshold:
+            continue
+        bucket.append({'id': doc_id, 'content': text, 'metadata': metadata, 'similarity_score': 1 - distance})
+    return results
+
+
+def assert_same_results(actual: List[Dict[str, Any]], expected: List[Dict[str, Any]]):
+    assert [result['id'] for result in actual] == [result['id'] for result in expected]
+    for result, reference in zip(actual, expected):
+        assert result['content'] == reference['content']
+        assert result['metadata'] == reference['metadata']
+        assert result['similarity_score'] == pytest.approx(reference['similarity_score'], abs=1e-5)
+
+
+@pytest.fixture(params=['none', 'namespace', 'bucket'])
+def store(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store_module.chromadb, 'PersistentClient', FakeClient)
+    store = VectorStore(
+        persist_directory=str(tmp_path), embedding_model=HashEncoder(), sharding=request.param, shard_buckets=2
+    )
+    store.add_documents(
+        {
+            'id': f"{namespace}:{index}",
+            'content': f"{namespace} bagian {index} membahas {QUERIES[index % len(QUERIES)]}",
+            'metadata': {'namespace': namespace, 'chunk_index': index, 'section': f"1.{index}"}
+        }
+        for namespace in NAMESPACES for index in range(12)
+    )
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_search_similar_documents_matches_per_hit_formatting(store, query):
+    for threshold in (-1.0, 0.0, 0.2):
+        actual = store.search_similar_documents(query, top_k=7, similarity_threshold=threshold)
+        assert_same_results(actual, reference_search_similar(store, query, 7, threshold))
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_search_multiple_namespaces_matches_per_hit_formatting(store, query):
+    for threshold in (-1.0, 0.0, 0.2):
+        actual = store.search_multiple_namespaces(query, NAMESPACES, top_k_per_namespace=3, similarity_threshold=threshold)
+        expected = reference_search_multiple(store, query, NAMESPACES, 3, threshold)
+        assert list(actual) == list(expected)
+        for namespace in NAMESPACES:
+            assert_same_results(actual[namespace], expected[namespace])
+
+
+def test_queries_do_not_request_documents(store):
+    for collection in store.client.collections.values():
+        collection.query_includes.clear()
+    
+    store.search_similar_documents(QUERIES[0], top_k=5, similarity_threshold=-1.0)
+    store.search_multiple_namespaces(QUERIES[0], NAMESPACES, top_k_per_namespace=3, similarity_threshold=-1.0)
+    
+    includes = [include for collection in store.client.collections.values() for include in collection.query_includes]
+    assert includes
+    assert all('documents' not in include and 'embeddings' not in include for include in includes)